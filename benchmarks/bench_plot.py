@@ -0,0 +1,430 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Sam Schott  (ss2151@cam.ac.uk)
+
+(c) Sam Schott; This work is licensed under a Creative Commons
+Attribution-NonCommercial-NoDerivs 2.0 UK: England & Wales License.
+
+Benchmarks for the plotting path which run without a display, using Qt's offscreen
+platform. For histories of increasing length, this measures:
+
+- the time to load a full history with ``set_data``,
+- the time per new reading with ``append_data``, including rendering and painting,
+- the time per reading of ``ControlPanel.update_plot``,
+- the time to paint the plot, for different visible ranges (and therefore levels of
+  detail) and rendering profiles,
+- the memory allocated by the plot for its data,
+- the same for pyqtgraph's own downsampling of plain curves, with
+  ``setDownsampling(auto=True, mode=...)`` and ``setClipToView(True)``, in the modes
+  "subsample", "mean" and "peak". With "subsample", this is the plotting path which
+  the min / max envelope replaced: every reading sets the full history in minutes
+  relative to the latest reading.
+
+Histories always span 24 h, longer histories have a higher sampling rate. Histories
+with up to two points per pixel are drawn point by point, longer ones as their min /
+max envelope. Antialiasing a noisy line point by point is slower, painting a short
+history can therefore take longer than a long one.
+
+The downsampling comparison also reports the highest temperature drawn in the 24 h
+view. All histories contain spikes to 300 K, which are lost when a mode drops
+samples.
+
+Each measurement is repeated after a few untimed warm-up runs and the median is
+reported. Run with::
+
+    $ python benchmarks/bench_plot.py --sizes 1000 10000 100000 1000000
+
+"""
+import os
+import sys
+import time
+import types
+import logging
+import argparse
+import tempfile
+import tracemalloc
+from pathlib import Path
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+# run against the checkout, also when mercurygui is not installed
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+import numpy as np
+import pyqtgraph as pg
+from PyQt5 import QtWidgets
+
+from mercurygui.pyqtplot_canvas import TemperatureHistoryPlot, SensorOverviewPlot
+
+DURATION = 24 * 60 * 60
+VIEWS = {"24 h": 24 * 60, "1 h": 60, "1 min": 1}
+WIDTH = 800
+HEIGHT = 500
+WARMUP = 3
+DOWNSAMPLING_MODES = ("subsample", "mean", "peak")
+
+
+def synthetic_history(n, t_end=None):
+    """Returns a history of n readings over 24 h with noise, steps and spikes."""
+    t_end = t_end or time.time()
+    t = np.linspace(t_end - DURATION, t_end, n)
+
+    rng = np.random.default_rng(0)
+    temp = 4.2 + 0.01 * rng.standard_normal(n)
+    temp[n // 3 : 2 * n // 3] += 100  # temperature step
+    temp[rng.integers(0, n, 10)] = 300  # short spikes
+
+    heater = np.clip(0.3 + 0.05 * rng.standard_normal(n), 0, 1)
+    gasflow = np.clip(0.1 + 0.02 * rng.standard_normal(n), 0, 1)
+
+    return t, temp, gasflow, heater
+
+
+def process_events(app, duration=0.0):
+    t0 = time.monotonic()
+    app.processEvents()
+    while time.monotonic() - t0 < duration:
+        app.processEvents()
+
+
+def render_now(plot):
+    """Renders pending data and paints the plot, bypassing the frame rate limit."""
+    plot._render_timer.stop()
+    plot._render()
+    plot.viewport().repaint()
+
+
+def median_ms(func, repeat, warmup=WARMUP):
+    # the first runs fill caches, for instance of envelopes and pens
+    for _ in range(warmup):
+        func()
+
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return np.median(times) * 1000
+
+
+def new_plot(app):
+    plot = TemperatureHistoryPlot()
+    plot.resize(WIDTH, HEIGHT)
+    plot.show()
+    process_events(app)
+    return plot
+
+
+def bench_set_data(app, n, repeat):
+    plot = new_plot(app)
+    data = synthetic_history(n)
+
+    def run():
+        plot.set_data(*data)
+        plot._render()
+
+    result = median_ms(run, max(repeat // 5, 1))
+    plot.close()
+    return result
+
+
+def bench_append(app, n, repeat):
+    plot = new_plot(app)
+    t, temp, gasflow, heater = synthetic_history(n)
+    plot.set_data(t, temp, gasflow, heater)
+    render_now(plot)
+
+    dt = DURATION / n
+    state = dict(t=t[-1])
+
+    def run():
+        state["t"] += dt
+        plot.append_data(state["t"], 4.2, 0.1, 0.3)
+        render_now(plot)
+
+    result = median_ms(run, repeat)
+    plot.close()
+    return result
+
+
+def bench_paint(app, n, repeat):
+    """Returns paint times for each view and rendering profile."""
+    plot = new_plot(app)
+    plot.set_data(*synthetic_history(n))
+    render_now(plot)
+
+    results = {}
+
+    for profile in TemperatureHistoryPlot.RENDER_PROFILES:
+        plot.set_render_profile(profile)
+        for view, minutes in VIEWS.items():
+            plot.show_last(minutes)
+            process_events(app)
+            results[(profile, view)] = median_ms(plot.viewport().repaint, repeat)
+
+    plot.close()
+    return results
+
+
+def bench_memory(app, n):
+    """Returns the memory in MB allocated by the plot for a history of n points."""
+    data = synthetic_history(n)
+
+    tracemalloc.start()
+    plot = new_plot(app)
+    before = tracemalloc.get_traced_memory()[0]
+
+    plot.set_data(*data)
+    render_now(plot)
+    plot.show_last(60)
+    process_events(app)
+
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    plot.close()
+
+    return (current - before) / 1e6, (peak - before) / 1e6
+
+
+class DownsampledPlot(pg.GraphicsLayoutWidget):
+    """
+    Temperature plot with plain curves and pyqtgraph's downsampling, laid out and
+    styled like TemperatureHistoryPlot before it drew min / max envelopes.
+
+    :param mode: Downsampling mode passed to :meth:`pyqtgraph.PlotItem.setDownsampling`.
+    """
+
+    def __init__(self, mode):
+        super().__init__()
+
+        self.p0 = self.addPlot(row=0, col=0, rowspan=5)
+        self.p1 = self.addPlot(row=5, col=0)
+        self.p1.setXLink(self.p0)
+        self.p0.enableAutoRange(x=False, y=True)
+        self.p1.enableAutoRange(x=False, y=False)
+        self.p1.setYRange(-0.02, 1.02)
+
+        for p in (self.p0, self.p1):
+            p.setDownsampling(auto=True, mode=mode)
+            p.setClipToView(True)
+
+        lw = TemperatureHistoryPlot.LW
+        self.p_tempr = self.p0.plot(
+            pen=pg.mkPen(TemperatureHistoryPlot.GREEN, width=lw), antialias=True
+        )
+        self.p_htr = self.p1.plot(
+            pen=pg.mkPen(TemperatureHistoryPlot.RED, width=lw),
+            fillLevel=0,
+            fillBrush=TemperatureHistoryPlot.LIGHT_RED,
+            antialias=True,
+        )
+        self.p_gflw = self.p1.plot(
+            pen=pg.mkPen(TemperatureHistoryPlot.BLUE, width=lw),
+            fillLevel=0,
+            fillBrush=TemperatureHistoryPlot.LIGHT_BLUE,
+            antialias=True,
+        )
+
+    def set_data(self, t, temp, gasflow, heater):
+        # x-values are in minutes relative to the latest reading
+        x = (t - t[-1]) / 60
+        self.p_tempr.setData(x, temp)
+        self.p_gflw.setData(x, gasflow)
+        self.p_htr.setData(x, heater)
+
+    def show_last(self, minutes):
+        self.p0.setXRange(-minutes, 0, padding=0)
+
+
+def bench_downsampling(app, n, repeat):
+    """
+    Returns the time per reading, the paint time for each view and the highest
+    temperature drawn in the 24 h view, for the min / max envelope of
+    TemperatureHistoryPlot and each pyqtgraph downsampling mode.
+    """
+    t, temp, gasflow, heater = synthetic_history(n)
+    dt = DURATION / n
+    results = {}
+
+    # min / max envelope, the appends are timed by bench_append
+    plot = new_plot(app)
+    plot.set_data(t, temp, gasflow, heater)
+    render_now(plot)
+
+    paint = {}
+    for view, minutes in VIEWS.items():
+        plot.show_last(minutes)
+        process_events(app)
+        paint[view] = median_ms(plot.viewport().repaint, repeat)
+        if view == "24 h":
+            # bins are drawn by their min and max, the highest point is not lost
+            peak = max(chunk.y_max for chunk in plot.p_tempr.chunks)
+
+    results["envelope"] = (bench_append(app, n, repeat), paint, peak)
+    plot.close()
+
+    for mode in DOWNSAMPLING_MODES:
+        plot = DownsampledPlot(mode)
+        plot.resize(WIDTH, HEIGHT)
+        plot.show()
+        plot.set_data(t, temp, gasflow, heater)
+        process_events(app)
+
+        paint = {}
+        for view, minutes in VIEWS.items():
+            plot.show_last(minutes)
+            process_events(app)
+            paint[view] = median_ms(plot.viewport().repaint, repeat)
+            if view == "24 h":
+                peak = np.nanmax(plot.p_tempr.getData()[1])
+
+        # the previous plotting path set the full history for every reading
+        history = dict(t=t, temp=temp, gasflow=gasflow, heater=heater)
+
+        def run():
+            history["t"] = np.append(history["t"][1:], history["t"][-1] + dt)
+            for key, value in (("temp", 4.2), ("gasflow", 0.1), ("heater", 0.3)):
+                history[key] = np.append(history[key][1:], value)
+            plot.set_data(**history)
+            plot.viewport().repaint()
+
+        results[mode] = (median_ms(run, repeat), paint, peak)
+        plot.close()
+
+    return results
+
+
+def bench_update_plot(app, n, repeat):
+    """Returns the time per reading of ControlPanel.update_plot."""
+    from mercurygui.main import ControlPanel
+    from mercurygui.retention import RetentionManager
+    from mercurygui.topology import TopologyCache
+    from mercurygui.acquisition import validate_profile
+    from mercurygui.history import SensorHistory
+
+    log_path = Path(tempfile.mkdtemp())
+
+    # the panel warns that there is no temperature sensor
+    logging.getLogger("mercurygui").setLevel(logging.ERROR)
+
+    # the parts of MercuryMonitorApp which a panel uses, without an instrument
+    mercury = types.SimpleNamespace(modules=[], connected=False, visa_address="")
+    history = SensorHistory(["MB1.T1"], n + repeat)
+    parent = types.SimpleNamespace(
+        log_path=log_path,
+        historian=None,
+        retention=RetentionManager(log_path),
+        topology=TopologyCache(log_path / "topology.json"),
+        history=history,
+        overview=SensorOverviewPlot(history),
+        profile=validate_profile("normal", {}),
+        render_profile="balanced",
+        update_freq=1,
+        display_message=print,
+        display_error=print,
+    )
+
+    panel = ControlPanel(mercury, parent, "MB1.T1")
+    panel.resize(WIDTH, HEIGHT)
+    panel.show()
+    process_events(app)
+
+    t, temp, gasflow, heater = synthetic_history(n)
+    for row in zip(t, temp, heater, gasflow):
+        history.append("MB1.T1", *row)
+    render_now(panel.canvas)
+
+    readings = {"Temp": 4.2, "FlowPercent": 10.0, "HeaterPercent": 30.0}
+
+    def run():
+        panel.update_plot(readings)
+        render_now(panel.canvas)
+
+    result = median_ms(run, repeat)
+    panel.stop_logging()
+    panel.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[1000, 10000, 100000, 1000000],
+        help="number of points in the history",
+    )
+    parser.add_argument(
+        "--repeat", type=int, default=20, help="number of repetitions per measurement"
+    )
+    parser.add_argument(
+        "--no-panel",
+        action="store_true",
+        help="skip benchmarks of ControlPanel.update_plot",
+    )
+    parser.add_argument(
+        "--no-downsampling",
+        action="store_true",
+        help="skip the comparison with pyqtgraph's downsampling modes",
+    )
+    args = parser.parse_args()
+
+    app = QtWidgets.QApplication(sys.argv[:1])
+
+    print(
+        f"{'points':>9} {'set_data':>10} {'append':>9} {'update_plot':>12} "
+        f"{'memory':>9} {'peak':>9}"
+    )
+
+    paint_results = {}
+    downsampling_results = {}
+
+    for n in args.sizes:
+        set_data_ms = bench_set_data(app, n, args.repeat)
+        append_ms = bench_append(app, n, args.repeat)
+        memory_mb, peak_mb = bench_memory(app, n)
+        paint_results[n] = bench_paint(app, n, args.repeat)
+
+        if not args.no_downsampling:
+            downsampling_results[n] = bench_downsampling(app, n, args.repeat)
+
+        if args.no_panel:
+            update_plot = "-"
+        else:
+            update_plot = "%.2f ms" % bench_update_plot(app, n, args.repeat)
+
+        print(
+            f"{n:>9} {set_data_ms:>7.1f} ms {append_ms:>6.2f} ms {update_plot:>12} "
+            f"{memory_mb:>6.1f} MB {peak_mb:>6.1f} MB"
+        )
+
+    print("\nPaint time (ms)")
+
+    columns = list(paint_results[args.sizes[0]])
+    print(f"{'points':>9} " + " ".join(f"{p + ', ' + v:>18}" for p, v in columns))
+
+    for n, results in paint_results.items():
+        print(f"{n:>9} " + " ".join(f"{results[c]:>18.2f}" for c in columns))
+
+    if not downsampling_results:
+        return
+
+    print("\nDownsampling, time per reading and paint time (ms), highest T drawn (K)")
+    print(
+        f"{'points':>9} {'method':>10} {'reading':>9} "
+        + " ".join(f"{'paint ' + v:>11}" for v in VIEWS)
+        + f" {'max T':>7}"
+    )
+
+    for n, results in downsampling_results.items():
+        for method, (reading_ms, paint, peak) in results.items():
+            print(
+                f"{n:>9} {method:>10} {reading_ms:>9.2f} "
+                + " ".join(f"{paint[v]:>11.2f}" for v in VIEWS)
+                + f" {peak:>7.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
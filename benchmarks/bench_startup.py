@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Sam Schott  (ss2151@cam.ac.uk)
+
+(c) Sam Schott; This work is licensed under a Creative Commons
+Attribution-NonCommercial-NoDerivs 2.0 UK: England & Wales License.
+
+Benchmark for the time to the first window, using Qt's offscreen platform. Each
+start runs in a fresh interpreter and measures:
+
+- the time to import ``mercurygui.main``,
+- the time to create the ``QApplication``,
+- the time to construct ``MercuryMonitorApp``,
+- the time to show and paint the window,
+- the total time from launching the interpreter to the painted window.
+
+The app is started without an instrument, so the time to connect is not included.
+All starts share a temporary home directory, the first start therefore also creates
+the config file and caches.
+
+Run with::
+
+    $ python benchmarks/bench_startup.py --repeat 10
+
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+CHILD = """
+import time
+t0 = time.perf_counter()
+
+import sys
+import types
+import json
+from PyQt5 import QtWidgets
+
+import mercurygui.main
+t_import = time.perf_counter()
+
+app = QtWidgets.QApplication(sys.argv[:1])
+t_app = time.perf_counter()
+
+# the parts of MercuryITC which the app uses before connecting
+mercury = types.SimpleNamespace(
+    visa_address="TCPIP0::localhost::7020::SOCKET",
+    visa_library="@py",
+    modules=[],
+    connected=False,
+    connect=lambda **kwargs: False,
+    disconnect=lambda: None,
+)
+
+gui = mercurygui.main.MercuryMonitorApp(mercury)
+t_construct = time.perf_counter()
+
+gui.show()
+gui.repaint()
+app.processEvents()
+t_show = time.perf_counter()
+
+print(json.dumps({
+    "import": t_import - t0,
+    "QApplication": t_app - t_import,
+    "construct": t_construct - t_app,
+    "show": t_show - t_construct,
+}))
+"""
+
+PHASES = ["import", "QApplication", "construct", "show", "total"]
+
+
+def start_once(env):
+    """Starts the app in a new interpreter and returns the time of each phase."""
+    t0 = time.perf_counter()
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD],
+        env=env,
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout
+    total = time.perf_counter() - t0
+
+    result = json.loads(output.strip().splitlines()[-1])
+    result["total"] = total
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+    parser.add_argument(
+        "--repeat", type=int, default=10, help="number of starts after the first"
+    )
+    args = parser.parse_args()
+
+    home = tempfile.mkdtemp()
+    env = dict(os.environ, HOME=home, USERPROFILE=home, QT_QPA_PLATFORM="offscreen")
+
+    first = start_once(env)
+    results = [start_once(env) for _ in range(args.repeat)]
+
+    print(f"{'phase':>14} {'first':>10} {'median':>10} {'min':>10}")
+
+    for phase in PHASES:
+        times = [r[phase] * 1000 for r in results]
+        print(
+            f"{phase:>14} {first[phase] * 1000:>7.1f} ms "
+            f"{np.median(times):>7.1f} ms {np.min(times):>7.1f} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,8 @@
+from mercurygui import startup  # records the start time, must come first
+
+if startup.option_given():
+    startup.PROFILER.start_import_timing()
+
 import mercurygui.config
 
 __version__ = "3.0.3"
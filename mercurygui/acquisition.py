@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Sam Schott  (ss2151@cam.ac.uk)
+
+(c) Sam Schott; This work is licensed under a Creative Commons
+Attribution-NonCommercial-NoDerivs 2.0 UK: England & Wales License.
+
+Acquisition profiles bundle the settings which determine how often readings are taken,
+kept and logged. Profiles are stored in the config file, one section per profile named
+``Acquisition/<name>``. The selected profile is the "profile" option of the
+"Acquisition" section. Further profiles can be added by adding sections to the config
+file.
+
+"""
+import logging
+import collections
+
+from mercurygui.config.main import DEFAULTS
+
+logger = logging.getLogger(__name__)
+
+
+SECTION = "Acquisition"
+PROFILE_PREFIX = "Acquisition/"
+DEFAULT_PROFILE = "normal"
+
+#: Groups of readings collected by a feed. Temperature readings are always collected.
+FIELDS = ("temperature", "heater", "gas_flow", "alarms")
+
+#: Settings of each profile and their types.
+OPTIONS = collections.OrderedDict(
+    [
+        ("refresh", (int, float)),
+        ("fields", (list, tuple)),
+        ("poll_intervals", dict),
+        ("history_hours", (int, float)),
+        ("log_interval", (int, float)),
+        ("days_to_keep", (int, float)),
+    ]
+)
+
+AcquisitionProfile = collections.namedtuple(
+    "AcquisitionProfile", ["name"] + list(OPTIONS)
+)
+AcquisitionProfile.__doc__ = """
+Settings for collecting, keeping and logging readings.
+
+:param name: Name of the profile.
+:param refresh: Time in sec between readings.
+:param fields: Groups of readings to collect, see :data:`FIELDS`.
+:param poll_intervals: Time in sec between readings of a group, by group. Groups which
+    are not given are read at every refresh.
+:param history_hours: Hours of readings kept in memory and shown in the plot.
+:param log_interval: Time in min between saves of the log file. Not used for durable
+    logging, where every reading is appended immediately.
+:param days_to_keep: Maximum age of log files in days.
+"""
+
+
+def validate_profile(name, options):
+    """
+    Checks the settings of a profile.
+
+    :param name: Name of the profile.
+    :param options: Dictionary of settings. Missing settings are taken from the
+        default profile.
+    :returns: :class:`AcquisitionProfile`.
+    :raises ValueError: if a setting is invalid.
+    """
+    defaults = dict(DEFAULTS)[PROFILE_PREFIX + DEFAULT_PROFILE]
+    options = dict(defaults, **options)
+
+    for option, types in OPTIONS.items():
+        if not isinstance(options[option], types) or isinstance(options[option], bool):
+            raise ValueError(f"'{option}' has an invalid value {options[option]!r}")
+
+    unknown = set(options) - set(OPTIONS)
+    if unknown:
+        raise ValueError(f"unknown settings {sorted(unknown)}")
+
+    fields = list(options["fields"])
+    poll_intervals = options["poll_intervals"]
+
+    if "temperature" not in fields:
+        raise ValueError("'fields' must include 'temperature'")
+
+    for field in fields:
+        if field not in FIELDS:
+            raise ValueError(f"unknown field '{field}', must be one of {FIELDS}")
+
+    for field, interval in poll_intervals.items():
+        if field not in fields or field == "temperature":
+            raise ValueError(f"invalid field '{field}' in 'poll_intervals'")
+        if not isinstance(interval, (int, float)) or interval < 0:
+            raise ValueError(f"invalid poll interval {interval!r} for '{field}'")
+
+    for option in ("refresh", "history_hours", "log_interval", "days_to_keep"):
+        if options[option] <= 0:
+            raise ValueError(f"'{option}' must be positive")
+
+    return AcquisitionProfile(
+        name=name,
+        refresh=float(options["refresh"]),
+        fields=tuple(fields),
+        poll_intervals={f: float(t) for f, t in poll_intervals.items()},
+        history_hours=float(options["history_hours"]),
+        log_interval=float(options["log_interval"]),
+        days_to_keep=float(options["days_to_keep"]),
+    )
+
+
+def load_profiles(conf):
+    """
+    Loads all profiles from the config. Invalid profiles are logged and skipped.
+
+    :param conf: UserConfig instance.
+    :returns: Dictionary of profiles by name.
+    """
+    profiles = collections.OrderedDict()
+
+    for section in conf.sections():
+        if not section.startswith(PROFILE_PREFIX):
+            continue
+
+        name = section[len(PROFILE_PREFIX) :]
+        options = {
+            option: conf.get(section, option) for option in conf.options(section)
+        }
+
+        try:
+            profiles[name] = validate_profile(name, options)
+        except ValueError as exc:
+            logger.warning("Invalid acquisition profile '%s': %s", name, exc)
+
+    if DEFAULT_PROFILE not in profiles:
+        profiles[DEFAULT_PROFILE] = validate_profile(DEFAULT_PROFILE, {})
+
+    return profiles
@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Sam Schott  (ss2151@cam.ac.uk)
+
+(c) Sam Schott; This work is licensed under a Creative Commons
+Attribution-NonCommercial-NoDerivs 2.0 UK: England & Wales License.
+
+"""
+import os
+import math
+import threading
+import logging
+import collections
+import numpy as np
+from PyQt5 import QtCore
+
+from .datalog import (
+    find_log_files,
+    select_log_files,
+    load_log_files,
+    merge_sorted,
+    log_file_start,
+    index_path,
+    N_COLUMNS,
+)
+from .decimate import minmax_envelope
+
+logger = logging.getLogger(__name__)
+
+
+Request = collections.namedtuple("Request", "level first last t_limit")
+
+
+class HistoryLoader(QtCore.QObject):
+    """
+    Loads older readings of a sensor from its log files in a background thread, for
+    instance to fill in a plot when panning beyond the readings held in memory.
+
+    Readings are loaded in tiles. Each level of detail has a bin width of 2**level sec
+    and a tile of :attr:`TILE_BINS` bins, which is reduced to its min / max envelope.
+    Loaded tiles are kept in an LRU cache, so browsing the same range again does not
+    touch the disk. Log files without a sidecar index, such as compressed logs or logs
+    written at intervals, cannot be read in parts. The :attr:`FILE_CACHE_SIZE` most
+    recently used of them are parsed once and kept in memory until they change.
+
+    Create a request with :meth:`make_request` and load it with :meth:`load`. Only the
+    latest request is processed, older requests which have not started loading yet are
+    discarded. Results are emitted by :attr:`loaded` as a tuple of the request and an
+    array of shape (N, 4) with columns time, temperature, heater and gas flow.
+
+    :param log_path: Directory with log files.
+    :param sensor: Nick of the temperature module.
+    :param cache_size: Maximum number of tiles to cache.
+    :param paths: Log files to load from instead of the log files of the sensor in
+        ``log_path``, for instance files opened in a log viewer.
+    """
+
+    loaded = QtCore.pyqtSignal(object)
+
+    TILE_BINS = 1024
+    FILE_CACHE_SIZE = 8
+
+    def __init__(self, log_path, sensor, cache_size=64, paths=None):
+        super().__init__()
+
+        self.log_path = log_path
+        self.sensor = sensor
+        self.cache_size = cache_size
+        self.paths = None if paths is None else list(paths)
+
+        self._cache = collections.OrderedDict()
+        self._files = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._request = None
+        self._latest = None
+        self._thread = None
+
+    @property
+    def t_first(self):
+        """Start time of the oldest log file or None if there are no log files."""
+        for path in self._find_files():
+            try:
+                return log_file_start(path)
+            except ValueError:
+                pass  # not named like a log file
+        return None
+
+    def make_request(self, t_start, t_end, resolution, t_limit=None):
+        """
+        Creates a request for readings within a time range. Requests for ranges which
+        are covered by the same tiles compare equal.
+
+        :param t_start: Start time in sec since the epoch.
+        :param t_end: End time in sec since the epoch.
+        :param resolution: Time in sec per screen pixel.
+        :param t_limit: Readings at or after this time are excluded, for instance
+            because they are already in memory.
+        :returns: Request.
+        """
+        level = max(int(math.floor(math.log2(max(resolution, 1)))), 0)
+        tile_duration = self.TILE_BINS * 2 ** level
+
+        if t_limit is not None:
+            t_end = min(t_end, t_limit)
+
+        first = int(t_start // tile_duration)
+        last = int(t_end // tile_duration)
+
+        # the limit only matters for the last tile, if it cuts it short
+        if t_limit is not None and t_limit >= (last + 1) * tile_duration:
+            t_limit = None
+
+        return Request(level, first, last, t_limit)
+
+    def load(self, request):
+        """
+        Loads a request in the background and emits the result with :attr:`loaded`.
+
+        :param request: Request returned by :meth:`make_request`.
+        """
+        with self._lock:
+            self._request = request
+            self._latest = request
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="HistoryLoader", daemon=True
+                )
+                self._thread.start()
+
+    def clear_cache(self):
+        """Removes all cached tiles and log files."""
+        with self._lock:
+            self._cache.clear()
+            self._files.clear()
+
+    def stop(self):
+        """
+        Discards pending requests and cached data. A request which is currently loading
+        is completed in the background but not emitted.
+        """
+        with self._lock:
+            self._request = None
+            self._latest = None
+            self._cache.clear()
+            self._files.clear()
+
+    # =================== PRIVATE METHODS =========================================
+
+    def _run(self):
+        # the thread exits when there is nothing left to do
+        while True:
+            with self._lock:
+                request = self._request
+                self._request = None
+                if request is None:
+                    self._thread = None
+                    return
+
+            try:
+                data = self._load_request(request)
+            except Exception:
+                logger.error("Could not load history from log files", exc_info=True)
+                continue
+
+            with self._lock:
+                if request != self._latest:
+                    continue  # outdated by a newer request
+
+            self.loaded.emit((request, data))
+
+    def _load_request(self, request):
+
+        tile_duration = self.TILE_BINS * 2 ** request.level
+        tiles = []
+
+        for i in range(request.first, request.last + 1):
+            t_start = i * tile_duration
+            t_end = (i + 1) * tile_duration
+
+            # a tile which is cut short is cached separately, until the limit moves
+            if i == request.last and request.t_limit is not None:
+                t_end = request.t_limit
+                key = (request.level, i, t_end)
+            else:
+                key = (request.level, i, None)
+
+            with self._lock:
+                tile = self._cache.get(key)
+                if tile is not None:
+                    self._cache.move_to_end(key)
+
+            if tile is None:
+                tile = self._load_tile(t_start, t_end)
+
+                with self._lock:
+                    self._cache[key] = tile
+                    while len(self._cache) > self.cache_size:
+                        self._cache.popitem(last=False)
+
+            tiles.append(tile)
+
+        tiles = [t for t in tiles if len(t) > 0]
+
+        if len(tiles) == 0:
+            return np.empty((0, N_COLUMNS))
+
+        return np.concatenate(tiles)
+
+    def _find_files(self, t_start=None, t_end=None):
+        if self.paths is None:
+            return find_log_files(self.log_path, self.sensor, t_start, t_end)
+        return select_log_files(self.paths, t_start, t_end)
+
+    def _load_tile(self, t_start, t_end):
+
+        arrays = []
+        indexed = []
+
+        for path in self._find_files(t_start, t_end):
+            if path.endswith(".gz") or not os.path.exists(index_path(path)):
+                arrays.append(self._read_unindexed(path, t_start, t_end))
+            else:
+                indexed.append(path)
+
+        arrays.append(load_log_files(indexed, t_start, t_end))
+        data = merge_sorted(arrays)
+
+        # exclude the end of the range, it belongs to the next tile
+        data = data[data[:, 0] < t_end]
+
+        if len(data) <= 2 * self.TILE_BINS + 1:
+            return data
+
+        columns = [minmax_envelope(data[:, 0], y, self.TILE_BINS) for y in data.T[1:]]
+        t = columns[0][0]
+
+        return np.column_stack([t] + [y for _, y in columns])
+
+    def _read_unindexed(self, path, t_start, t_end):
+
+        try:
+            stat = os.stat(path)
+        except OSError:
+            logger.warning(f"Could not read log file '{path}'", exc_info=True)
+            return np.empty((0, N_COLUMNS))
+
+        # logs written at intervals are replaced, parse them again when they change
+        key = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is not None:
+                self._files.move_to_end(path)
+
+        if entry is not None and entry[0] == key:
+            data = entry[1]
+        else:
+            data = load_log_files([path])
+
+            with self._lock:
+                self._files[path] = (key, data)
+                while len(self._files) > self.FILE_CACHE_SIZE:
+                    self._files.popitem(last=False)
+
+        return data[(data[:, 0] >= t_start) & (data[:, 0] <= t_end)]
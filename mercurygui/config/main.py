@@ -9,9 +9,6 @@ MercuryGUI configuration options
 
 Note: Leave this file free of Qt related imports, so that it can be used to
 quickly load a user config file.
-
-To add:
-* More feed settings, such as refresh rate, etc?
 """
 # local imports
 from mercurygui.config.user import UserConfig
@@ -31,6 +28,7 @@ DEFAULTS = [
             "y": 0,
             "width": 550,
             "height": 650,
+            "performance_hud": False,
         },
     ),
     (
@@ -46,6 +44,73 @@ DEFAULTS = [
             "temperature_module": "",
         },
     ),
+    (
+        "Plot",
+        {
+            "render_profile": "balanced",
+        },
+    ),
+    (
+        "Logging",
+        {
+            "historian": False,
+            "durable": False,
+            "fsync_interval": 5,
+            "max_size_mb": 100,
+            "rotate_daily": True,
+            "compress": True,
+            "max_total_size_mb": 0,
+        },
+    ),
+    # criteria for a stable temperature, see mercurygui.stability
+    (
+        "Stability",
+        {
+            "tolerance": 0.01,
+            "duration": 5.0,
+            "hysteresis": 0.005,
+        },
+    ),
+    # acquisition profiles, see mercurygui.acquisition
+    (
+        "Acquisition",
+        {
+            "profile": "normal",
+        },
+    ),
+    (
+        "Acquisition/normal",
+        {
+            "refresh": 1.0,
+            "fields": ["temperature", "heater", "gas_flow", "alarms"],
+            "poll_intervals": {},
+            "history_hours": 24.0,
+            "log_interval": 10.0,
+            "days_to_keep": 7.0,
+        },
+    ),
+    (
+        "Acquisition/fast-ramp",
+        {
+            "refresh": 0.5,
+            "fields": ["temperature", "heater", "gas_flow", "alarms"],
+            "poll_intervals": {"alarms": 5},
+            "history_hours": 6.0,
+            "log_interval": 1.0,
+            "days_to_keep": 7.0,
+        },
+    ),
+    (
+        "Acquisition/overnight",
+        {
+            "refresh": 5.0,
+            "fields": ["temperature", "heater", "gas_flow", "alarms"],
+            "poll_intervals": {"heater": 30, "gas_flow": 30, "alarms": 60},
+            "history_hours": 24.0,
+            "log_interval": 10.0,
+            "days_to_keep": 14.0,
+        },
+    ),
 ]
 
 
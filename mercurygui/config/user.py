@@ -7,6 +7,7 @@ It's based on the ConfigParser module (present in the standard library).
 
 # Std imports
 import ast
+import copy
 import os
 import os.path as osp
 import sys
@@ -14,14 +15,30 @@ import re
 import shutil
 import time
 import codecs
+import atexit
+import weakref
+import threading
+import contextlib
 import configparser as cp
-from distutils.version import LooseVersion
 
 # Local imports
 from mercurygui.config.base import get_conf_path, get_home_dir
 
 PY2 = sys.version[0] == "2"
 
+# configs with changes which may still be pending on exit, by id since
+# configs are mappings and not hashable
+_configs = weakref.WeakValueDictionary()
+
+
+@atexit.register
+def _flush_all():
+    for config in list(_configs.values()):
+        try:
+            config.flush()
+        except Exception:
+            pass  # reported by _save
+
 
 def is_text_string(obj):
     """Return True if `obj` is a text string, False if it is anything else,
@@ -64,6 +81,9 @@ def check_version(actver, version, cmp_op):
 
     Distributed under the terms of the BSD License.
     """
+    # slow to import and only needed when upgrading old config files
+    from distutils.version import LooseVersion
+
     if isinstance(actver, tuple):
         actver = ".".join([str(i) for i in actver])
 
@@ -132,48 +152,54 @@ class DefaultsConfig(cp.ConfigParser):
 
         self.optionxform = str
 
+        # options may be set and saved from different threads
+        self._lock = threading.RLock()
+
     def _set(self, section, option, value, verbose):
         """
         Private set method
         """
-        if not self.has_section(section):
-            self.add_section(section)
-        if not is_text_string(value):
-            value = repr(value)
-        if verbose:
-            print("%s[ %s ] = %s" % (section, option, value))
-        cp.ConfigParser.set(self, section, option, value)
+        with self._lock:
+            if not self.has_section(section):
+                self.add_section(section)
+            if not is_text_string(value):
+                value = repr(value)
+            if verbose:
+                print("%s[ %s ] = %s" % (section, option, value))
+            cp.ConfigParser.set(self, section, option, value)
 
     def _save(self):
         """
         Save config into the associated .ini file
+
+        The config is written to a temporary file which then replaces the
+        .ini file, so that the file is never left truncated or missing.
         """
-        # See Issue 1086 and 1242 for background on why this
-        # method contains all the exception handling.
         fname = self.filename()
+        tmp_fname = fname + ".tmp"
 
-        def _write_file(fname):
-            if PY2:
-                # Python 2
-                with codecs.open(fname, "w", encoding="utf-8") as configfile:
-                    self.write(configfile)
-            else:
-                # Python 3
-                with open(fname, "w", encoding="utf-8") as configfile:
-                    self.write(configfile)
-
-        try:  # the "easy" way
-            _write_file(fname)
-        except IOError:
-            try:  # the "delete and sleep" way
-                if osp.isfile(fname):
-                    os.remove(fname)
-                time.sleep(0.05)
-                _write_file(fname)
-            except Exception as e:
-                print("Failed to write user configuration file.")
-                print("Please submit a bug report.")
-                raise (e)
+        try:
+            with self._lock:
+                if PY2:
+                    # Python 2
+                    with codecs.open(tmp_fname, "w", encoding="utf-8") as configfile:
+                        self.write(configfile)
+                else:
+                    # Python 3
+                    with open(tmp_fname, "w", encoding="utf-8") as configfile:
+                        self.write(configfile)
+            os.replace(tmp_fname, fname)
+        except Exception as e:
+            print("Failed to write user configuration file.")
+            print("Please submit a bug report.")
+            raise (e)
+        finally:
+            # only left behind if writing or replacing failed
+            if osp.exists(tmp_fname):
+                try:
+                    os.remove(tmp_fname)
+                except OSError:
+                    pass
 
     def filename(self):
         """Create a .ini filename located in user home directory.
@@ -219,6 +245,11 @@ class UserConfig(DefaultsConfig):
 
     DEFAULT_SECTION_NAME = "main"
 
+    # saves are delayed by SAVE_DELAY sec after the last change, but by no more
+    # than MAX_SAVE_DELAY sec after the first unsaved change
+    SAVE_DELAY = 0.5
+    MAX_SAVE_DELAY = 2
+
     def __init__(
         self,
         name,
@@ -232,6 +263,15 @@ class UserConfig(DefaultsConfig):
     ):
         DefaultsConfig.__init__(self, name, subfolder)
         self.raw = 1 if raw_mode else 0
+        # parsed values by (section, option), cleared when an option changes
+        self._values = {}
+        self._batch_depth = 0
+        self._unsaved_since = None
+        self._save_deadline = None
+        self._save_changed = threading.Condition(self._lock)
+        self._saver = None
+        # write changes which are still pending on exit
+        _configs[id(self)] = self
         if version is not None and re.match(r"^(\d+).(\d+).(\d+)$", version) is None:
             raise ValueError(
                 "Version number %r is incorrect - must be in X.Y.Z format" % version
@@ -239,6 +279,7 @@ class UserConfig(DefaultsConfig):
         if isinstance(defaults, dict):
             defaults = [(self.DEFAULT_SECTION_NAME, defaults)]
         self.defaults = defaults
+        self._index_defaults()
         if defaults is not None:
             self.reset_to_defaults(save=False)
         fname = self.filename()
@@ -292,7 +333,9 @@ class UserConfig(DefaultsConfig):
             if osp.isfile(fname):
                 try:
                     with codecs.open(fname, encoding="utf-8") as configfile:
-                        self.readfp(configfile)
+                        with self._lock:
+                            self._values.clear()
+                            self.readfp(configfile)
                 except IOError:
                     print("Failed reading file", fname)
 
@@ -360,6 +403,7 @@ class UserConfig(DefaultsConfig):
             for option, value in self.items(section, raw=self.raw):
                 secdict[option] = value
             self.defaults.append((section, secdict))
+        self._index_defaults()
 
     def reset_to_defaults(self, save=True, verbose=False, section=None):
         """
@@ -371,7 +415,7 @@ class UserConfig(DefaultsConfig):
                     value = options[option]
                     self._set(sec, option, value, verbose)
         if save:
-            self._save()
+            self._request_save()
 
     def _check_section_option(self, section, option):
         """
@@ -385,18 +429,30 @@ class UserConfig(DefaultsConfig):
             raise RuntimeError("Argument 'option' must be a string")
         return section
 
+    def _index_defaults(self):
+        """
+        Index default values by (section, option)
+        """
+        self._defaults_index = {}
+        for sec, options in self.defaults or []:
+            for option, value in options.items():
+                self._defaults_index.setdefault((sec, option), value)
+
+    def _set(self, section, option, value, verbose):
+        """
+        Private set method
+        """
+        with self._lock:
+            self._values.pop((section, option), None)
+            DefaultsConfig._set(self, section, option, value, verbose)
+
     def get_default(self, section, option):
         """
         Get Default value for a given (section, option)
         -> useful for type checking in 'get' method
         """
         section = self._check_section_option(section, option)
-        for sec, options in self.defaults:
-            if sec == section:
-                if option in options:
-                    return options[option]
-        else:
-            return NoDefault
+        return self._defaults_index.get((section, option), NoDefault)
 
     def get(self, section, option, default=NoDefault):
         """
@@ -407,6 +463,30 @@ class UserConfig(DefaultsConfig):
         """
         section = self._check_section_option(section, option)
 
+        try:
+            value = self._values[(section, option)]
+        except KeyError:
+            pass
+        else:
+            # lists, dicts, ... must not be changed in the cache
+            if isinstance(value, (list, dict, set)):
+                value = copy.deepcopy(value)
+            return value
+
+        with self._lock:
+            # missing options are set to the default, which is returned as is
+            cache = self.has_option(section, option)
+            value = self._get(section, option, default)
+            if cache:
+                self._values[(section, option)] = value
+            if isinstance(value, (list, dict, set)):
+                value = copy.deepcopy(value)
+            return value
+
+    def _get(self, section, option, default):
+        """
+        Private get method which parses the value of an option
+        """
         if not self.has_section(section):
             if default is NoDefault:
                 raise cp.NoSectionError(section)
@@ -457,9 +537,13 @@ class UserConfig(DefaultsConfig):
         -> called when a new (section, option) is set and no default exists
         """
         section = self._check_section_option(section, option)
-        for sec, options in self.defaults:
-            if sec == section:
-                options[option] = default_value
+        with self._lock:
+            for sec, options in self.defaults:
+                if sec == section:
+                    options[option] = default_value
+                    self._defaults_index[(sec, option)] = default_value
+            # values are parsed according to the type of the default
+            self._values.pop((section, option), None)
 
     def set(self, section, option, value, verbose=False, save=True):
         """
@@ -486,12 +570,84 @@ class UserConfig(DefaultsConfig):
             value = repr(value)
         self._set(section, option, value, verbose)
         if save:
-            self._save()
+            self._request_save()
 
     def remove_section(self, section):
-        cp.ConfigParser.remove_section(self, section)
-        self._save()
+        with self._lock:
+            for key in [k for k in self._values if k[0] == section]:
+                del self._values[key]
+            cp.ConfigParser.remove_section(self, section)
+        self._request_save()
 
     def remove_option(self, section, option):
-        cp.ConfigParser.remove_option(self, section, option)
-        self._save()
+        with self._lock:
+            self._values.pop((section, option), None)
+            cp.ConfigParser.remove_option(self, section, option)
+        self._request_save()
+
+    @contextlib.contextmanager
+    def batch(self):
+        """
+        Context manager to set several options with a single save
+        when the outermost batch exits
+        """
+        with self._lock:
+            self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._batch_depth -= 1
+                done = self._batch_depth == 0
+            if done:
+                self.flush()
+
+    def flush(self):
+        """
+        Save pending changes immediately
+        """
+        with self._lock:
+            self._save_deadline = None
+            if self._unsaved_since is None:
+                return
+            self._unsaved_since = None
+            self._save()
+
+    def _request_save(self):
+        """
+        Save changes in the background once no more changes follow
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._unsaved_since is None:
+                self._unsaved_since = now
+            if self._batch_depth > 0:
+                return
+            self._save_deadline = min(
+                now + self.SAVE_DELAY, self._unsaved_since + self.MAX_SAVE_DELAY
+            )
+            if self._saver is None:
+                self._saver = threading.Thread(
+                    target=self._run_saver, name="ConfigSaver", daemon=True
+                )
+                self._saver.start()
+            self._save_changed.notify()
+
+    def _run_saver(self):
+        """
+        Save changes once the save deadline has passed, runs in a single
+        background thread for the lifetime of the config
+        """
+        with self._lock:
+            while True:
+                if self._save_deadline is None:
+                    self._save_changed.wait()
+                    continue
+                timeout = self._save_deadline - time.monotonic()
+                if timeout > 0:
+                    self._save_changed.wait(timeout)
+                    continue
+                try:
+                    self.flush()
+                except Exception:
+                    pass  # reported by _save, retried with the next change
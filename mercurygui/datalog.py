@@ -0,0 +1,547 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Sam Schott  (ss2151@cam.ac.uk)
+
+(c) Sam Schott; This work is licensed under a Creative Commons
+Attribution-NonCommercial-NoDerivs 2.0 UK: England & Wales License.
+
+"""
+import os
+import re
+import io
+import gzip
+import time
+import bisect
+import threading
+import logging
+from itertools import repeat
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+HEADER = "\t".join(["Time (sec)", "Temperature (K)", "Heater (%)", "Gas flow (%)"])
+N_COLUMNS = 4
+INDEX_SUFFIX = ".idx"
+_SPAN_READ_SIZE = 4 * 1024
+TIME_FORMAT = "%Y-%m-%d_%H-%M-%S"
+
+_log_name_regex = re.compile(
+    r"^(?P<sensor>.+)_(?P<time>\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})\.txt(\.gz)?$"
+)
+
+
+def index_path(path):
+    """Returns the path of the sidecar index for a log file."""
+    return os.fspath(path) + INDEX_SUFFIX
+
+
+def load_index(path):
+    """
+    Loads the sidecar index of a log file.
+
+    :param path: Path of the log file (not of the index).
+    :returns: Tuple of lists with timestamps and byte offsets of indexed rows. Both
+        lists are empty if there is no index or it is not usable.
+    """
+    times = []
+    offsets = []
+
+    try:
+        size = os.path.getsize(path)
+        with open(index_path(path), "rb") as f:
+            for line in f:
+                try:
+                    t, offset = line.split(b"\t")
+                    t, offset = float(t), int(offset)
+                except ValueError:
+                    break  # truncated entry
+                # the log may have been truncated after a crash or is not sorted
+                if offset >= size or (times and t < times[-1]):
+                    break
+                times.append(t)
+                offsets.append(offset)
+    except OSError:
+        pass
+
+    return times, offsets
+
+
+def read_log_file(path, t_start=None, t_end=None):
+    """
+    Reads the rows of a log file within the given time range. If the log has a sidecar
+    index, only the part of the file which contains the time range is read. Otherwise,
+    the entire file is parsed. Compressed logs are supported.
+
+    :param path: Path of the log file.
+    :param t_start: Start time in sec since the epoch.
+    :param t_end: End time in sec since the epoch.
+    :returns: Array of shape (N, 4) with columns time, temperature, heater and gas
+        flow.
+    """
+    path = os.fspath(path)
+
+    if path.endswith(".gz"):
+        with gzip.open(path, "rb") as f:
+            content = f.read()
+    else:
+        times, offsets = load_index(path)
+
+        # start reading at the last indexed row before t_start
+        start_offset = 0
+        if times and t_start is not None:
+            i = bisect.bisect_left(times, t_start) - 1
+            if i >= 0:
+                start_offset = offsets[i]
+
+        # stop reading at the first indexed row after t_end
+        end_offset = None
+        if times and t_end is not None:
+            i = bisect.bisect_right(times, t_end)
+            if i < len(offsets):
+                end_offset = offsets[i]
+
+        with open(path, "rb") as f:
+            f.seek(start_offset)
+            if end_offset is None:
+                content = f.read()
+            else:
+                content = f.read(end_offset - start_offset)
+
+    data = parse_rows(content)
+
+    mask = np.ones(len(data), dtype=bool)
+    if t_start is not None:
+        mask &= data[:, 0] >= t_start
+    if t_end is not None:
+        mask &= data[:, 0] <= t_end
+
+    return data[mask]
+
+
+def parse_rows(content):
+    """
+    Parses rows of a log file.
+
+    :param content: Bytes of the log file or a part of it.
+    :returns: Array of shape (N, 4).
+    """
+    # ignore an incomplete last row of a file which is still written to
+    content = content[: content.rfind(b"\n") + 1]
+
+    # comments are only written as a header, a new file may not have any rows yet
+    start = 0
+    while content.startswith(b"#", start):
+        start = content.find(b"\n", start) + 1
+    if start == len(content):
+        return np.empty((0, N_COLUMNS))
+
+    data = np.loadtxt(io.BytesIO(content), delimiter="\t", comments="#", ndmin=2)
+    return data.reshape(-1, N_COLUMNS)
+
+
+def log_file_start(path):
+    """
+    Returns the start time of a log file from its name.
+
+    :param path: Path of the log file.
+    :returns: Start time in sec since the epoch.
+    :raises ValueError: if the file name does not have the format of a log file.
+    """
+    match = _log_name_regex.match(os.path.basename(path))
+    if not match:
+        raise ValueError(f"'{path}' is not a log file")
+    return time.mktime(time.strptime(match.group("time"), TIME_FORMAT))
+
+
+def new_log_path(log_path, sensor):
+    """
+    Returns the path for a new log file of a sensor with the current time in its name.
+
+    :param log_path: Directory with log files.
+    :param sensor: Sensor name.
+    :returns: Path of the log file.
+    """
+    time_str = time.strftime(TIME_FORMAT)
+    return os.path.join(log_path, f"{sensor}_{time_str}.txt")
+
+
+def log_file_sensor(path):
+    """
+    Returns the name of the sensor of a log file from its file name.
+
+    :param path: Path of the log file.
+    :returns: Sensor name.
+    :raises ValueError: if the file name does not have the format of a log file.
+    """
+    match = _log_name_regex.match(os.path.basename(path))
+    if not match:
+        raise ValueError(f"'{path}' is not a log file")
+    return match.group("sensor")
+
+
+def find_log_files(log_path, sensor, t_start=None, t_end=None):
+    """
+    Finds the log files of a sensor which may contain readings within a time range. The
+    start of a log is given by the time in its file name, the end by its modification
+    time.
+
+    :param log_path: Directory with log files.
+    :param sensor: Nick of the temperature module.
+    :param t_start: Start time in sec since the epoch.
+    :param t_end: End time in sec since the epoch.
+    :returns: List of paths, sorted by the start time of the logs.
+    """
+    try:
+        entries = list(os.scandir(log_path))
+    except FileNotFoundError:
+        return []
+
+    paths = []
+
+    for entry in entries:
+        match = _log_name_regex.match(entry.name)
+        if match and match.group("sensor") == sensor:
+            paths.append(entry.path)
+
+    return select_log_files(paths, t_start, t_end)
+
+
+def select_log_files(paths, t_start=None, t_end=None):
+    """
+    Selects the log files which may contain readings within a time range, see
+    :func:`find_log_files`. Files which are not named like log files cannot be
+    placed in time and are always selected.
+
+    :param paths: Paths of log files.
+    :param t_start: Start time in sec since the epoch.
+    :param t_end: End time in sec since the epoch.
+    :returns: List of paths, sorted by the start time of the logs.
+    """
+    found = []
+
+    for path in paths:
+        try:
+            start = log_file_start(path)
+            end = os.path.getmtime(path)
+        except (ValueError, OSError):
+            found.append((-np.inf, os.fspath(path)))
+            continue
+
+        if t_end is not None and start > t_end:
+            continue
+        if t_start is not None and end < t_start:
+            continue
+
+        found.append((start, os.fspath(path)))
+
+    return [path for _, path in sorted(found)]
+
+
+def read_log_span(path):
+    """
+    Returns the times of the first and the last reading in a log file. Only the first
+    and the last rows are read, compressed logs are decompressed in full.
+
+    :param path: Path of the log file.
+    :returns: Tuple of start and end time in sec since the epoch, or None if the file
+        has no readings.
+    """
+    path = os.fspath(path)
+
+    if path.endswith(".gz"):
+        with gzip.open(path, "rb") as f:
+            content = f.read()
+        size = len(content)
+        head = content[:_SPAN_READ_SIZE]
+        tail = content[-_SPAN_READ_SIZE:]
+    else:
+        with open(path, "rb") as f:
+            head = f.read(_SPAN_READ_SIZE)
+            size = f.seek(0, os.SEEK_END)
+            f.seek(max(size - _SPAN_READ_SIZE, 0))
+            tail = f.read()
+
+    # the first line of the tail may be cut off, parse_rows drops the last line of
+    # the head if it is incomplete
+    if size > _SPAN_READ_SIZE:
+        tail = tail[tail.find(b"\n") + 1 :]
+
+    first = parse_rows(head)
+    last = parse_rows(tail)
+
+    if len(first) == 0 or len(last) == 0:
+        return None
+
+    return first[0, 0], last[-1, 0]
+
+
+def load_log_files(paths, t_start=None, t_end=None, max_workers=None, processes=False):
+    """
+    Reads several log files concurrently and merges their rows into a single array,
+    sorted by time. Files which cannot be read are skipped with a warning.
+
+    Reading is I/O and decompression bound for most files, a thread pool therefore
+    scales well. Use ``processes=True`` for many large, uncompressed files where
+    parsing dominates.
+
+    :param paths: Paths of log files.
+    :param t_start: Start time in sec since the epoch.
+    :param t_end: End time in sec since the epoch.
+    :param max_workers: Maximum number of concurrent reads. Defaults to the number of
+        CPUs, capped by the number of files.
+    :param processes: Use a process pool instead of a thread pool.
+    :returns: Array of shape (N, 4) with columns time, temperature, heater and gas
+        flow.
+    """
+    paths = list(paths)
+
+    if len(paths) == 0:
+        return np.empty((0, N_COLUMNS))
+    elif len(paths) == 1:
+        return _read_log_file_or_empty(paths[0], t_start, t_end)
+
+    max_workers = min(max_workers or os.cpu_count() or 1, len(paths))
+    executor_class = ProcessPoolExecutor if processes else ThreadPoolExecutor
+
+    with executor_class(max_workers=max_workers) as executor:
+        arrays = list(
+            executor.map(_read_log_file_or_empty, paths, repeat(t_start), repeat(t_end))
+        )
+
+    return merge_sorted(arrays)
+
+
+def merge_sorted(arrays):
+    """
+    Merges arrays of rows, each sorted by time, into a single sorted array.
+
+    :param arrays: Iterable of arrays with timestamps in the first column.
+    :returns: Merged array.
+    """
+    arrays = [a for a in arrays if len(a) > 0]
+
+    if len(arrays) == 0:
+        return np.empty((0, N_COLUMNS))
+
+    arrays.sort(key=lambda a: a[0, 0])
+    merged = np.concatenate(arrays)
+
+    # logs of consecutive sessions usually do not overlap and concatenating the
+    # arrays is sufficient
+    if all(a[-1, 0] <= b[0, 0] for a, b in zip(arrays[:-1], arrays[1:])):
+        return merged
+
+    # otherwise merge the sorted runs: a stable sort (timsort) detects the presorted
+    # runs and only needs to merge them
+    order = np.argsort(merged[:, 0], kind="stable")
+    return merged[order]
+
+
+def _read_log_file_or_empty(path, t_start, t_end):
+    try:
+        return read_log_file(path, t_start, t_end)
+    except (OSError, ValueError):
+        logger.warning(f"Could not read log file '{path}'", exc_info=True)
+        return np.empty((0, N_COLUMNS))
+
+
+def _is_valid_row(line):
+    """Checks if a line of a log file is a comment or a complete row of data."""
+    line = line.strip()
+    if line.startswith(b"#"):
+        return True
+    fields = line.split(b"\t")
+    if len(fields) != N_COLUMNS:
+        return False
+    try:
+        [float(f) for f in fields]
+    except ValueError:
+        return False
+    return True
+
+
+def recover_log_file(path, tail_size=64 * 1024):
+    """
+    Removes a truncated or corrupted tail from a log file, for instance after a crash
+    or power cut during a write. Only the last ``tail_size`` bytes are inspected.
+
+    :param path: Path of the log file.
+    :param tail_size: Number of bytes at the end of the file to check.
+    :returns: Number of bytes removed.
+    """
+    with open(path, "r+b") as f:
+        size = f.seek(0, os.SEEK_END)
+        start = max(size - tail_size, 0)
+        f.seek(start)
+        tail = f.read()
+
+        # drop trailing lines which are incomplete or do not parse, this includes
+        # zero-filled blocks left behind by a power cut
+        end = len(tail)
+        while end > 0:
+            line_start = tail.rfind(b"\n", 0, end - 1) + 1
+            line = tail[line_start:end]
+            if line.endswith(b"\n") and _is_valid_row(line):
+                break
+            if line_start == 0 and start > 0:
+                # the first line of the tail starts before it and cannot be checked,
+                # keep it rather than cutting the file in the middle of a row
+                break
+            end = line_start
+
+        removed = len(tail) - end
+        if removed > 0:
+            f.truncate(start + end)
+            logger.warning(f"Removed {removed} bytes of corrupted data from '{path}'")
+
+    return removed
+
+
+class LogWriter:
+    """
+    Appends readings to a tab-separated log file. Every row is handed to the operating
+    system as soon as it is written, so a crash of the application does not lose data.
+    To protect against power cuts, the file is synced to disk from a background thread
+    at most every ``fsync_interval`` seconds. This bounds the loss window without the
+    overhead of an fsync for every reading.
+
+    Every ``index_interval`` rows, the timestamp and byte offset of the row are
+    recorded in a sidecar index (the log's path with an ".idx" suffix). This allows
+    :func:`read_log_file` to read a time range without parsing the entire file.
+
+    If the file already exists, any truncated tail is removed and new rows are
+    appended.
+
+    :param path: Path of the log file.
+    :param fsync_interval: Interval in sec between syncs to disk.
+    :param index_interval: Number of rows between entries in the sidecar index.
+    """
+
+    def __init__(self, path, fsync_interval=5, index_interval=1000):
+
+        self.fsync_interval = fsync_interval
+        self.index_interval = index_interval
+
+        self._lock = threading.Lock()
+        # held while syncing, files are only closed while holding it
+        self._sync_lock = threading.Lock()
+        self._dirty = False
+        self._open(path)
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="LogWriterSync", daemon=True
+        )
+        self._thread.start()
+
+    def append(self, timestamp, temp, heater, gasflow):
+        """
+        Appends a row to the log file.
+
+        :param timestamp: Time of the reading in sec since the epoch.
+        :param temp: Temperature in K.
+        :param heater: Heater output as fraction of maximum.
+        :param gasflow: Gas flow as fraction of maximum.
+        """
+        line = b"%f\t%f\t%f\t%f\n" % (timestamp, temp, heater, gasflow)
+
+        with self._lock:
+            if self._rows % self.index_interval == 0:
+                self._index.write(b"%f\t%d\n" % (timestamp, self._offset))
+                self._index.flush()
+
+            self._file.write(line)
+            self._file.flush()
+            self._offset += len(line)
+            self._rows += 1
+            self._dirty = True
+
+    def rotate(self, path):
+        """
+        Syncs and closes the current log file and continues logging to a new file. Does
+        nothing if the writer has been closed.
+
+        :param path: Path of the new log file.
+        """
+        with self._lock:
+            if self._file.closed:
+                return
+            old_file = self._file
+            old_index = self._index
+            dirty = self._dirty
+            self._dirty = False
+            self._open(path)
+
+        with self._sync_lock:
+            if dirty:
+                os.fsync(old_file.fileno())
+            old_file.close()
+            old_index.close()
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def sync(self):
+        """Syncs all rows written so far to disk."""
+        with self._sync_lock:
+            with self._lock:
+                if not self._dirty or self._file.closed:
+                    return
+                self._dirty = False
+                file = self._file
+
+            # rotate() and close() wait for the sync lock before closing the file
+            if not file.closed:
+                os.fsync(file.fileno())
+
+    def close(self):
+        """Syncs the log file to disk and closes it."""
+        self._stop.set()
+        self._thread.join()
+        self.sync()
+
+        with self._sync_lock, self._lock:
+            self._file.close()
+            self._index.close()
+
+    def _open(self, path):
+
+        if os.path.isfile(path):
+            recover_log_file(path)
+            self._truncate_index(path)
+
+        self.path = path
+        self.created = time.time()
+
+        self._file = open(path, "ab")
+        self._offset = self._file.tell()
+        self._rows = 0
+
+        if self._offset == 0:
+            header = f"# {HEADER}\n".encode()
+            self._file.write(header)
+            self._file.flush()
+            self._offset += len(header)
+
+        self._index = open(index_path(path), "ab")
+
+    @staticmethod
+    def _truncate_index(path):
+        # entries past the end of a recovered file would point into new rows once it
+        # grows again, keep only those which are still valid
+        times, offsets = load_index(path)
+
+        try:
+            with open(index_path(path), "wb") as f:
+                f.writelines(b"%f\t%d\n" % entry for entry in zip(times, offsets))
+        except OSError:
+            logger.warning(f"Could not rewrite index of '{path}'", exc_info=True)
+
+    def _run(self):
+        while not self._stop.wait(self.fsync_interval):
+            try:
+                self.sync()
+            except OSError:
+                logger.error(f"Could not sync log file '{self.path}'", exc_info=True)
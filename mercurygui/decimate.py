@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Sam Schott  (ss2151@cam.ac.uk)
+
+(c) Sam Schott; This work is licensed under a Creative Commons
+Attribution-NonCommercial-NoDerivs 2.0 UK: England & Wales License.
+
+"""
+import numpy as np
+
+
+def visible_slice(x, x_start, x_end):
+    """
+    Returns the slice of sorted data ``x`` within the given range, including one point
+    on either side so that a line plot extends to the edges of the range.
+    """
+    i_start = max(np.searchsorted(x, x_start, side="left") - 1, 0)
+    i_end = min(np.searchsorted(x, x_end, side="right") + 1, len(x))
+    return slice(i_start, i_end)
+
+
+def minmax_envelope(x, y, n_bins):
+    """
+    Decimates a curve to at most two points per bin, the minimum and the maximum of the
+    bin. Unlike subsampling, this keeps every extreme value such as short spikes. Bins
+    are spaced equally in ``x``, one bin per screen pixel gives at most two points per
+    pixel. The first and last point are always kept.
+
+    :param x: Sorted x-data.
+    :param y: Y-data. NaN values are ignored unless an entire bin is NaN.
+    :param n_bins: Number of bins.
+    :returns: Tuple of decimated x- and y-data.
+    """
+    n_bins = max(int(n_bins), 1)
+
+    if len(x) <= 2 * n_bins + 1:
+        return x, y
+
+    edges = np.linspace(x[0], x[-1], n_bins + 1)
+    starts = np.searchsorted(x, edges[:-1], side="left")
+    starts = starts[np.diff(starts, prepend=-1) > 0]  # skip empty bins
+
+    with np.errstate(invalid="ignore"):
+        y_min = np.fmin.reduceat(y, starts)
+        y_max = np.fmax.reduceat(y, starts)
+
+    x_out = np.empty(2 * len(starts) + 1)
+    y_out = np.empty(2 * len(starts) + 1)
+
+    x_out[:-1] = np.repeat(x[starts], 2)
+    y_out[:-1:2] = y_min
+    y_out[1:-1:2] = y_max
+    x_out[-1] = x[-1]
+    y_out[-1] = y[-1]
+
+    return x_out, y_out
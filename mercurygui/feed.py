@@ -8,10 +8,14 @@ Attribution-NonCommercial-NoDerivs 2.0 UK: England & Wales License.
 """
 from PyQt5 import QtCore, QtWidgets
 import sys
+import time
 import logging
-from mercuryitc.mercury_driver import MercuryITC_TEMP
+import threading
 
 from mercurygui.config.main import CONF
+from mercurygui.perf import FeedStats
+from mercurygui.acquisition import FIELDS
+from mercurygui.stability import StabilityDetector
 
 logger = logging.getLogger(__name__)
 
@@ -20,12 +24,31 @@ class MercuryFeed(QtCore.QObject):
     """
     Provides a data feed from the MercuryiTC with the most important readings of the gas
     flow, heater and temperature modules.
+
+    :param mercury: MercuryITC instance.
+    :param temperature: Temperature module.
+    :param refresh: Time in sec between readings.
+    :param fields: Groups of readings to collect, see
+        :data:`mercurygui.acquisition.FIELDS`. Defaults to all groups.
+    :param poll_intervals: Time in sec between readings of a group, by group. Groups
+        which are not given are read at every refresh.
+
+    Every temperature reading updates a :class:`mercurygui.stability.StabilityDetector`
+    with the criteria from the "Stability" config section. Its status is included in
+    the readings as "Stability" and :attr:`stability_signal` emits a
+    :class:`mercurygui.stability.StabilityEvent` when the temperature becomes stable or
+    unstable.
     """
 
     readings_signal = QtCore.pyqtSignal(dict)
     connected_signal = QtCore.pyqtSignal(bool)
+    sequence_signal = QtCore.pyqtSignal(object)
+    stability_signal = QtCore.pyqtSignal(object)
+    _start_signal = QtCore.pyqtSignal()
 
-    def __init__(self, mercury, temperature, refresh=1):
+    def __init__(
+        self, mercury, temperature, refresh=1, fields=FIELDS, poll_intervals=None
+    ):
         super(self.__class__, self).__init__()
 
         self.mercury = mercury
@@ -33,11 +56,16 @@ class MercuryFeed(QtCore.QObject):
         # start worker in thread
         self.thread = QtCore.QThread()
         self.worker = DataCollectionWorker(refresh, self.mercury, temperature)
+        self.worker.fields = fields
+        self.worker.poll_intervals = poll_intervals or {}
         self.worker.moveToThread(self.thread)
         self.worker.readings_signal.connect(self.readings_signal.emit)
         self.worker.connected_signal.connect(self.connected_signal.emit)
+        self.worker.sequence_signal.connect(self.sequence_signal.emit)
+        self.worker.stability_signal.connect(self.stability_signal.emit)
 
         self.thread.started.connect(self.worker.run)
+        self._start_signal.connect(self.worker.run)
         self.thread.start()
 
     @property
@@ -48,6 +76,26 @@ class MercuryFeed(QtCore.QObject):
     def refresh(self, seconds):
         self.worker.refresh = seconds
 
+    @property
+    def fields(self):
+        return self.worker.fields
+
+    @fields.setter
+    def fields(self, fields):
+        self.worker.fields = fields
+
+    @property
+    def poll_intervals(self):
+        return self.worker.poll_intervals
+
+    @poll_intervals.setter
+    def poll_intervals(self, poll_intervals):
+        self.worker.poll_intervals = poll_intervals
+
+    @property
+    def stats(self):
+        return self.worker.stats
+
     @property
     def temperature(self):
         return self.worker.temperature
@@ -55,6 +103,7 @@ class MercuryFeed(QtCore.QObject):
     @temperature.setter
     def temperature(self, module):
         self.worker.temperature = module
+        self.worker.reset_poll_times()
 
     @property
     def heater(self):
@@ -64,12 +113,101 @@ class MercuryFeed(QtCore.QObject):
     def gasflow(self):
         return self.worker.gasflow
 
-    def exit_(self):
-        if self.worker:
-            self.worker.terminate = True
+    def start(self):
+        """
+        Resumes collecting readings after the worker was stopped, for instance because
+        the connection was lost. Does nothing if the worker is running.
+        """
+        # the worker is running or its first run is queued by thread.started
+        if not self.worker.terminate:
+            return
+
+        self.worker.terminate = False
+        self.worker.reset_poll_times()
+        # the temperature may have changed while no readings were taken
+        self.worker.stability.reset()
+        # runs after the current loop has returned, if any
+        self._start_signal.emit()
+
+    @property
+    def stability(self):
+        """The :class:`mercurygui.stability.StabilityStatus` after the last reading."""
+        return self.worker.readings.get("Stability")
+
+    def set_stability_criteria(self, tolerance, duration, hysteresis=None):
+        """
+        Sets the criteria for a stable temperature. Readings taken so far do not count
+        towards the new criteria and the temperature is unstable until they are met,
+        without emitting an event for the change.
+
+        :param tolerance: Allowed deviation from the setpoint in K.
+        :param duration: Time in sec for which the temperature must be within the
+            tolerance.
+        :param hysteresis: Additional deviation in K allowed before a stable temperature
+            becomes unstable.
+        :raises ValueError: if the criteria are invalid.
+        """
+        self.worker.stability = StabilityDetector(tolerance, duration, hysteresis)
+
+    @property
+    def sequence(self):
+        return self.worker.sequence
+
+    def start_sequence(self, runner):
+        """
+        Runs a temperature sequence in the data collection thread. Its progress is
+        emitted with :attr:`sequence_signal`.
+
+        :param runner: :class:`mercurygui.sequence.SequenceRunner`.
+        """
+        if self.worker.sequence:
+            self.worker.sequence.abort()
+        self.worker.sequence = runner
+        self.worker.wake()
+
+    def pause_sequence(self):
+        if self.worker.sequence:
+            self.worker.sequence.pause()
+            self.worker.wake()
+
+    def resume_sequence(self):
+        if self.worker.sequence:
+            self.worker.sequence.resume()
+            self.worker.wake()
+
+    def abort_sequence(self):
+        if self.worker.sequence:
+            self.worker.sequence.abort()
+            self.worker.wake()
+
+    def update_now(self):
+        """
+        Takes the next reading immediately instead of after the refresh interval,
+        including all fields with longer poll intervals.
+        """
+        self.worker.reset_poll_times()
+        self.worker.wake()
+
+    def stop(self, timeout=5):
+        """
+        Stops collecting readings and ends the worker thread. The feed cannot be
+        restarted afterwards.
+
+        :param timeout: Time in sec to wait for a pending query to complete before
+            terminating the thread.
+        """
+        self.worker.stop()
+        self.thread.quit()
+
+        if not self.thread.wait(int(timeout * 1000)):
+            logger.warning("Data collection for %s did not stop, terminating", self)
             self.thread.terminate()
             self.thread.wait()
 
+    def exit_(self):
+        if self.worker:
+            self.stop()
+
         if self.mercury.connected:
             self.mercury.disconnect()
             self.connected_signal.emit(False)
@@ -84,6 +222,8 @@ class DataCollectionWorker(QtCore.QObject):
 
     readings_signal = QtCore.pyqtSignal(object)
     connected_signal = QtCore.pyqtSignal(bool)
+    sequence_signal = QtCore.pyqtSignal(object)
+    stability_signal = QtCore.pyqtSignal(object)
 
     def __init__(self, refresh, mercury, temperature_module):
         QtCore.QObject.__init__(self)
@@ -96,30 +236,100 @@ class DataCollectionWorker(QtCore.QObject):
 
         self.terminate = False
         self.refresh = refresh
+        self.fields = FIELDS
+        self.poll_intervals = {}
         self.readings = {}
+        self.stats = FeedStats()
+        self.sequence = None
+        self.stability = self._load_stability()
+
+        # time of the last reading of each group of fields
+        self._last_read = {}
+        # time of the last readings from time.monotonic
+        self._t_readings = None
+
+        self._wake = threading.Event()
 
+    @QtCore.pyqtSlot()
     def run(self):
         while not self.terminate:
             try:
+                # steps which are due are started before taking new readings
+                self.advance_sequence()
+
+                start = time.perf_counter()
                 self.get_readings()
-                QtCore.QThread.msleep(int(self.refresh * 1000))
+                self.stats.record_cycle(time.perf_counter() - start, self.refresh)
+
+                # sleep until the next reading or sequence step, unless stopped
+                if self._wake.wait(self._sleep_time()):
+                    self._wake.clear()
             except Exception:
+                # the feed is resumed with MercuryFeed.start once reconnected
+                self.stats.record_failure()
+                self.terminate = True
+                if self.sequence:
+                    self.sequence.pause("Paused, connection lost")
+                    self.advance_sequence()
                 self.connected_signal.emit(False)
                 self.mercury.disconnect()
 
-    def get_readings(self):
+    def advance_sequence(self):
+        """Executes the steps of the running sequence which are due, if any."""
+        sequence = self.sequence
 
-        # update assigned modules
-        htr_nick = self.temperature.loop_htr
-        aux_nick = self.temperature.loop_aux
+        if sequence is None or self._t_readings is None:
+            return
 
-        self.heater = next(
-            (m for m in self.mercury.modules if m.nick == htr_nick), None
-        )
-        self.gasflow = next(
-            (m for m in self.mercury.modules if m.nick == aux_nick), None
+        self.sequence_signal.emit(
+            sequence.advance(self.temperature, self.readings, self._t_readings)
         )
 
+        if sequence.done:
+            self.sequence = None
+
+    def _sleep_time(self):
+        deadline = self.sequence.next_deadline() if self.sequence else None
+
+        if deadline is None:
+            return self.refresh
+
+        return min(self.refresh, max(deadline - time.monotonic(), 0))
+
+    @staticmethod
+    def _load_stability():
+        # criteria from the config, durations there are in min
+        options = ("tolerance", "duration", "hysteresis")
+
+        try:
+            tolerance, duration, hysteresis = (
+                CONF.get("Stability", o) for o in options
+            )
+            return StabilityDetector(tolerance, duration * 60, hysteresis)
+        except ValueError as exc:
+            logger.warning("Invalid stability criteria, using defaults: %s", exc)
+            tolerance, duration, hysteresis = (
+                CONF.get_default("Stability", o) for o in options
+            )
+            return StabilityDetector(tolerance, duration * 60, hysteresis)
+
+    def wake(self):
+        """Takes the next reading without waiting for the refresh interval."""
+        self._wake.set()
+
+    def reset_poll_times(self):
+        """Reads all fields in the next cycle, regardless of their poll intervals."""
+        self._last_read = {}
+
+    def stop(self):
+        """Ends the loop in :meth:`run` without waiting for the next reading."""
+        self.terminate = True
+        self._wake.set()
+
+    def get_readings(self):
+
+        now = time.monotonic()
+
         # read temperature data
         self.readings["Temp"] = self.temperature.temp[0]
         self.readings["TempSetpoint"] = self.temperature.loop_tset
@@ -127,36 +337,84 @@ class DataCollectionWorker(QtCore.QObject):
         self.readings["TempRampEnable"] = self.temperature.loop_rena
 
         # read heater data
-        if self.heater:  # if heater is configured for temperature sensor
-            self.readings["HeaterVolt"] = self.heater.volt[0]
-            self.readings["HeaterAuto"] = self.temperature.loop_enab
-            self.readings["HeaterPercent"] = self.temperature.loop_hset
-        else:  # if no heater is configured
+        if self._is_due("heater", now):
+            # update assigned module
+            htr_nick = self.temperature.loop_htr
+            self.heater = next(
+                (m for m in self.mercury.modules if m.nick == htr_nick), None
+            )
+
+            if self.heater:  # if heater is configured for temperature sensor
+                self.readings["HeaterVolt"] = self.heater.volt[0]
+                self.readings["HeaterAuto"] = self.temperature.loop_enab
+                self.readings["HeaterPercent"] = self.temperature.loop_hset
+        elif "heater" not in self.fields:
+            self.heater = None
+
+        if not self.heater:  # if no heater is configured or read
             self.readings["HeaterVolt"] = float("nan")
             self.readings["HeaterAuto"] = "OFF"
-            self.readings["HeaterPercent"] = 0  # 'NaN' values are not accepted by spinbox
+            # 'NaN' values are not accepted by spinbox
+            self.readings["HeaterPercent"] = 0
 
         # read gas flow data
-        if self.gasflow:  # if aux module is configured for temperature sensor
-            self.readings["FlowAuto"] = self.temperature.loop_faut
-            self.readings["FlowPercent"] = self.gasflow.perc[0]
-            self.readings["FlowMin"] = self.gasflow.gmin
-            self.readings["FlowSetpoint"] = self.temperature.loop_fset
-        else:  # if no aux module is configured
+        if self._is_due("gas_flow", now):
+            # update assigned module
+            aux_nick = self.temperature.loop_aux
+            self.gasflow = next(
+                (m for m in self.mercury.modules if m.nick == aux_nick), None
+            )
+
+            if self.gasflow:  # if aux module is configured for temperature sensor
+                self.readings["FlowAuto"] = self.temperature.loop_faut
+                self.readings["FlowPercent"] = self.gasflow.perc[0]
+                self.readings["FlowMin"] = self.gasflow.gmin
+                self.readings["FlowSetpoint"] = self.temperature.loop_fset
+        elif "gas_flow" not in self.fields:
+            self.gasflow = None
+
+        if not self.gasflow:  # if no aux module is configured or read
             self.readings["FlowAuto"] = "OFF"
             self.readings["FlowPercent"] = 0  # 'NaN' values are not accepted by spinbox
             self.readings["FlowMin"] = float("nan")
             self.readings["FlowSetpoint"] = float("nan")
 
         # read alarms
-        alarms = self.mercury.alarms
+        if self._is_due("alarms", now):
+            alarms = self.mercury.alarms
 
-        uids = [m.uid for m in (self.temperature, self.gasflow, self.heater) if m]
+            uids = [m.uid for m in (self.temperature, self.gasflow, self.heater) if m]
 
-        for key in list(alarms.keys()):
-            if key not in uids:
-                del alarms[key]
+            for key in list(alarms.keys()):
+                if key not in uids:
+                    del alarms[key]
 
-        self.readings["Alarms"] = alarms
+            self.readings["Alarms"] = alarms
+        elif "alarms" not in self.fields:
+            self.readings["Alarms"] = {}
+
+        # update the stability with the new temperature
+        self._t_readings = time.monotonic()
+        event = self.stability.update(
+            self._t_readings, self.readings["Temp"], self.readings["TempSetpoint"]
+        )
+        self.readings["Stability"] = self.stability.status()
 
         self.readings_signal.emit(self.readings)
+
+        if event:
+            self.stability_signal.emit(event)
+
+    def _is_due(self, field, now):
+        # whether a group of fields should be read in this cycle
+        if field not in self.fields:
+            return False
+
+        last_read = self._last_read.get(field)
+        interval = self.poll_intervals.get(field, 0)
+
+        if last_read is None or now - last_read >= interval:
+            self._last_read[field] = now
+            return True
+
+        return False
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Sam Schott  (ss2151@cam.ac.uk)
+
+(c) Sam Schott; This work is licensed under a Creative Commons
+Attribution-NonCommercial-NoDerivs 2.0 UK: England & Wales License.
+
+"""
+import time
+import sqlite3
+import threading
+import queue
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Historian:
+    """
+    Stores temperature readings in an SQLite database with one table per temperature
+    module. The database runs in WAL mode so that external scripts can query it while
+    the GUI is logging.
+
+    Readings are queued by :meth:`append` and written in batches by a background
+    thread. Each table has an index on the timestamp column, time-range queries are
+    therefore indexed lookups.
+
+    Columns are the same as in the text log files: time (sec since epoch), temperature
+    (K), heater and gas flow (fraction of maximum output).
+
+    :param path: Path of the database file.
+    :param batch_size: Maximum number of rows to insert per transaction.
+    :param flush_interval: Maximum time in sec that readings are held back before
+        being committed.
+    """
+
+    COLUMNS = ("time", "temp", "heater", "gasflow")
+
+    def __init__(self, path, batch_size=500, flush_interval=5):
+
+        self.path = str(path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._queue = queue.Queue()
+        self._local = threading.local()
+        self._tables = set()
+
+        # create database and enable WAL mode before any readers connect
+        con = sqlite3.connect(self.path)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.close()
+
+        self._thread = threading.Thread(
+            target=self._run, name="HistorianWriter", daemon=True
+        )
+        self._thread.start()
+
+    def append(self, sensor, timestamp, temp, heater, gasflow):
+        """
+        Queues a reading for insertion. This returns immediately.
+
+        :param sensor: Nick of the temperature module.
+        :param timestamp: Time of the reading in sec since the epoch.
+        :param temp: Temperature in K.
+        :param heater: Heater output as fraction of maximum.
+        :param gasflow: Gas flow as fraction of maximum.
+        """
+        self._queue.put(
+            (sensor, (float(timestamp), float(temp), float(heater), float(gasflow)))
+        )
+
+    def flush(self):
+        """
+        Blocks until all readings queued so far have been committed. Returns
+        immediately after :meth:`close`, which has committed all readings.
+        """
+        if not self._thread.is_alive():
+            return
+
+        done = threading.Event()
+        self._queue.put(done)
+
+        # the writer thread may be stopped by a concurrent close before getting to it
+        while not done.wait(1):
+            if not self._thread.is_alive():
+                return
+
+    def close(self):
+        """Commits all queued readings and stops the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+    def sensors(self):
+        """Returns the nicks of all temperature modules with stored readings."""
+        res = self._connection().execute(
+            "SELECT name FROM sqlite_master "
+            "WHERE type='table' AND name LIKE 'readings_%'"
+        )
+        return [row[0][len("readings_") :] for row in res]
+
+    # =================== PRIVATE METHODS =========================================
+
+    @staticmethod
+    def _table_name(sensor):
+        name = "readings_" + sensor
+        return '"{}"'.format(name.replace('"', '""'))
+
+    def _connection(self):
+        # sqlite3 connections may not be shared between threads, keep one per thread
+        con = getattr(self._local, "con", None)
+        if con is None:
+            con = sqlite3.connect(self.path)
+            self._local.con = con
+        return con
+
+    def _create_table(self, con, sensor):
+        table = self._table_name(sensor)
+        index = self._table_name("idx_" + sensor)
+        con.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} "
+            "(time REAL NOT NULL, temp REAL, heater REAL, gasflow REAL)"
+        )
+        con.execute(f"CREATE INDEX IF NOT EXISTS {index} ON {table} (time)")
+        self._tables.add(sensor)
+
+    def _write_batch(self, con, batch):
+
+        rows_by_sensor = {}
+        for sensor, row in batch:
+            rows_by_sensor.setdefault(sensor, []).append(row)
+
+        try:
+            with con:  # one transaction per batch
+                for sensor, rows in rows_by_sensor.items():
+                    if sensor not in self._tables:
+                        self._create_table(con, sensor)
+                    con.executemany(
+                        f"INSERT INTO {self._table_name(sensor)} VALUES (?, ?, ?, ?)",
+                        rows,
+                    )
+        except sqlite3.Error:
+            logger.error("Could not write readings to historian", exc_info=True)
+
+    def _run(self):
+
+        con = sqlite3.connect(self.path)
+        con.execute("PRAGMA synchronous=NORMAL")
+
+        stop = False
+
+        while not stop:
+            batch = []
+            events = []
+            deadline = None
+
+            # collect readings until the batch is full or the flush interval has
+            # passed since the first reading of the batch
+            while True:
+                if deadline is None:
+                    timeout = None
+                else:
+                    timeout = max(deadline - time.monotonic(), 0)
+
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+
+                if item is None:
+                    stop = True
+                    break
+                elif isinstance(item, threading.Event):
+                    events.append(item)
+                    break
+
+                batch.append(item)
+
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) >= self.batch_size:
+                    break
+
+            if batch:
+                self._write_batch(con, batch)
+
+            for event in events:
+                event.set()
+
+        con.close()
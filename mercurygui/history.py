@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Sam Schott  (ss2151@cam.ac.uk)
+
+(c) Sam Schott; This work is licensed under a Creative Commons
+Attribution-NonCommercial-NoDerivs 2.0 UK: England & Wales License.
+
+"""
+import numpy as np
+
+
+class HistoryBuffer:
+    """
+    Buffer for the most recent readings with a maximum length.
+
+    Appending is amortized O(1): rows are written into preallocated arrays and old rows
+    are dropped by advancing a start index. The live rows are only moved to the front
+    of the arrays when the end of the allocated capacity is reached.
+
+    :param max_length: Maximum number of rows to keep.
+    :param n_columns: Number of columns per row.
+    """
+
+    MIN_CAPACITY = 1024
+
+    def __init__(self, max_length, n_columns=4):
+        self.max_length = max_length
+        self.n_columns = n_columns
+        self.clear()
+
+    def __len__(self):
+        return self._end - self._start
+
+    def clear(self):
+        """Removes all rows and releases memory."""
+        self._data = np.empty((self.n_columns, self.MIN_CAPACITY))
+        self._start = 0
+        self._end = 0
+
+    def set_max_length(self, max_length):
+        """Changes the maximum number of rows, dropping the oldest rows if needed."""
+        self.max_length = max_length
+
+        if len(self) > max_length:
+            self._start = self._end - max_length
+
+        # release memory which is no longer needed
+        if self._data.shape[1] > max(2 * max_length, self.MIN_CAPACITY):
+            self._make_room()
+
+    def append(self, *row):
+        """Appends a single row, dropping the oldest row if the buffer is full."""
+        if self._end == self._data.shape[1]:
+            self._make_room()
+
+        self._data[:, self._end] = row
+        self._end += 1
+
+        if self._end - self._start > self.max_length:
+            self._start += 1
+
+    def extend(self, data):
+        """
+        Appends several rows, dropping the oldest rows if the buffer is full.
+
+        :param data: Array of shape (n_columns, N).
+        """
+        data = data[:, max(data.shape[1] - self.max_length, 0) :]
+        n = data.shape[1]
+
+        if self._end + n > self._data.shape[1]:
+            self._make_room(n)
+
+        self._data[:, self._end : self._end + n] = data
+        self._end += n
+
+        if self._end - self._start > self.max_length:
+            self._start = self._end - self.max_length
+
+    def column(self, i):
+        """Returns a view of the i-th column, oldest rows first."""
+        return self._data[i, self._start : self._end]
+
+    @property
+    def data(self):
+        """Returns a view of all rows as an array of shape (n_columns, N)."""
+        return self._data[:, self._start : self._end]
+
+    def _make_room(self, n_new=1):
+        n = len(self)
+        capacity = self._data.shape[1]
+
+        # grow until there is room for max_length rows plus the same amount of
+        # appends before the next compaction
+        if n * 2 > capacity and capacity < 2 * self.max_length:
+            capacity = min(2 * capacity, 2 * self.max_length)
+        elif capacity > max(2 * self.max_length, self.MIN_CAPACITY):
+            capacity = max(2 * self.max_length, self.MIN_CAPACITY)
+
+        capacity = max(capacity, n + n_new)
+
+        new_data = np.empty((self.n_columns, capacity))
+        new_data[:, :n] = self._data[:, self._start : self._end]
+
+        self._data = new_data
+        self._start = 0
+        self._end = n
+
+
+class SensorHistory:
+    """
+    Readings of several sensors on a shared time base, stored in a single
+    :class:`HistoryBuffer`. A reading is merged into the latest row if the row has no
+    value for its sensor yet and was started less than ``merge_interval`` sec earlier.
+    Otherwise, a new row is started. Each row has the time of its first reading, which
+    is used to plot all sensors together with :meth:`temperatures`.
+
+    A row holds the row time in sec since the epoch followed by the time of the
+    reading, the temperature (K), heater and gas flow (fraction of maximum output) of
+    each sensor. The time of each reading is kept so that :meth:`sensor_data` returns
+    the readings as taken. Values which a sensor has not reported for a row are NaN. A
+    row is complete once all sensors have reported or the next row is started.
+
+    :param sensors: List of sensor names.
+    :param max_length: Maximum number of rows to keep.
+    :param merge_interval: Maximum time in sec between readings of the same row. This
+        should match the interval at which readings are taken.
+    """
+
+    FIELDS = ("time", "temp", "heater", "gasflow")
+
+    def __init__(self, sensors, max_length, merge_interval=1):
+        self.sensors = list(sensors)
+        self.max_length = max_length
+        self.merge_interval = merge_interval
+
+        self._buffer = HistoryBuffer(max_length, self._n_columns(len(self.sensors)))
+        self._open = False  # the latest row still takes readings
+
+    def __len__(self):
+        return len(self._buffer)
+
+    def set_sensors(self, sensors):
+        """
+        Changes the sensors. Readings of sensors which are kept are preserved, readings
+        of sensors which are removed are dropped.
+
+        :param sensors: List of sensor names.
+        """
+        old_data = self._buffer.data
+        old_sensors = self.sensors
+
+        self.sensors = list(sensors)
+        self._buffer = HistoryBuffer(
+            self.max_length, self._n_columns(len(self.sensors))
+        )
+        self._open = False
+
+        data = np.full((self._buffer.n_columns, old_data.shape[1]), np.nan)
+        data[0] = old_data[0]
+
+        for sensor in set(old_sensors) & set(self.sensors):
+            data[self._columns(sensor)] = old_data[self._columns(sensor, old_sensors)]
+
+        self._buffer.extend(data)
+
+    def set_max_length(self, max_length):
+        """Changes the maximum number of rows, dropping the oldest rows if needed."""
+        self.max_length = max_length
+        self._buffer.set_max_length(max_length)
+
+    def clear(self, sensor=None):
+        """
+        Removes all rows.
+
+        :param sensor: Only remove the readings of this sensor.
+        """
+        if sensor is None:
+            self._buffer.clear()
+            self._open = False
+        elif sensor in self.sensors:
+            self._buffer.data[self._columns(sensor)] = np.nan
+
+    def append(self, sensor, t, temp, heater, gasflow):
+        """
+        Adds a reading of a sensor. Readings of unknown sensors are ignored.
+
+        :param sensor: Name of the sensor.
+        :param t: Time in sec since the epoch.
+        :param temp: Temperature in K.
+        :param heater: Heater output as fraction of maximum.
+        :param gasflow: Gas flow as fraction of maximum.
+        """
+        if sensor not in self.sensors:
+            return
+
+        columns = self._columns(sensor)
+
+        if self._open:
+            row = self._buffer.data[:, -1]
+            if np.isfinite(row[columns.start]) or t - row[0] >= self.merge_interval:
+                self._open = False
+
+        if not self._open:
+            self._buffer.append(t, *[np.nan] * (self._buffer.n_columns - 1))
+            self._open = True
+
+        row = self._buffer.data[:, -1]  # view into the buffer
+        row[columns] = t, temp, heater, gasflow
+
+        if np.all(np.isfinite(row[1 :: len(self.FIELDS)])):
+            self._open = False
+
+    def sensor_data(self, sensor, t_after=None):
+        """
+        Returns the readings of a sensor with the times at which they were taken,
+        including those in an incomplete row.
+
+        :param sensor: Name of the sensor.
+        :param t_after: Only return readings after this time in sec since the epoch.
+        :returns: Tuple of arrays with the time, temperature, heater and gas flow.
+        """
+        if sensor not in self.sensors:
+            return tuple(np.empty(0) for _ in self.FIELDS)
+
+        # a reading is at most merge_interval later than the start of its row
+        if t_after is None:
+            start = 0
+        else:
+            start = self._index_after(t_after - self.merge_interval)
+
+        data = self._buffer.data[:, start:]
+        t, temp, heater, gasflow = data[self._columns(sensor)]
+
+        mask = np.isfinite(t)
+        if t_after is not None:
+            mask &= t > t_after
+
+        return t[mask], temp[mask], heater[mask], gasflow[mask]
+
+    def temperatures(self, t_after=None):
+        """
+        Returns the temperatures of all sensors in complete rows.
+
+        :param t_after: Only return rows after this time in sec since the epoch.
+        :returns: Tuple of arrays with the row time followed by the temperature of each
+            sensor. Temperatures which a sensor has not reported are NaN.
+        """
+        end = len(self._buffer) - 1 if self._open else len(self._buffer)
+        data = self._buffer.data[:, self._index_after(t_after) : end]
+
+        return (data[0],) + tuple(data[2 :: len(self.FIELDS)])
+
+    def _index_after(self, t_after):
+        if t_after is None:
+            return 0
+        return int(np.searchsorted(self._buffer.column(0), t_after, side="right"))
+
+    def _columns(self, sensor, sensors=None):
+        i = (sensors or self.sensors).index(sensor)
+        n = len(self.FIELDS)
+        return slice(1 + i * n, 1 + (i + 1) * n)
+
+    def _n_columns(self, n_sensors):
+        return 1 + n_sensors * len(self.FIELDS)
@@ -10,26 +10,29 @@ Attribution-NonCommercial-NoDerivs 2.0 UK: England & Wales License.
 # system imports
 import sys
 import os
+import math
 import platform
 import subprocess
-import pkg_resources as pkgr
 import time
-import numpy as np
+import argparse
+import contextlib
+import threading
+import warnings
 import logging
 from pathlib import Path
-from PyQt5 import QtCore, QtWidgets, uic
-from mercuryitc.mercury_driver import MercuryITC_TEMP, MercuryITC_HTR, MercuryITC_AUX
+from PyQt5 import QtCore, QtWidgets
 
-# local imports
+# local imports, modules which are not needed to show the window are imported
+# where they are used to keep the import of this module fast
 from .feed import MercuryFeed
 from .pyqt_labutils import LedIndicator, ConnectionDialog
-from .pyqtplot_canvas import TemperatureHistoryPlot
+from .pyqtplot_canvas import TemperatureHistoryPlot, SensorOverviewPlot
+from .history import SensorHistory
+from .acquisition import load_profiles, SECTION, DEFAULT_PROFILE
+from .ui_cache import load_ui
+from . import startup
 from .config.main import CONF
 
-MAIN_UI_PATH = pkgr.resource_filename("mercurygui", "main.ui")
-PANEL_UI_PATH = pkgr.resource_filename("mercurygui", "panel.ui")
-MODULE_DIALOG_UI_PATH = pkgr.resource_filename("mercurygui", "module_dialog.ui")
-
 logger = logging.getLogger(__name__)
 
 
@@ -42,19 +45,59 @@ class MercuryMonitorApp(QtWidgets.QMainWindow):
     UPDATE_FREQ = 1
     TITLE_TEMPLATE = "MercuryiTC Control"
     log_path = Path.home() / ".mercurygui" / "LOG_FILES"
+    db_path = Path.home() / ".mercurygui" / "history.db"
+    topology_path = Path.home() / ".mercurygui" / "topology.json"
 
     def __init__(self, mercury):
         super(self.__class__, self).__init__()
-        uic.loadUi(MAIN_UI_PATH, self)
+        load_ui("main.ui", self)
 
         self.mercury = mercury
         self._cached_connection_status = False
 
+        # settings for collecting, keeping and logging readings
+        self.profiles = load_profiles(CONF)
+        self.profile = self._get_profile(CONF.get(SECTION, "profile"))
+        self.update_freq = self.profile.refresh
+
+        # optional database of all readings, in addition to the log files
+        if CONF.get("Logging", "historian"):
+            from .historian import Historian
+
+            os.makedirs(self.db_path.parent, exist_ok=True)
+            self.historian = Historian(self.db_path)
+        else:
+            self.historian = None
+
+        # rotate, compress and delete old log files in the background
+        from .retention import RetentionManager
+
+        self.retention = RetentionManager(
+            self.log_path,
+            days_to_keep=self.profile.days_to_keep,
+            max_size_mb=CONF.get("Logging", "max_size_mb"),
+            rotate_daily=CONF.get("Logging", "rotate_daily"),
+            compress=CONF.get("Logging", "compress"),
+            max_total_size_mb=CONF.get("Logging", "max_total_size_mb"),
+        )
+
+        # last known modules of each instrument, to build tabs before connecting
+        from .topology import TopologyCache
+
+        self.topology = TopologyCache(self.topology_path)
+        self.topology.changed.connect(self.on_topology_changed)
+
         # create popup Widgets
         self.connectionDialog = ConnectionDialog(self, self.mercury, CONF)
         self.readingsDialog = ReadingsOverview(self.mercury)
         self.modulesDialog = ModulesDialog(self.mercury)
 
+        # optional readout of acquisition and rendering performance
+        from .perf import PerformanceHud
+
+        self.hud = PerformanceHud(self._get_feeds, self._get_plots, self)
+        self.statusbar.addPermanentWidget(self.hud)
+
         # create LED indicator
         self.led = LedIndicator(self)
         self.statusbar.addPermanentWidget(self.led)
@@ -68,73 +111,275 @@ class MercuryMonitorApp(QtWidgets.QMainWindow):
         self.showLogAction.triggered.connect(self.on_log_clicked)
         self.exitAction.triggered.connect(self.exit_)
         self.readingsAction.triggered.connect(self.on_readings_clicked)
+        self.sequenceAction.triggered.connect(self.on_sequence_clicked)
         self.updateAddressAction.triggered.connect(self.connectionDialog.open)
         self.connectionDialog.accepted.connect(self.build_tabs)
+        self.modulesDialog.progress.connect(self.display_message)
+        self.modulesDialog.failed.connect(self.display_error)
+        self.modulesDialog.reassigned.connect(self.on_modules_reassigned)
+        self.tabWidget.currentChanged.connect(self.on_tab_changed)
 
         self.actionUpdateVeryOften.triggered.connect(lambda: self.set_update_freq(0.5))
         self.actionUpdateOften.triggered.connect(lambda: self.set_update_freq(1))
         self.actionUpdateNormally.triggered.connect(lambda: self.set_update_freq(2))
 
+        self.update_actions = {
+            0.5: self.actionUpdateVeryOften,
+            1: self.actionUpdateOften,
+            2: self.actionUpdateNormally,
+        }
+
         action_group = QtWidgets.QActionGroup(self)
-        action_group.addAction(self.actionUpdateVeryOften)
-        action_group.addAction(self.actionUpdateOften)
-        action_group.addAction(self.actionUpdateNormally)
+        for action in self.update_actions.values():
+            action_group.addAction(action)
+
+        self._check_update_action(self.update_freq)
+
+        self.profile_actions = {}
+
+        profile_group = QtWidgets.QActionGroup(self)
+        for name in self.profiles:
+            action = self.menuAcquisition.addAction(name)
+            action.setCheckable(True)
+            action.triggered.connect(lambda _, n=name: self.set_acquisition_profile(n))
+            profile_group.addAction(action)
+            self.profile_actions[name] = action
+
+        self.profile_actions[self.profile.name].setChecked(True)
+
+        self.render_actions = {
+            "quality": self.actionRenderQuality,
+            "balanced": self.actionRenderBalanced,
+            "low-power": self.actionRenderLowPower,
+        }
+
+        render_group = QtWidgets.QActionGroup(self)
+        for name, action in self.render_actions.items():
+            render_group.addAction(action)
+            action.triggered.connect(lambda _, n=name: self.set_render_profile(n))
+
+        render_profile = CONF.get("Plot", "render_profile")
+        self.render_profile = self._get_render_profile(render_profile)
+        self.render_actions[self.render_profile].setChecked(True)
+
+        self.actionShowPerformance.toggled.connect(self.set_hud_visible)
+        self.actionShowPerformance.setChecked(CONF.get("Window", "performance_hud"))
+        self.hud.setVisible(self.actionShowPerformance.isChecked())
 
         # initially disable menu bar items, will be enabled later individually
         self.modulesAction.setEnabled(False)
         self.readingsAction.setEnabled(False)
+        self.sequenceAction.setEnabled(False)
 
         # check if mercury is connected, connect slots
         self.display_message(f"Looking for Mercury at {self.mercury.visa_address}...")
 
-        # populate panels for temperature modules
+        # readings of all sensors on a shared time base, read by all plots
+        self.history = SensorHistory(
+            [], self._history_length(self.update_freq), self.update_freq
+        )
+
+        # temperatures of all sensors in a single plot, shown as an extra tab
+        self.overview = SensorOverviewPlot(self.history)
+        self.overview.set_render_profile(self.render_profile)
+        self.overview.set_max_age(self.profile.history_hours * 60 * 60)
+
+        # populate panels for temperature modules, panels are created lazily and
+        # reused when reconnecting
         self.panels = {}
+        self._placeholders = {}
+        self._pending_panels = []
+
+        # creates one pending panel per event loop iteration
+        self._panel_timer = QtCore.QTimer()
+        self._panel_timer.setInterval(0)
+        self._panel_timer.setSingleShot(True)
+        self._panel_timer.timeout.connect(self._create_pending_panel)
+
         self.build_tabs()
 
+        self.retention.start()
+
         self.update_timer = QtCore.QTimer()
-        self.update_timer.setInterval(self.UPDATE_FREQ * 1000)
+        self.update_timer.setInterval(int(self.update_freq * 1000))
         self.update_timer.setSingleShot(False)  # set to reoccur
         self.update_timer.timeout.connect(self.update_gui)
         self.update_timer.start()
 
     def set_update_freq(self, seconds):
-        self.update_timer.setInterval(seconds * 1000)
+        self.update_freq = seconds
+        self.update_timer.setInterval(int(seconds * 1000))
+
+        for panel in self.panels.values():
+            if panel.feed:
+                panel.feed.refresh = seconds
+
+        self.history.merge_interval = seconds
+
+        # keep the hours of history of the profile at the new rate, readings which
+        # were taken at a faster rate are kept until they are older than that
+        t_start = time.time() - self.profile.history_hours * 60 * 60
+        n_recent = len(self.history.temperatures(t_start)[0])
+        self.history.set_max_length(max(self._history_length(seconds), n_recent))
+
+    def set_acquisition_profile(self, name):
+        """
+        Selects an acquisition profile and applies it to all running feeds, plots and
+        log files.
+
+        :param name: Name of the profile.
+        """
+        self.profile = self._get_profile(name)
+        CONF.set(SECTION, "profile", self.profile.name)
+
+        self.profile_actions[self.profile.name].setChecked(True)
+        self._check_update_action(self.profile.refresh)
+
+        self.set_update_freq(self.profile.refresh)
+        self.retention.days_to_keep = self.profile.days_to_keep
+        self.overview.set_max_age(self.profile.history_hours * 60 * 60)
 
         for panel in self.panels.values():
-            panel.feed.refresh = seconds
+            panel.apply_profile(self.profile)
+
+        self.display_message(f"Acquisition profile: {self.profile.name}")
+
+    def set_render_profile(self, name):
+        self.render_profile = name
+        CONF.set("Plot", "render_profile", name)
+
+        for panel in self.panels.values():
+            panel.canvas.set_render_profile(name)
+
+        self.overview.set_render_profile(name)
+
+    def set_hud_visible(self, visible):
+        CONF.set("Window", "performance_hud", visible)
+        self.hud.setVisible(visible)
 
     def build_tabs(self):
+        """
+        Shows a tab for each temperature sensor. Panels of sensors which are still
+        present are kept, panels of sensors which are gone are shut down. New panels are
+        created when their tab is shown, the remaining ones shortly after.
+        """
 
-        self.tabWidget.clear()
+        sensor_names = self.topology.get_nicks(self.mercury.visa_address, "TEMP")
+
+        if sensor_names is None:
+            from mercuryitc.mercury_driver import MercuryITC_TEMP
 
-        sensor_names = self._get_nicks(MercuryITC_TEMP)
+            sensor_names = self._get_nicks(MercuryITC_TEMP)
 
         if len(sensor_names) == 0:
             sensor_names.append("...")
 
+        for sensor_name in list(self.panels):
+            if sensor_name not in sensor_names:
+                panel = self.panels.pop(sensor_name)
+                panel.shutdown()
+                panel.deleteLater()
+
+        for sensor_name in list(self._placeholders):
+            if sensor_name not in sensor_names:
+                self._placeholders.pop(sensor_name).deleteLater()
+
+        # the driver creates new modules when reconnecting
+        for panel in self.panels.values():
+            panel.update_temperature_module()
+
+        self.tabWidget.blockSignals(True)
+
+        # removes tabs without deleting their widgets
+        current_widget = self.tabWidget.currentWidget()
+        self.tabWidget.clear()
+
         for sensor_name in sensor_names:
-            panel = ControlPanel(self.mercury, self, sensor_name)
-            self.panels[sensor_name] = panel
-            self.tabWidget.addTab(panel, sensor_name)
+            if sensor_name in self.panels:
+                widget = self.panels[sensor_name]
+            else:
+                widget = self._placeholders.setdefault(sensor_name, QtWidgets.QWidget())
+            self.tabWidget.addTab(widget, sensor_name)
+
+        # compare sensors without switching tabs
+        if sensor_names != self.history.sensors:
+            self.history.set_sensors(sensor_names)
+            self.overview.update_sensors()
+        if len(sensor_names) > 1:
+            self.tabWidget.addTab(self.overview, "All sensors")
+
+        if self.tabWidget.indexOf(current_widget) >= 0:
+            self.tabWidget.setCurrentWidget(current_widget)
+
+        self.tabWidget.blockSignals(False)
+
+        # readings of all sensors are logged, not only of those which have been shown
+        self._pending_panels = list(self._placeholders)
+        self.on_tab_changed(self.tabWidget.currentIndex())
+        self._panel_timer.start()
+
+    def on_topology_changed(self, visa_address):
+        if visa_address == self.mercury.visa_address and self.mercury.connected:
+            self.build_tabs()
+
+    def on_tab_changed(self, index):
+        sensor_name = self.tabWidget.tabText(index)
+        if sensor_name in self._placeholders:
+            self._create_panel(sensor_name)
+
+    def _create_panel(self, sensor_name):
+
+        placeholder = self._placeholders.pop(sensor_name)
+        index = self.tabWidget.indexOf(placeholder)
+
+        panel = ControlPanel(self.mercury, self, sensor_name)
+        self.panels[sensor_name] = panel
+
+        self.tabWidget.blockSignals(True)
+        current_index = self.tabWidget.currentIndex()
+        self.tabWidget.removeTab(index)
+        self.tabWidget.insertTab(index, panel, sensor_name)
+        self.tabWidget.setCurrentIndex(current_index)
+        self.tabWidget.blockSignals(False)
+
+        placeholder.deleteLater()
+
+    def _create_pending_panel(self):
+
+        while self._pending_panels:
+            sensor_name = self._pending_panels.pop(0)
+            if sensor_name in self._placeholders:
+                self._create_panel(sensor_name)
+                break
+
+        if self._pending_panels:
+            self._panel_timer.start()
 
     def update_gui(self):
 
         if not self.mercury.connected:
+            # stop the panels before reconnecting, they resume once connected
+            self.set_connection_status(False)
             self.mercury.connect()
 
-        connected = self.mercury.connected
+        self.set_connection_status(self.mercury.connected)
 
-        if connected is not self._cached_connection_status:
-            # update gui to reflect changed connection status
-            self.update_gui_connection(connected)
-            for panel in self.panels.values():
-                panel.update_gui_connection(connected)
+    def set_connection_status(self, connected):
 
-            if connected:
-                self.build_tabs()
-                self.readingsDialog.build_tabs()
+        if connected is self._cached_connection_status:
+            return
 
-        self._cached_connection_status = self.mercury.connected
+        if connected:
+            self.build_tabs()
+            self.readingsDialog.build_tabs()
+            self.topology.validate(self.mercury)
+
+        # update gui to reflect changed connection status
+        self.update_gui_connection(connected)
+        for panel in self.panels.values():
+            panel.update_gui_connection(connected)
+
+        self._cached_connection_status = connected
 
     # =================== BASIC UI SETUP ==========================================
 
@@ -148,13 +393,20 @@ class MercuryMonitorApp(QtWidgets.QMainWindow):
 
     def save_geometry(self):
         geo = self.geometry()
-        CONF.set("Window", "height", geo.height())
-        CONF.set("Window", "width", geo.width())
-        CONF.set("Window", "x", geo.x())
-        CONF.set("Window", "y", geo.y())
+        with CONF.batch():
+            CONF.set("Window", "height", geo.height())
+            CONF.set("Window", "width", geo.width())
+            CONF.set("Window", "x", geo.x())
+            CONF.set("Window", "y", geo.y())
 
     def exit_(self):
         self.save_geometry()
+        self._panel_timer.stop()
+        for panel in self.panels.values():
+            panel.shutdown()
+        self.retention.stop()
+        if self.historian:
+            self.historian.close()
         self.deleteLater()
 
     def closeEvent(self, event):
@@ -173,6 +425,7 @@ class MercuryMonitorApp(QtWidgets.QMainWindow):
             self.disconnectAction.setEnabled(True)
             self.modulesAction.setEnabled(True)
             self.readingsAction.setEnabled(True)
+            self.sequenceAction.setEnabled(True)
             self.sensorAction.setEnabled(True)
 
         elif not connected:
@@ -183,6 +436,38 @@ class MercuryMonitorApp(QtWidgets.QMainWindow):
             self.disconnectAction.setEnabled(False)
             self.modulesAction.setEnabled(False)
             self.readingsAction.setEnabled(False)
+            self.sequenceAction.setEnabled(False)
+
+    def save_startup_profile_when_done(self, path, timeout=60):
+        """
+        Saves the startup profile once the current panel has received its first reading
+        and painted it, or after a timeout.
+
+        :param path: Path of the JSON report.
+        :param timeout: Time in sec after which to save the profile regardless.
+        """
+        profiler = startup.PROFILER
+
+        def save():
+            if self._startup_profile_saved:
+                return
+            self._startup_profile_saved = True
+
+            try:
+                profiler.write(path)
+            except OSError as exc:
+                self.display_error(f"Could not save startup profile: {exc}")
+            else:
+                self.display_message(f"Startup profile saved to {path}")
+
+        self._startup_profile_saved = False
+
+        panel = self.tabWidget.currentWidget()
+        if isinstance(panel, ControlPanel):
+            profiler.watch(panel, callback=save)
+
+        QtCore.QTimer.singleShot(timeout * 1000, save)
+        QtWidgets.QApplication.instance().aboutToQuit.connect(save)
 
     def display_message(self, text):
         self.statusbar.showMessage(str(text), 5000)
@@ -201,6 +486,40 @@ class MercuryMonitorApp(QtWidgets.QMainWindow):
         self.modulesDialog.update_gui()
         self.modulesDialog.open()
 
+    @QtCore.pyqtSlot()
+    def on_sequence_clicked(self):
+        panel = self.tabWidget.currentWidget()
+
+        if not isinstance(panel, ControlPanel) or not panel.feed:
+            self.display_error("Select a temperature sensor to run a sequence.")
+            return
+
+        path, _ = QtWidgets.QFileDialog.getOpenFileName(
+            self, "Select temperature sequence", "", "Sequences (*.txt *.seq);;All (*)"
+        )
+
+        if not path:
+            return
+
+        from .sequence import load_sequence
+
+        try:
+            steps = load_sequence(path)
+        except (OSError, ValueError) as exc:
+            self.display_error(f"Could not load sequence: {exc}")
+            return
+
+        panel.run_sequence(steps, os.path.basename(path))
+
+    def on_modules_reassigned(self, sensor_names):
+        # show the new heater and gas flow modules without waiting for the next reading
+        for sensor_name in sensor_names:
+            panel = self.panels.get(sensor_name)
+            if panel and panel.feed:
+                panel.feed.update_now()
+
+        self.topology.validate(self.mercury)
+
     @QtCore.pyqtSlot()
     def on_log_clicked(self):
         """
@@ -214,6 +533,38 @@ class MercuryMonitorApp(QtWidgets.QMainWindow):
         else:
             subprocess.Popen(["xdg-open", str(self.log_path)])
 
+    def _get_profile(self, name):
+        if name not in self.profiles:
+            logger.warning(
+                "Unknown acquisition profile '%s', using '%s'", name, DEFAULT_PROFILE
+            )
+            name = DEFAULT_PROFILE
+
+        return self.profiles[name]
+
+    def _get_render_profile(self, name):
+        if name not in TemperatureHistoryPlot.RENDER_PROFILES:
+            default = CONF.get_default("Plot", "render_profile")
+            logger.warning("Unknown rendering profile '%s', using '%s'", name, default)
+            name = default
+
+        return name
+
+    def _history_length(self, refresh):
+        # number of rows in the history of the profile at the given refresh interval
+        return int(math.ceil(self.profile.history_hours * 60 * 60 / refresh))
+
+    def _check_update_action(self, seconds):
+        # the update frequency may not be in the menu
+        for freq, action in self.update_actions.items():
+            action.setChecked(freq == seconds)
+
+    def _get_feeds(self):
+        return {name: panel.feed for name, panel in self.panels.items()}
+
+    def _get_plots(self):
+        return [panel.canvas for panel in self.panels.values()] + [self.overview]
+
     def _get_nicks(self, sensor_type):
         if self.mercury.connected:
             return list(m.nick for m in self.mercury.modules if type(m) == sensor_type)
@@ -223,30 +574,25 @@ class MercuryMonitorApp(QtWidgets.QMainWindow):
 
 # noinspection PyArgumentList
 class ControlPanel(QtWidgets.QMainWindow):
-
-    MAX_DISPLAY = 24 * 60 * 60
-
     def __init__(self, mercury, parent, sensor_name=""):
         super(self.__class__, self).__init__()
-        uic.loadUi(PANEL_UI_PATH, self)
+        load_ui("panel.ui", self)
 
         self.mercury = mercury
         self.parent = parent
 
         self.sensor_name = sensor_name
         self.temperature = self.get_temperature_module(sensor_name)
+        self.feed = None
         if self.temperature:
-            self.feed = MercuryFeed(self.mercury, self.temperature, self.parent.UPDATE_FREQ)
-            self.feed.readings_signal.connect(self.update_gui)
-            self.feed.readings_signal.connect(self.update_plot)
-            self.feed.connected_signal.connect(self.update_gui_connection)
-        else:
-            self.feed = None
+            self.start_feed()
 
         # set up temperature plot, adjust window margins accordingly
         self.canvas = TemperatureHistoryPlot()
+        self.canvas.set_render_profile(self.parent.render_profile)
+        self.canvas.set_max_age(self.parent.profile.history_hours * 60 * 60)
         self.gridLayoutCanvas.addWidget(self.canvas)
-        self.horizontalSlider.setMaximum(self.MAX_DISPLAY / 60)
+        self.horizontalSlider.setMaximum(int(self.parent.profile.history_hours * 60))
 
         # connect slider to plot
         self.horizontalSlider.valueChanged.connect(self.on_slider_changed)
@@ -258,12 +604,8 @@ class ControlPanel(QtWidgets.QMainWindow):
         self.gf1_edit.setMinimalStep(0.1)
         self.h1_edit.setMinimalStep(0.1)
 
-        # set up data vectors for plot
-        self.xdata = np.array([])
-        self.xdata_min_zero = np.array([])
-        self.ydata_tmpr = np.array([])
-        self.ydata_gflw = np.array([])
-        self.ydata_htr = np.array([])
+        # readings are stored once for all sensors by the main window
+        self.canvas.set_source(self.parent.history, self.sensor_name)
 
         # connect to callbacks
         self.t2_edit.returnPressed.connect(self.change_t_setpoint)
@@ -274,6 +616,12 @@ class ControlPanel(QtWidgets.QMainWindow):
         self.gf3_edit.returnPressed.connect(self.change_flow_min)
         self.h1_edit.returnPressed.connect(self.change_heater)
         self.h2_checkbox.clicked.connect(self.change_heater_auto)
+        self.sequence_pause_button.clicked.connect(self.on_sequence_pause_clicked)
+        self.sequence_abort_button.clicked.connect(self.on_sequence_abort_clicked)
+
+        # only shown while a sequence runs
+        self.sequence_name = ""
+        self.show_sequence_controls(False)
 
         # enable or disable controls
         self.update_gui_connection(self.mercury.connected)
@@ -281,28 +629,174 @@ class ControlPanel(QtWidgets.QMainWindow):
         # set up logging to file
         self.setup_logging()
 
+        # load older readings from the log files when browsing the plot
+        from .backfill import HistoryLoader
+
+        self.history_loader = HistoryLoader(self.parent.log_path, self.sensor_name)
+        self.canvas.set_history_loader(self.history_loader)
+
     def get_temperature_module(self, sensor_name):
         """
         Updates module list after the new modules have been selected.
         """
+        from mercuryitc.mercury_driver import MercuryITC_TEMP
+
         # find all temperature modules
         tmp_modules = [m for m in self.mercury.modules if type(m) is MercuryITC_TEMP]
 
+        # find match by the cached address without querying the nick
+        address = self.parent.topology.get_address(
+            self.mercury.visa_address, sensor_name
+        )
+        match = next((m for m in tmp_modules if m.address == address), None)
+
         # find match for given nick
-        match = next((m for m in tmp_modules if m.nick == sensor_name), None)
+        if not match:
+            match = next((m for m in tmp_modules if m.nick == sensor_name), None)
 
         if match:
             temperature = match
+        elif address:
+            # removed from the instrument since it was cached, the tab will be removed
+            temperature = None
         elif tmp_modules:
             logger.warning(f'Sensor "{sensor_name}" not found, choosing first module')
             temperature = tmp_modules[0]
             self.sensor_name = tmp_modules[0].nick
         else:
             temperature = None
-            logger.warning('No temperature sensors found')
+            if self.mercury.connected:
+                logger.warning("No temperature sensors found")
 
         return temperature
 
+    def update_temperature_module(self):
+        """
+        Looks up the temperature module again, for instance after reconnecting.
+        """
+        self.temperature = self.get_temperature_module(self.sensor_name)
+
+        if not self.temperature:
+            return
+
+        if self.feed:
+            self.feed.temperature = self.temperature
+        else:
+            # the panel was created before connecting
+            self.start_feed()
+
+    def start_feed(self):
+        """
+        Starts collecting readings from the temperature module.
+        """
+        self.feed = MercuryFeed(
+            self.mercury,
+            self.temperature,
+            self.parent.update_freq,
+            self.parent.profile.fields,
+            self.parent.profile.poll_intervals,
+        )
+        self.feed.readings_signal.connect(self.update_gui)
+        self.feed.readings_signal.connect(self.update_plot)
+        self.feed.connected_signal.connect(self.update_gui_connection)
+        self.feed.sequence_signal.connect(self.update_sequence_progress)
+        self.feed.stability_signal.connect(self.on_stability_changed)
+
+    def apply_profile(self, profile):
+        """
+        Applies an acquisition profile to the running feed, the plot and the log file.
+        The refresh interval and the length of the history are set by
+        :class:`MercuryMonitorApp`.
+
+        :param profile: :class:`mercurygui.acquisition.AcquisitionProfile`.
+        """
+        if self.feed:
+            self.feed.fields = profile.fields
+            self.feed.poll_intervals = profile.poll_intervals
+            self.feed.update_now()
+
+        self.canvas.set_max_age(profile.history_hours * 60 * 60)
+        self.horizontalSlider.setMaximum(int(profile.history_hours * 60))
+
+        if self.log_timer:
+            self.log_timer.setInterval(int(profile.log_interval * 60 * 1000))
+
+    def shutdown(self):
+        """
+        Stops the data feed and logging to file before the panel is discarded.
+        """
+        self.stop_logging()
+
+        if self.feed:
+            self.feed.stop()
+
+    # =================== SEQUENCES ===============================================
+
+    def run_sequence(self, steps, name=""):
+        """
+        Runs a temperature sequence in the data collection thread of the feed. A
+        sequence which is already running is aborted.
+
+        :param steps: List of :class:`mercurygui.sequence.Step`.
+        :param name: Name of the sequence for display.
+        """
+        from .sequence import SequenceRunner
+
+        self.sequence_name = name
+        self.feed.start_sequence(SequenceRunner(steps, name))
+
+        self.sequence_progress.setMaximum(len(steps))
+        self.sequence_progress.setValue(0)
+        self.sequence_label.setText(f"{name}: starting")
+        self.sequence_pause_button.setText("Pause")
+        self.show_sequence_controls(True)
+
+        self.display_message(f"Running sequence {name} with {len(steps)} steps.")
+
+    def show_sequence_controls(self, visible, buttons=True):
+        self.sequence_label.setVisible(visible)
+        self.sequence_progress.setVisible(visible)
+        self.sequence_pause_button.setVisible(visible and buttons)
+        self.sequence_abort_button.setVisible(visible and buttons)
+
+    def update_sequence_progress(self, progress):
+        """
+        Shows the progress of the running sequence.
+
+        :param progress: :class:`mercurygui.sequence.SequenceProgress`.
+        """
+        from .sequence import SequenceRunner, describe
+
+        self.sequence_progress.setValue(progress.index)
+
+        if progress.state == SequenceRunner.RUNNING:
+            text = f"{self.sequence_name}: {describe(progress.step)}"
+            if progress.remaining is not None:
+                text += f" ({progress.remaining:.0f} s left)"
+            self.sequence_pause_button.setText("Pause")
+        else:
+            text = f"{self.sequence_name}: {progress.message}"
+            self.sequence_pause_button.setText("Resume")
+
+        self.sequence_label.setText(text)
+
+        if progress.state in (
+            SequenceRunner.FINISHED,
+            SequenceRunner.ABORTED,
+            SequenceRunner.FAILED,
+        ):
+            self.show_sequence_controls(True, buttons=False)
+            self.display_message(text)
+
+    def on_sequence_pause_clicked(self):
+        if self.sequence_pause_button.text() == "Pause":
+            self.feed.pause_sequence()
+        else:
+            self.feed.resume_sequence()
+
+    def on_sequence_abort_clicked(self):
+        self.feed.abort_sequence()
+
     # =================== BASIC UI SETUP ==========================================
 
     def on_slider_changed(self):
@@ -310,14 +804,16 @@ class ControlPanel(QtWidgets.QMainWindow):
         sv = self.horizontalSlider.value()
 
         self.timeLabel.setText("Show last %s min" % sv)
-        self.canvas.set_xmin(-sv)
-        self.canvas.p0.setXRange(-sv, 0)
-        self.canvas.p0.enableAutoRange(x=False, y=True)
+        self.canvas.show_last(sv)
 
     def update_gui_connection(self, connected):
 
         if connected:
 
+            # resume readings, stopped when the connection was lost
+            if self.feed:
+                self.feed.start()
+
             # enable controls
             self.t2_edit.setEnabled(True)
             self.r1_edit.setEnabled(True)
@@ -341,7 +837,7 @@ class ControlPanel(QtWidgets.QMainWindow):
             self.h2_checkbox.setEnabled(False)
 
             if self.feed:
-                self.feed.worker.terminate = True
+                self.feed.worker.stop()
 
     def update_gui(self, readings):
         """
@@ -399,39 +895,113 @@ class ControlPanel(QtWidgets.QMainWindow):
         else:
             self.alarm_label.hide()
 
+        # stability
+        self.update_stability(readings["Stability"])
+
+    def update_stability(self, status):
+        """
+        Shows whether the temperature is stable.
+
+        :param status: :class:`mercurygui.stability.StabilityStatus`.
+        """
+        stats = status.stats
+        tolerance = f"\u00B1{status.tolerance * 1000:g} mK"
+
+        if status.stable:
+            text = f"Stable within {tolerance}"
+            self.stability_label.setStyleSheet("color:rgb%s" % str(self.canvas.GREEN))
+        else:
+            if status.remaining is not None:
+                text = f"Settling, stable in {status.remaining:.0f} s"
+            elif math.isfinite(stats.slope):
+                text = f"Not stable, {stats.slope:+.3f} K/min"
+            else:
+                text = "Not stable"
+            self.stability_label.setStyleSheet("")
+
+        self.stability_label.setText(text)
+        self.stability_label.setToolTip(
+            f"Last {stats.span:.0f} s: mean {stats.mean:.4f} K, "
+            f"std {stats.std * 1000:.1f} mK, slope {stats.slope:+.4f} K/min\n"
+            f"Setpoint error: mean {stats.error * 1000:+.1f} mK, "
+            f"max {stats.max_error * 1000:.1f} mK\n"
+            f"Stable when within {tolerance} for {status.duration / 60:g} min"
+        )
+
+    def on_stability_changed(self, event):
+        from .stability import StabilityDetector
+
+        if event.kind == StabilityDetector.STABILIZED:
+            mean = event.status.stats.mean
+            self.display_message(
+                f"{self.sensor_name}: temperature stable at {mean:.3f} K"
+            )
+        else:
+            self.display_message(f"{self.sensor_name}: temperature no longer stable")
+
+    @property
+    def xdata(self):
+        return self.parent.history.sensor_data(self.sensor_name)[0]
+
+    @property
+    def ydata_tmpr(self):
+        return self.parent.history.sensor_data(self.sensor_name)[1]
+
+    @property
+    def ydata_gflw(self):
+        return self.parent.history.sensor_data(self.sensor_name)[3]
+
+    @property
+    def ydata_htr(self):
+        return self.parent.history.sensor_data(self.sensor_name)[2]
+
+    @property
+    def xdata_min_zero(self):
+        """Deprecated, times in min relative to the latest reading."""
+        warnings.warn(
+            "xdata_min_zero is deprecated, use xdata instead",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        xdata = self.xdata
+        if len(xdata) == 0:
+            return xdata
+        return (xdata - xdata[-1]) / 60
+
+    @property
+    def MAX_DISPLAY(self):
+        """Deprecated, maximum number of readings held in memory."""
+        warnings.warn(
+            "MAX_DISPLAY is deprecated, use the history length of the main window",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        return self.parent.history.max_length
+
     def update_plot(self, readings):
         # append data for plotting
-        self.xdata = np.append(self.xdata, time.time())
-        self.ydata_tmpr = np.append(self.ydata_tmpr, readings["Temp"])
-        self.ydata_gflw = np.append(self.ydata_gflw, readings["FlowPercent"] / 100)
-        self.ydata_htr = np.append(self.ydata_htr, readings["HeaterPercent"] / 100)
-
-        # prevent data vector from exceeding MAX_DISPLAY
-        self.xdata = self.xdata[-self.MAX_DISPLAY :]
-        self.ydata_tmpr = self.ydata_tmpr[-self.MAX_DISPLAY :]
-        self.ydata_gflw = self.ydata_gflw[-self.MAX_DISPLAY :]
-        self.ydata_htr = self.ydata_htr[-self.MAX_DISPLAY :]
-
-        # convert xData to minutes and set current time to t = 0
-        self.xdata_min_zero = (self.xdata - self.xdata[-1]) / 60
-
-        # update plot
-        self.canvas.update_data(
-            self.xdata_min_zero, self.ydata_tmpr, self.ydata_gflw, self.ydata_htr
-        )
+        t = time.time()
+        temp = readings["Temp"]
+        gflw = readings["FlowPercent"] / 100
+        htr = readings["HeaterPercent"] / 100
+
+        self.parent.history.append(self.sensor_name, t, temp, htr, gflw)
+
+        # append to log file
+        if self.log_writer:
+            self.log_writer.append(t, temp, htr, gflw)
+
+        # write to database
+        if self.parent.historian:
+            self.parent.historian.append(self.sensor_name, t, temp, htr, gflw)
+
+        # update plots
+        self.canvas.refresh()
+        self.parent.overview.refresh()
 
     def clear_plot(self):
-        # append data for plotting
-        self.xdata = np.array([])
-        self.xdata_min_zero = np.array([])
-        self.ydata_tmpr = np.array([])
-        self.ydata_gflw = np.array([])
-        self.ydata_htr = np.array([])
-
-        # update plot
-        self.canvas.update_data(
-            self.xdata, self.ydata_tmpr, self.ydata_gflw, self.ydata_htr
-        )
+        self.parent.history.clear(self.sensor_name)
+        self.canvas.clear()
 
     def display_message(self, text):
         self.parent.display_message(text)
@@ -443,31 +1013,55 @@ class ControlPanel(QtWidgets.QMainWindow):
 
     def setup_logging(self):
         """
-        Save temperature history to log file at '~/.CustomXepr/LOG_FILES/' every 10 min.
+        Save temperature history to log file at '~/.mercurygui/LOG_FILES/'. By default,
+        the file is rewritten at the log interval of the acquisition profile. In durable
+        mode, every reading is appended to the file as it arrives and synced to disk
+        periodically.
         """
 
         os.makedirs(self.parent.log_path, exist_ok=True)
 
-        # set logging file path
-        time_str = time.strftime("%Y-%m-%d_%H-%M-%S")
-        self.log_file = self.parent.log_path / f"{self.sensor_name}_{time_str}.txt"
+        self.log_writer = None
+        self.log_timer = None
 
-        # delete old log files
-        now = time.time()
-        days_to_keep = 7
+        if CONF.get("Logging", "durable"):
+            from .datalog import LogWriter
+
+            # rotation to a new file is handled by the retention manager
+            fsync_interval = CONF.get("Logging", "fsync_interval")
+            self.log_writer = LogWriter(self.new_log_file(), fsync_interval)
+            self.parent.retention.add_writer(self.log_writer, self.sensor_name)
+        else:
+            self.parent.retention.add_active_file(self.new_log_file())
 
-        for file in os.scandir(self.parent.log_path):
-            if file.stat().st_mtime < now - days_to_keep * 24 * 60 * 60:
-                if file.is_file():
-                    os.remove(file.path)
+            # set up periodic logging
+            t_save = self.parent.profile.log_interval  # (min)
+            self.log_timer = QtCore.QTimer()
+            self.log_timer.setInterval(int(t_save * 60 * 1000))
+            self.log_timer.setSingleShot(False)  # set to reoccur
+            self.log_timer.timeout.connect(self.log_temperature_data)
+            self.log_timer.start()
+
+    def new_log_file(self):
+        """
+        Returns the path for a new log file with the current time in its name.
+        """
+        from .datalog import new_log_path
 
-        # set up periodic logging
-        t_save = 10  # time interval to save temperature data (min)
-        self.log_timer = QtCore.QTimer()
-        self.log_timer.setInterval(t_save * 60 * 1000)
-        self.log_timer.setSingleShot(False)  # set to reoccur
-        self.log_timer.timeout.connect(self.log_temperature_data)
-        self.log_timer.start()
+        self.log_file = Path(new_log_path(self.parent.log_path, self.sensor_name))
+        return self.log_file
+
+    def stop_logging(self):
+        """
+        Stops logging to file and closes the log file.
+        """
+        if self.log_writer:
+            self.parent.retention.remove_writer(self.log_writer)
+            self.log_writer.close()
+            self.log_writer = None
+        if self.log_timer:
+            self.log_timer.stop()
+            self.parent.retention.remove_active_file(self.log_file)
 
     def save_temperature_data(self, path=None):
         # prompt user for file path if not given
@@ -480,15 +1074,11 @@ class ControlPanel(QtWidgets.QMainWindow):
             ["Time (sec)", "Temperature (K)", "Heater (%)", "Gas flow (%)"]
         )
 
-        data_matrix = np.concatenate(
-            (
-                self.xdata[:, np.newaxis],
-                self.ydata_tmpr[:, np.newaxis],
-                self.ydata_htr[:, np.newaxis],
-                self.ydata_gflw[:, np.newaxis],
-            ),
-            axis=1,
-        )
+        import numpy as np
+
+        # columns are time, temperature, heater and gas flow
+        data = self.parent.history.sensor_data(self.sensor_name)
+        data_matrix = np.stack(data, axis=1)
 
         # noinspection PyTypeChecker
         np.savetxt(path, data_matrix, delimiter="\t", header=header, fmt="%f")
@@ -575,17 +1165,17 @@ class ControlPanel(QtWidgets.QMainWindow):
 
 # noinspection PyUnresolvedReferences
 class ReadingsTab(QtWidgets.QWidget):
+    """
+    Shows the cached readings of a module from a :class:`SnapshotService`.
+    """
 
-    EXCEPT = ["read", "write", "query", "CAL_INT", "EXCT_TYPES", "TYPES", "clear_cache"]
-
-    def __init__(self, mercury, module):
+    def __init__(self, snapshots, module):
         super(self.__class__, self).__init__()
 
         self.module = module
-        self.mercury = mercury
+        self.snapshots = snapshots
 
         self.name = module.nick
-        self.attr = dir(module)
 
         self.gridLayout = QtWidgets.QGridLayout(self)
         self.gridLayout.setContentsMargins(0, 0, 0, 0)
@@ -603,34 +1193,56 @@ class ReadingsTab(QtWidgets.QWidget):
         self.lineEdit.setObjectName("lineEdit_%s" % self.name)
         self.gridLayout.addWidget(self.lineEdit, 1, 1, 1, 1)
 
-        readings = [x for x in self.attr if not (x.startswith("_") or x in self.EXCEPT)]
-        self.comboBox.addItems(readings)
+        from .snapshot import readable_attributes
+
+        self.comboBox.addItems(readable_attributes(type(module)))
 
         self.comboBox.currentIndexChanged.connect(self.get_reading)
         self.comboBox.currentIndexChanged.connect(self.get_alarms)
+        self.comboBox.currentIndexChanged.connect(self.request_reading)
+
+    def request_reading(self):
+        """Requests to read the selected variable in the combobox again."""
+        self.snapshots.request(self.module, [self.comboBox.currentText()])
 
     def get_reading(self):
-        """Gets readings of selected variable in combobox."""
+        """Shows the cached reading of the selected variable in the combobox."""
+
+        reading = self.snapshots.get(self.module, self.comboBox.currentText())
+
+        if reading is None:
+            self.lineEdit.setText("--")
+            self.lineEdit.setToolTip("")
+            return
+
+        if reading.error:
+            text = "Error: %s" % reading.error
+        elif isinstance(reading.value, tuple):
+            text = "".join(map(str, reading.value))
+        else:
+            text = str(reading.value)
 
-        reading = getattr(self.module, self.comboBox.currentText())
-        if isinstance(reading, tuple):
-            reading = "".join(map(str, reading))
-        reading = str(reading)
-        self.lineEdit.setText(reading)
+        self.lineEdit.setText(text)
+        self.lineEdit.setToolTip(
+            "Read at %s" % time.strftime("%H:%M:%S", time.localtime(reading.timestamp))
+        )
 
     def get_alarms(self):
-        """Gets alarms of associated module."""
+        """Shows the cached alarms of associated module."""
+        from .snapshot import ALARMS
 
-        # get alarms for all modules
-        try:
-            alarm = self.mercury.alarms[self.module.uid]
-        except KeyError:
-            alarm = "--"
+        reading = self.snapshots.get(self.module, ALARMS)
+        alarm = "--" if reading is None or reading.error else reading.value
 
         self.label.setText("Alarms: %s" % alarm)
 
 
 class ReadingsOverview(QtWidgets.QWidget):
+    """
+    Shows all readings of each module. Readings are cached and refreshed in the
+    background while the widget is visible.
+    """
+
     def __init__(self, mercury, parent=None):
         super(self.__class__, self).__init__(parent=parent)
         self.setWindowTitle("Readings Overview")
@@ -638,12 +1250,18 @@ class ReadingsOverview(QtWidgets.QWidget):
         self.masterGrid = QtWidgets.QGridLayout(self)
         self.masterGrid.setObjectName("gridLayout")
 
+        from .snapshot import SnapshotService
+
         self.mercury = mercury
+        self.snapshots = SnapshotService(mercury)
+        self.snapshots.updated.connect(self.on_snapshot_updated)
 
         # create main tab widget
         self.tabWidget = QtWidgets.QTabWidget(self)
+        self.tabWidget.currentChanged.connect(self.on_tab_changed)
         self.masterGrid.addWidget(self.tabWidget, 0, 0, 1, 1)
 
+        self.readings_tabs = []
         self.build_tabs()
 
         # refresh readings every 3 sec
@@ -653,29 +1271,56 @@ class ReadingsOverview(QtWidgets.QWidget):
 
     def build_tabs(self):
 
+        # readings may be from a different instrument
+        self.snapshots.clear()
+
+        for tab in self.readings_tabs:
+            tab.deleteLater()
+
         # create a tab with combobox and text box for each module
         self.readings_tabs = []
+        self.tabWidget.blockSignals(True)
         self.tabWidget.clear()
 
         for module in self.mercury.modules:
-            new_tab = ReadingsTab(self.mercury, module)
+            new_tab = ReadingsTab(self.snapshots, module)
             self.readings_tabs.append(new_tab)
             self.tabWidget.addTab(new_tab, module.nick)
 
         self.tabWidget.setCurrentIndex(0)
+        self.tabWidget.blockSignals(False)
+
+        if self.isVisible():
+            self.on_tab_changed()
 
     def get_readings(self):
         """
-        Getting alarms of selected tab and update its selected reading, only
-        if QWidget is not hidden.
+        Requests the selected reading and the alarms of the selected tab, only if
+        QWidget is not hidden.
         """
-        if self.isVisible():
-            self.tabWidget.currentWidget().get_reading()
-            self.tabWidget.currentWidget().get_alarms()
+        if self.isVisible() and self.tabWidget.currentWidget():
+            self.tabWidget.currentWidget().request_reading()
+
+    def on_tab_changed(self):
+        """Shows the cached readings of the selected tab and reads all its
+        properties."""
+        tab = self.tabWidget.currentWidget()
+
+        if tab:
+            tab.get_reading()
+            tab.get_alarms()
+            self.snapshots.request(tab.module)
+
+    def on_snapshot_updated(self, module):
+        tab = self.tabWidget.currentWidget()
+
+        if tab and tab.module is module:
+            tab.get_reading()
+            tab.get_alarms()
 
     def show(self):
-        self.get_readings()
         super().show()
+        self.on_tab_changed()
 
 
 class _NoModule:
@@ -686,18 +1331,46 @@ class ModulesDialog(QtWidgets.QDialog):
     """
     Provides a user dialog to select which gasflow and heater modules are associated
     with a temperature sensor.
+
+    The dialog shows the current assignments from a cache which is refreshed in the
+    background. Accepting the dialog applies the new assignment in a background thread,
+    reporting progress with :attr:`progress`. When done, :attr:`reassigned` is emitted
+    with the nicks of all temperature modules whose loop changed. If the assignment
+    fails, changes which have already been made are reverted and :attr:`failed` is
+    emitted with an error message.
     """
 
     accepted = QtCore.pyqtSignal(object)
+    progress = QtCore.pyqtSignal(str)
+    reassigned = QtCore.pyqtSignal(list)
+    failed = QtCore.pyqtSignal(str)
 
     def __init__(self, mercury, parent=None):
         super(self.__class__, self).__init__(parent=parent)
-        uic.loadUi(MODULE_DIALOG_UI_PATH, self)
+        load_ui("module_dialog.ui", self)
 
         self.mercury = mercury
+
+        from .snapshot import SnapshotService
+
+        self.snapshots = SnapshotService(mercury, read_alarms=False)
+        self.snapshots.updated.connect(self.on_snapshot_updated)
+
+        # only one assignment is applied at a time
+        self._lock = threading.Lock()
+
+        # connect callbacks
+        self.comboBoxTEMP.currentIndexChanged.connect(self.on_temp_selected)
+        self.buttonBox.accepted.connect(self.on_accept)
+
         self.update_gui()
 
     def update_gui(self):
+        from mercuryitc.mercury_driver import (
+            MercuryITC_TEMP,
+            MercuryITC_HTR,
+            MercuryITC_AUX,
+        )
 
         self.temp_modules = self._get_modules_for_type(MercuryITC_TEMP)
         self.htr_modules = self._get_modules_for_type(MercuryITC_HTR)
@@ -706,6 +1379,8 @@ class ModulesDialog(QtWidgets.QDialog):
         self.htr_modules.append(_NoModule())
         self.aux_modules.append(_NoModule())
 
+        self.comboBoxTEMP.blockSignals(True)
+
         self.comboBoxTEMP.clear()
         self.comboBoxHTR.clear()
         self.comboBoxAUX.clear()
@@ -714,37 +1389,105 @@ class ModulesDialog(QtWidgets.QDialog):
         self.comboBoxHTR.addItems([m.nick for m in self.htr_modules])
         self.comboBoxAUX.addItems([m.nick for m in self.aux_modules])
 
-        # get current modules
+        self.comboBoxTEMP.blockSignals(False)
+
+        # show cached modules, refresh them in the background
         if len(self.temp_modules) > 0:
             self.comboBoxTEMP.setCurrentIndex(0)
-            self.comboBoxHTR.setCurrentText(self.temp_modules[0].loop_htr)
-            self.comboBoxAUX.setCurrentText(self.temp_modules[0].loop_aux)
+            self.on_temp_selected(0)
 
-        # connect callbacks
-        self.comboBoxTEMP.currentIndexChanged.connect(self.on_temp_selected)
-        self.buttonBox.accepted.connect(self.on_accept)
+        for module in self.temp_modules:
+            self.snapshots.request(module, ["loop_htr", "loop_aux"])
 
     def on_temp_selected(self, index):
         # update content of heater and gasflow combo boxes
-        self.comboBoxHTR.setCurrentText(self.temp_modules[index].loop_htr)
-        self.comboBoxAUX.setCurrentText(self.temp_modules[index].loop_aux)
+        if index < 0:
+            return
+
+        module = self.temp_modules[index]
+
+        for combo_box, name in (
+            (self.comboBoxHTR, "loop_htr"),
+            (self.comboBoxAUX, "loop_aux"),
+        ):
+            reading = self.snapshots.get(module, name)
+            if reading and not reading.error:
+                combo_box.setCurrentText(reading.value)
+
+    def on_snapshot_updated(self, module):
+        index = self.comboBoxTEMP.currentIndex()
+
+        if 0 <= index < len(self.temp_modules) and self.temp_modules[index] is module:
+            self.on_temp_selected(index)
 
     def on_accept(self):
         temp_index = self.comboBoxTEMP.currentIndex()
-        htr_nick = self.comboBoxHTR.currentText()
-        aux_nick = self.comboBoxAUX.currentText()
 
-        # remove heater and gasflow modules from previous loop
-        for module in self.temp_modules:
-            if module is not self.temp_modules[temp_index]:
-                if module.loop_htr == htr_nick:
-                    module.loop_htr = "None"
-                if module.loop_aux == aux_nick:
-                    module.loop_aux = "None"
+        if temp_index < 0:
+            return
 
-        # assign heater and gasflow modules to selected loop
-        self.temp_modules[temp_index].loop_htr = htr_nick
-        self.temp_modules[temp_index].loop_aux = aux_nick
+        thread = threading.Thread(
+            target=self._reassign,
+            args=(
+                self.temp_modules[temp_index],
+                list(self.temp_modules),
+                self.comboBoxHTR.currentText(),
+                self.comboBoxAUX.currentText(),
+            ),
+            name="ModulesDialog",
+            daemon=True,
+        )
+        thread.start()
+
+    def _reassign(self, temperature, temp_modules, htr_nick, aux_nick):
+
+        with self._lock:
+
+            # list all changes first, then apply them
+            changes = []
+
+            try:
+                # remove heater and gasflow modules from previous loop
+                for module in temp_modules:
+                    if module is not temperature:
+                        if module.loop_htr == htr_nick:
+                            changes.append((module, "loop_htr", "None"))
+                        if module.loop_aux == aux_nick:
+                            changes.append((module, "loop_aux", "None"))
+
+                # assign heater and gasflow modules to selected loop
+                changes.append((temperature, "loop_htr", htr_nick))
+                changes.append((temperature, "loop_aux", aux_nick))
+            except Exception as exc:
+                logger.error("Could not read module assignment", exc_info=True)
+                self.failed.emit(f"Could not read module assignment: {exc}")
+                return
+
+            done = []
+
+            try:
+                for module, name, value in changes:
+                    self.progress.emit(
+                        f"Assigning modules ({len(done) + 1}/{len(changes)})..."
+                    )
+                    previous = getattr(module, name)
+                    if previous != value:
+                        setattr(module, name, value)
+                        done.append((module, name, previous))
+            except Exception as exc:
+                logger.error("Could not assign modules", exc_info=True)
+
+                for module, name, previous in reversed(done):
+                    try:
+                        setattr(module, name, previous)
+                    except Exception:
+                        logger.error("Could not revert %s of %s", name, module.nick)
+
+                self.failed.emit(f"Could not assign modules: {exc}")
+                return
+
+            self.progress.emit("Modules assigned to %s" % temperature.nick)
+            self.reassigned.emit(sorted({module.nick for module, _, _ in done}))
 
     def _get_modules_for_type(self, sensor_type):
         return [m for m in self.mercury.modules if type(m) is sensor_type]
@@ -752,18 +1495,51 @@ class ModulesDialog(QtWidgets.QDialog):
 
 def run():
 
+    parser = argparse.ArgumentParser(
+        description="Control the Oxford Instruments MercuryiTC.", allow_abbrev=False
+    )
+    parser.add_argument(
+        startup.OPTION,
+        nargs="?",
+        const=str(startup.REPORT_PATH),
+        metavar="PATH",
+        help="save a report of the startup times as JSON, by default to %(const)s",
+    )
+    # remaining arguments are for Qt
+    args, qt_args = parser.parse_known_args()
+
+    profiler = startup.PROFILER
+    profiler.stop_import_timing()
+    profiler.record("imports", profiler.t_start, time.perf_counter())
+
     from mercuryitc import MercuryITC
     from mercurygui.config.main import CONF
 
-    app = QtWidgets.QApplication(sys.argv)
+    with profiler.measure("QApplication"):
+        app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
 
     mercury_address = CONF.get("Connection", "VISA_ADDRESS")
     visa_library = CONF.get("Connection", "VISA_LIBRARY")
 
-    mercury = MercuryITC(mercury_address, visa_library, open_timeout=1)
+    with contextlib.ExitStack() as stack:
+        if args.profile_startup:
+            # time the steps of the connection within the driver
+            stack.enter_context(profiler.patch(MercuryITC, "connect", "connect"))
+            stack.enter_context(
+                profiler.patch(MercuryITC, "_init_modules", "module discovery")
+            )
+
+        with profiler.measure("MercuryITC", visa_library=visa_library) as info:
+            mercury = MercuryITC(mercury_address, visa_library, open_timeout=1)
+            info["connected"] = mercury.connected
+            info["modules"] = len(mercury.modules)
+
+    with profiler.measure("main window"):
+        mercury_gui = MercuryMonitorApp(mercury)
+        mercury_gui.show()
 
-    mercury_gui = MercuryMonitorApp(mercury)
-    mercury_gui.show()
+    if args.profile_startup:
+        mercury_gui.save_startup_profile_when_done(args.profile_startup)
 
     app.exec_()
 
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Sam Schott  (ss2151@cam.ac.uk)
+
+(c) Sam Schott; This work is licensed under a Creative Commons
+Attribution-NonCommercial-NoDerivs 2.0 UK: England & Wales License.
+
+"""
+import sys
+import time
+import collections
+from PyQt5 import QtCore, QtWidgets
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+class RateCounter:
+    """
+    Counts events and returns their rate over a recent time window. Recording an event
+    only appends a timestamp to a bounded deque, which is thread-safe and cheap enough
+    for the acquisition and render paths.
+
+    :param window: Time window in sec over which the rate is calculated.
+    :param maxlen: Maximum number of timestamps to keep.
+    """
+
+    def __init__(self, window=10, maxlen=512):
+        self.window = window
+        self._times = collections.deque(maxlen=maxlen)
+
+    def tick(self):
+        """Records an event."""
+        self._times.append(time.monotonic())
+
+    def rate(self):
+        """Returns the rate of events in Hz, or 0 if there are too few events."""
+        now = time.monotonic()
+        times = [t for t in list(self._times) if now - t < self.window]
+
+        if len(times) < 2:
+            return 0.0
+
+        # the time since the last event lowers the rate when events stop
+        return (len(times) - 1) / max(times[-1] - times[0], now - times[0])
+
+
+class FeedStats:
+    """
+    Counters of a data feed, updated by the worker after every reading cycle.
+
+    :param maxlen: Number of recent cycles used for the latency statistics.
+    """
+
+    def __init__(self, maxlen=256):
+        self.samples = RateCounter()
+        self.latencies = collections.deque(maxlen=maxlen)
+        self.overruns = 0
+        self.dropped = 0
+
+    def record_cycle(self, duration, interval):
+        """
+        Records a completed reading cycle.
+
+        :param duration: Time in sec taken to query all readings.
+        :param interval: Refresh interval in sec. Cycles which take longer are
+            counted as overruns.
+        """
+        self.samples.tick()
+        self.latencies.append(duration)
+
+        if duration > interval:
+            self.overruns += 1
+
+    def record_failure(self):
+        """Records a reading cycle which failed, for instance on a lost connection."""
+        self.dropped += 1
+
+    def latency(self, percentile):
+        """
+        Returns a percentile of the recent cycle times in sec, or NaN if no cycles have
+        completed.
+
+        :param percentile: Percentile between 0 and 100.
+        """
+        latencies = list(self.latencies)
+        return (
+            float(np.percentile(latencies, percentile)) if latencies else float("nan")
+        )
+
+
+def process_memory():
+    """
+    Returns the memory used by this process in bytes. This is the resident set size
+    where available and the peak resident set size otherwise, or None on platforms
+    where neither can be read.
+    """
+    if resource is None:
+        return None
+
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except OSError:
+        pass
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+class PerformanceHud(QtWidgets.QLabel):
+    """
+    Compact readout of acquisition and rendering performance for the status bar. Shows
+    the sample rate of each feed, the median and 99th percentile time of a reading
+    cycle, the number of overrun and failed cycles, the redraw rate of the plots and
+    the memory used by the process.
+
+    The readout is updated from the counters of :class:`FeedStats` and
+    :class:`RateCounter` once per second while it is shown.
+
+    :param get_feeds: Callable which returns a dictionary of names and feeds, each with
+        a ``stats`` attribute.
+    :param get_plots: Callable which returns a list of plots, each with a
+        ``frame_rate`` attribute.
+    :param parent: Parent widget.
+    """
+
+    INTERVAL = 1
+
+    def __init__(self, get_feeds, get_plots, parent=None):
+        super().__init__(parent)
+
+        self.get_feeds = get_feeds
+        self.get_plots = get_plots
+
+        self.setTextFormat(QtCore.Qt.PlainText)
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(self.INTERVAL * 1000)
+        self.timer.timeout.connect(self.update_text)
+
+    def showEvent(self, event):
+        self.update_text()
+        self.timer.start()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+    def update_text(self):
+
+        feeds = {name: feed.stats for name, feed in self.get_feeds().items() if feed}
+
+        rates = [stats.samples.rate() for stats in feeds.values()]
+        latencies = [t for stats in feeds.values() for t in list(stats.latencies)]
+        overruns = sum(stats.overruns for stats in feeds.values())
+        dropped = sum(stats.dropped for stats in feeds.values())
+        fps = sum(plot.frame_rate.rate() for plot in self.get_plots())
+        memory = process_memory()
+
+        if latencies:
+            median, p99 = np.percentile(latencies, [50, 99]) * 1000
+            latency_text = f"{median:.0f}/{p99:.0f} ms"
+        else:
+            latency_text = "--/-- ms"
+
+        parts = [
+            " ".join(f"{r:.1f}" for r in rates) + " Hz" if rates else "-- Hz",
+            latency_text,
+            f"{overruns} over {dropped} lost",
+            f"{fps:.0f} fps",
+        ]
+
+        if memory is not None:
+            parts.append(f"{memory / 1e6:.0f} MB")
+
+        self.setText("  ".join(parts))
+
+        lines = ["Sample rate, cycle time (median / p99), overrun / failed cycles:"]
+
+        for name, stats in feeds.items():
+            lines.append(
+                f"{name}: {stats.samples.rate():.2f} Hz, "
+                f"{stats.latency(50) * 1000:.0f} / {stats.latency(99) * 1000:.0f} ms, "
+                f"{stats.overruns} / {stats.dropped}"
+            )
+
+        lines.append(f"Plot redraws: {fps:.1f} fps")
+
+        if memory is not None:
+            lines.append(f"Memory: {memory / 1e6:.1f} MB")
+
+        self.setToolTip("\n".join(lines))
@@ -7,10 +7,17 @@ Attribution-NonCommercial-NoDerivs 2.0 UK: England & Wales License.
 
 """
 import sys
+import abc
+import time
+import warnings
+import collections
+import numpy as np
 import pyqtgraph as pg
 from pyqtgraph import functions as fn
 from PyQt5 import QtWidgets, QtCore, QtGui
 
+from .decimate import minmax_envelope, visible_slice
+from .perf import RateCounter
 from .pyqt_labutils.dark_mode_support import (
     LINE_COLOR_DARK,
     LINE_COLOR_LIGHT,
@@ -21,7 +28,374 @@ from .pyqt_labutils.dark_mode_support import (
 pg.setConfigOptions(antialias=True, exitCleanup=False)
 
 
-class TemperatureHistoryPlot(pg.GraphicsView):
+class RelativeTimeAxis(pg.AxisItem):
+    """
+    Axis for absolute x-coordinates which places and labels ticks relative to a moving
+    origin, i.e., the time of the latest reading. Moving the origin only requires
+    repainting the axis, not the data.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.origin = 0
+
+    def set_origin(self, origin):
+        self.origin = origin
+        self.picture = None
+        self.update()
+
+    def tickValues(self, minVal, maxVal, size):
+        levels = super().tickValues(minVal - self.origin, maxVal - self.origin, size)
+        return [
+            (spacing, [v + self.origin for v in values]) for spacing, values in levels
+        ]
+
+    def tickStrings(self, values, scale, spacing):
+        return super().tickStrings([v - self.origin for v in values], scale, spacing)
+
+
+class CurveChunk(pg.PlotCurveItem):
+    """
+    A segment of a :class:`ChunkedCurve` with a fixed capacity. Points are only ever
+    appended, a full chunk is never modified again. When zoomed out, the chunk displays
+    its min / max envelope instead of the raw data. Envelopes are cached per level of
+    detail. When zoomed in, a chunk which extends far beyond the visible range only
+    displays the points around it.
+    """
+
+    def __init__(self, capacity, x=None, **opts):
+        super().__init__(**opts)
+        # x-data may be shared with the chunks of other curves and is then written
+        # by the owner, see :class:`ChunkedCurveGroup`
+        self._owns_x = x is None
+        self.x = np.empty(capacity) if x is None else x
+        self.y = np.empty(capacity)
+        self.n = 0
+        self.y_min = np.inf
+        self.y_max = -np.inf
+
+        self._view = None
+        self._n_bins = None
+        self._window = None
+        self._envelopes = {}
+
+    @property
+    def full(self):
+        return self.n == len(self.x)
+
+    def extend(self, x, y):
+        """
+        Appends as many points as fit into the chunk.
+
+        :returns: Number of points appended.
+        """
+        k = min(len(x), len(self.x) - self.n)
+        if k == 0:
+            return 0
+
+        if self._owns_x:
+            self.x[self.n : self.n + k] = x[:k]
+        self.y[self.n : self.n + k] = y[:k]
+        self.n += k
+
+        # keep track of y-bounds for fast auto-ranging, ignoring NaNs
+        self.y_min = np.fmin(self.y_min, np.fmin.reduce(y[:k]))
+        self.y_max = np.fmax(self.y_max, np.fmax.reduce(y[:k]))
+
+        # the level of detail depends on the width of the chunk
+        self._envelopes.clear()
+        self._n_bins = self._get_n_bins()
+        self._window = self._get_window()
+        self._update_display()
+
+        return k
+
+    def set_view(self, px_per_unit, x_start, x_end):
+        """
+        Sets the level of detail and the visible range.
+
+        :param px_per_unit: Number of pixels per unit along x.
+        :param x_start: Start of the visible range.
+        :param x_end: End of the visible range.
+        """
+        self._view = (px_per_unit, x_start, x_end)
+        n_bins = self._get_n_bins()
+        window = self._get_window()
+
+        if n_bins != self._n_bins or window != self._window:
+            self._n_bins = n_bins
+            self._window = window
+            self._update_display()
+
+    def dataBounds(self, ax, frac=1.0, orthoRange=None):
+        # the displayed data may only be a window of the chunk
+        if ax == 0 and self.n > 0:
+            return self.x[0], self.x[self.n - 1]
+
+        # avoid scanning the data when the chunk is entirely within the visible range
+        if ax == 1 and frac >= 1.0 and self.n > 0 and np.isfinite(self.y_min):
+            if orthoRange is None or (
+                orthoRange[0] <= self.x[0] and self.x[self.n - 1] <= orthoRange[1]
+            ):
+                return self.y_min, self.y_max
+
+        return super().dataBounds(ax, frac, orthoRange)
+
+    def _get_n_bins(self):
+        if self._view is None or self.n == 0:
+            return None
+
+        n_px = (self.x[self.n - 1] - self.x[0]) * self._view[0]
+        # round up to powers of two to reuse envelopes while zooming
+        return 2 ** int(np.ceil(np.log2(max(n_px, 1))))
+
+    def _get_window(self):
+        """
+        Returns the range of x to display, the visible range with a margin on either
+        side, or None to display the entire chunk.
+        """
+        if self._view is None or self.n == 0:
+            return None
+
+        _, x_start, x_end = self._view
+        margin = (x_end - x_start) / 4
+
+        if x_start - margin <= self.x[0] and self.x[self.n - 1] <= x_end + margin:
+            return None
+
+        # keep the current window while the view stays within it
+        if self._window and self._window[0] <= x_start and x_end <= self._window[1]:
+            return self._window
+
+        return x_start - margin, x_end + margin
+
+    def _update_display(self):
+        x = self.x[: self.n]
+        y = self.y[: self.n]
+
+        if self._n_bins is not None and self.n > 2 * self._n_bins + 1:
+            try:
+                x, y = self._envelopes[self._n_bins]
+            except KeyError:
+                x, y = minmax_envelope(x, y, self._n_bins)
+                self._envelopes[self._n_bins] = (x, y)
+
+        if self._window is not None:
+            window = visible_slice(x, *self._window)
+            x, y = x[window], y[window]
+
+        self.setData(x, y)
+
+
+class ChunkedCurve:
+    """
+    A curve which is split into chunks of :attr:`CHUNK_SIZE` points, each in its own
+    :class:`CurveChunk`. Appending points only rebuilds the painter path of the last
+    chunk, the cost of an update is therefore proportional to the new data and not to
+    the length of the curve. Old data is dropped by removing entire chunks.
+
+    Large blocks of points, for instance a history which is loaded at once, are stored
+    in chunks of up to :attr:`MAX_CHUNK_SIZE` points to limit the number of items.
+
+    :param plot_item: Plot to add the chunks to.
+    :param opts: Keyword arguments for :class:`pyqtgraph.PlotCurveItem`.
+    """
+
+    CHUNK_SIZE = 1000
+    MAX_CHUNK_SIZE = 4 * CHUNK_SIZE
+
+    def __init__(self, plot_item, **opts):
+        self.plot_item = plot_item
+        self.opts = opts
+        self.chunks = []
+        self._view = None
+
+    def append(self, x, y):
+        """Appends points to the curve."""
+        while len(x) > 0:
+            if len(self.chunks) == 0 or self.chunks[-1].full:
+                self._add_chunk(len(x))
+            k = self.chunks[-1].extend(x, y)
+            x = x[k:]
+            y = y[k:]
+
+    def trim(self, x_min):
+        """Removes full chunks which lie entirely before x_min."""
+        while self.chunks and self.chunks[0].full and self.chunks[0].x[-1] < x_min:
+            self.plot_item.removeItem(self.chunks.pop(0))
+
+    def clear(self):
+        """Removes all data."""
+        for chunk in self.chunks:
+            self.plot_item.removeItem(chunk)
+        self.chunks.clear()
+
+    def set_view(self, px_per_unit, x_start, x_end):
+        """Sets the level of detail and the visible range, see :class:`CurveChunk`."""
+        self._view = (px_per_unit, x_start, x_end)
+        for chunk in self.chunks:
+            chunk.set_view(*self._view)
+
+    def set_style(self, pen=None, brush=None, fillLevel=None, antialias=None):
+        """Changes the style of all existing and future chunks."""
+        self.opts.update(pen=pen, brush=brush, fillLevel=fillLevel, antialias=antialias)
+        for chunk in self.chunks:
+            chunk.setPen(pen)
+            chunk.setBrush(brush)
+            chunk.setFillLevel(fillLevel)
+            chunk.opts["antialias"] = antialias
+            chunk.update()
+
+    def _add_chunk(self, n_points):
+        # fit large blocks into fewer chunks
+        size = n_points // self.CHUNK_SIZE * self.CHUNK_SIZE
+        size = min(max(size, self.CHUNK_SIZE), self.MAX_CHUNK_SIZE)
+
+        # one extra point to start with the last point of the previous chunk
+        chunk = CurveChunk(size + 1, **self.opts)
+
+        if self._view:
+            chunk.set_view(*self._view)
+        if self.chunks:
+            previous = self.chunks[-1]
+            chunk.extend(previous.x[-1:], previous.y[-1:])
+
+        self.plot_item.addItem(chunk)
+        self.chunks.append(chunk)
+
+
+class HistoryCurve(pg.PlotCurveItem):
+    """
+    A curve for readings loaded from disk. It is ignored when auto-ranging the x-axis,
+    so that loading older readings does not change the visible time range.
+    """
+
+    _auto_ranging = True
+
+    def boundingRect(self):
+        # the painted area still needs the x-range, otherwise the curve is culled
+        self._auto_ranging = False
+        try:
+            return super().boundingRect()
+        finally:
+            self._auto_ranging = True
+
+    def dataBounds(self, ax, frac=1.0, orthoRange=None):
+        if ax == 0 and self._auto_ranging:
+            return None, None
+        return super().dataBounds(ax, frac, orthoRange)
+
+
+class ChunkedCurveGroup:
+    """
+    Several curves which share the same x-data, for instance the readings of multiple
+    sensors on a common time base. The chunks of all curves cover the same range of x
+    and the x-data of each chunk is stored only once.
+
+    :param plot_item: Plot to add the chunks to.
+    :param n_curves: Number of curves.
+    """
+
+    CHUNK_SIZE = ChunkedCurve.CHUNK_SIZE
+
+    def __init__(self, plot_item, n_curves):
+        self.plot_item = plot_item
+        self.opts = [dict() for _ in range(n_curves)]
+        self.chunks = []  # one list of chunks per segment, with a chunk per curve
+        self._view = None
+
+    def append(self, x, ys):
+        """
+        Appends points to all curves.
+
+        :param x: Shared x-data.
+        :param ys: Sequence with y-data for each curve, of the same length as x.
+        """
+        while len(x) > 0:
+            if len(self.chunks) == 0 or self.chunks[-1][0].full:
+                self._add_segment()
+
+            segment = self.chunks[-1]
+            n = segment[0].n
+            k = min(len(x), len(segment[0].x) - n)
+
+            segment[0].x[n : n + k] = x[:k]
+            for chunk, y in zip(segment, ys):
+                chunk.extend(x[:k], y[:k])
+
+            x = x[k:]
+            ys = [y[k:] for y in ys]
+
+    def trim(self, x_min):
+        """Removes full chunks which lie entirely before x_min."""
+        while (
+            self.chunks and self.chunks[0][0].full and self.chunks[0][0].x[-1] < x_min
+        ):
+            for chunk in self.chunks.pop(0):
+                self.plot_item.removeItem(chunk)
+
+    def clear(self):
+        """Removes all data."""
+        for segment in self.chunks:
+            for chunk in segment:
+                self.plot_item.removeItem(chunk)
+        self.chunks.clear()
+
+    def set_view(self, px_per_unit, x_start, x_end):
+        """Sets the level of detail and the visible range, see :class:`CurveChunk`."""
+        self._view = (px_per_unit, x_start, x_end)
+        for segment in self.chunks:
+            for chunk in segment:
+                chunk.set_view(*self._view)
+
+    def set_style(self, i, pen=None, antialias=None):
+        """Changes the style of all existing and future chunks of the i-th curve."""
+        self.opts[i].update(pen=pen, antialias=antialias)
+        for segment in self.chunks:
+            segment[i].setPen(pen)
+            segment[i].opts["antialias"] = antialias
+            segment[i].update()
+
+    def _add_segment(self):
+        # one extra point to start with the last point of the previous chunk
+        x = np.empty(self.CHUNK_SIZE + 1)
+        segment = [CurveChunk(len(x), x=x, **opts) for opts in self.opts]
+
+        if self._view:
+            for chunk in segment:
+                chunk.set_view(*self._view)
+
+        if self.chunks:
+            previous = self.chunks[-1]
+            x[0] = previous[0].x[-1]
+            for chunk, prev in zip(segment, previous):
+                chunk.extend(prev.x[-1:], prev.y[-1:])
+
+        for chunk in segment:
+            self.plot_item.addItem(chunk)
+
+        self.chunks.append(segment)
+
+
+class _ABCQtMeta(type(pg.GraphicsView), abc.ABCMeta):
+    """Metaclass for abstract base classes of Qt widgets."""
+
+
+class TimeSeriesPlot(pg.GraphicsView, metaclass=_ABCQtMeta):
+    """
+    Base class for plots of readings against time. Data are given with absolute
+    timestamps in sec since the epoch and the x-axis is labelled in minutes relative to
+    the latest reading. As new data arrives, the visible range moves along with it.
+
+    New readings are rendered at most at :attr:`max_fps` and only while the plot is
+    shown. Subclasses create their plots with :meth:`add_plot` and implement
+    :meth:`_add_points` and :meth:`_apply_profile`.
+
+    Instead of being given readings, a plot can read them from a shared store when it
+    is rendered. Subclasses then implement :meth:`_read_source` and :meth:`refresh` is
+    called when new readings have been stored. Hidden plots do not hold on to any
+    readings in this case.
+    """
 
     GREEN = (0, 204, 153)
     BLUE = (100, 171, 246)
@@ -38,52 +412,374 @@ class TemperatureHistoryPlot(pg.GraphicsView):
     _xmin = -1
     _xmax = round(-0.006 * _xmin, 4)
 
+    MAX_FPS = 5
+    MAX_AGE = 24 * 60 * 60
+
+    # antialiasing and translucent fills are the most expensive parts of painting
+    RENDER_PROFILES = {
+        "quality": dict(antialias=True, fill=True, line_width=LW, max_fps=10),
+        "balanced": dict(antialias=True, fill=True, line_width=LW, max_fps=5),
+        "low-power": dict(antialias=False, fill=False, line_width=1, max_fps=1),
+    }
+
     _init_done = False
 
     def __init__(self, parent=None):
         super().__init__(parent=parent)
 
+        # new data is rendered at most at max_fps and only while the plot is shown
+        self.max_fps = self.MAX_FPS
+        self._max_age = self.MAX_AGE
+        self._dirty = False
+        self._last_render = 0
+        self._render_timer = QtCore.QTimer(self)
+        self._render_timer.setSingleShot(True)
+        self._render_timer.timeout.connect(self._render)
+
+        # painted frames, shown in the performance readout
+        self.frame_rate = RateCounter()
+
+        # data which has not been plotted yet
+        self._pending = collections.deque()
+        self._pending_arrays = None
+
+        # x-coordinates are in minutes since _t_origin, _now is the latest x-value
+        self._t_origin = None
+        self._t_last = None
+        self._now = 0
+        self._view = None
+
+        self.plots = []
+        self.curves = []
+        self.render_profile = None
+
         # create layout
         self.layout = pg.GraphicsLayout()
         self.layout.setContentsMargins(0, 0, 0, 0)
         self.layout.setSpacing(-1.0)
-        self.layout.layout.setRowPreferredHeight(1, 200)
-        self.layout.layout.setRowPreferredHeight(2, 20)
         self.setBackground(None)
         self.setCentralItem(self.layout)
 
-        # create axes and apply formatting
-        axisItems1 = dict()
-        axisItems2 = dict()
+        # estimate maximum width of x-labels and set axis width accordingly
+        label = QtWidgets.QLabel("299")
+        self._text_width = label.fontMetrics().boundingRect(label.text()).width()
 
+    def add_plot(self, row, col, rowspan=1, colspan=1, **limits):
+        """
+        Creates a plot with formatted axes and adds it to the layout. The x-axes of
+        all plots are linked to the first plot, which also determines the level of
+        detail.
+
+        :param row: Row in the layout.
+        :param col: Column in the layout.
+        :param rowspan: Number of rows spanned.
+        :param colspan: Number of columns spanned.
+        :param limits: Y-limits of the view, passed to
+            :meth:`pyqtgraph.ViewBox.setLimits`.
+        :returns: Plot item.
+        """
+        axisItems = dict()
+
+        for pos in ["left", "top", "right"]:
+            axisItems[pos] = pg.AxisItem(orientation=pos, maxTickLength=-4)
+
+        # x-coordinates are absolute, the time axis is labelled relative to 'now'
+        axisItems["bottom"] = RelativeTimeAxis(orientation="bottom", maxTickLength=-4)
+
+        p = pg.PlotItem(axisItems=axisItems)
+        self.layout.addItem(p, row, col, rowspan, colspan)
+
+        p.vb.setBackgroundColor("w")
+        p.setContentsMargins(1.0, 0.0, 1.0, 0.0)
         for pos in ["bottom", "left", "top", "right"]:
-            axisItems1[pos] = pg.AxisItem(orientation=pos, maxTickLength=-4)
-            axisItems2[pos] = pg.AxisItem(orientation=pos, maxTickLength=-4)
+            ax = p.getAxis(pos)
+            ax.setZValue(0)  # draw on top of patch
+            ax.setVisible(True)  # make all axes visible
+            ax.setPen(width=self.LW * 2 / 3, color=0.5)  # grey spines and ticks
+            ax.setTextPen("k")  # black text
+            ax.setStyle(maxTickLevel=1, autoExpandTextSpace=False, tickTextOffset=4)
+            if pos in ["left", "right"]:
+                ax.setStyle(tickTextWidth=self._text_width + 5)
 
-        self.p0 = pg.PlotItem(axisItems=axisItems1)
-        self.p1 = pg.PlotItem(axisItems=axisItems2)
-        self.layout.addItem(self.p0, 0, 0, 5, 1)
-        self.layout.addItem(self.p1, 5, 0, 1, 1)
+        p.getAxis("top").setTicks([])
+        p.getAxis("right").setTicks([])
 
-        # estimate maximum width of x-labels and set axis width accordingly
-        label = QtWidgets.QLabel("299")
-        text_width = label.fontMetrics().boundingRect(label.text()).width()
+        # override default padding with constant 0.2% padding
+        p.vb.suggestPadding = lambda x: 0.006
+
+        if self.plots:
+            p.setXLink(self.plots[0][0])
+        else:
+            # adjust the level of detail when zooming
+            p.vb.sigXRangeChanged.connect(self._on_view_changed)
+            p.vb.sigResized.connect(self._on_view_changed)
+
+        self.plots.append((p, limits))
+
+        return p
+
+    def clear(self):
+        """Removes all data from the plot."""
+        self._pending.clear()
+        self._pending_arrays = None
+        for curve in self.curves:
+            curve.clear()
+        self._t_origin = None
+        self._t_last = None
+
+    def set_xmin(self, value):
+        """
+        Sets the left limit of the x-axis in minutes relative to the latest reading.
+        """
+        self._xmin = value
+        self._xmax = round(-0.006 * value, 4)
+        self._set_limits()
+
+    def get_xmin(self):
+        return self._xmin
+
+    def show_last(self, minutes):
+        """Shows the last given number of minutes and auto-scales the y-axis."""
+        p = self.plots[0][0]
+        self.set_xmin(-minutes)
+        p.setXRange(self._now - minutes, self._now)
+        p.enableAutoRange(x=False, y=True)
+
+    def set_max_age(self, seconds):
+        """
+        Sets the maximum age of readings in sec. Older readings are removed from the
+        plot.
+        """
+        self._max_age = seconds
+
+        for curve in self.curves:
+            curve.trim(self._now - self._max_age / 60)
+
+    def set_render_profile(self, name):
+        """
+        Sets the rendering profile. This adjusts antialiasing, fills under curves,
+        line widths and the maximum frame rate.
+
+        :param name: One of "quality", "balanced" or "low-power".
+        """
+        if name not in self.RENDER_PROFILES:
+            raise ValueError(
+                f"Unknown rendering profile '{name}', must be one of "
+                f"{list(self.RENDER_PROFILES)}"
+            )
+
+        profile = self.RENDER_PROFILES[name]
+        self.render_profile = name
+        self.max_fps = profile["max_fps"]
+
+        self._apply_profile(profile)
+
+    def refresh(self):
+        """
+        Updates the plot with new readings from its source at the next frame. This
+        returns immediately.
+        """
+        self._dirty = True
+        self._schedule_render()
+
+    def is_shown(self):
+        """Returns True if the plot is visible on screen."""
+        return self.isVisible() and not self.window().isMinimized()
+
+    # =================== RENDERING ===============================================
+
+    def _push(self, row):
+        """Queues a single row of readings, starting with the time in sec."""
+        self._pending.append(row)
+
+        # don't hold on to readings which would be dropped anyways
+        while self._pending[0][0] < row[0] - self._max_age:
+            self._pending.popleft()
+
+        self._dirty = True
+        self._schedule_render()
+
+    def _push_arrays(self, arrays):
+        """Replaces all data with the given columns, starting with the time in sec."""
+        self.clear()
+        self._pending_arrays = tuple(np.asarray(a, dtype=float) for a in arrays)
+        self._dirty = True
+        self._schedule_render()
+
+    def _schedule_render(self):
+        if self._render_timer.isActive() or not self.is_shown():
+            return
+
+        elapsed_ms = (time.monotonic() - self._last_render) * 1000
+        delay_ms = max(1000 / self.max_fps - elapsed_ms, 0)
+        self._render_timer.start(int(delay_ms))
+
+    def _render(self):
+        if not self._dirty or not self.is_shown():
+            return
+
+        self._dirty = False
+        self._last_render = time.monotonic()
+
+        if self._pending_arrays is not None:
+            self._append(*self._pending_arrays)
+            self._pending_arrays = None
+
+        if self._pending:
+            self._append(*np.array(self._pending, dtype=float).T)
+            self._pending.clear()
+
+        columns = self._read_source(self._t_last)
+        if columns is not None:
+            self._append(*columns)
+
+    def _append(self, t, *columns):
+
+        if len(t) == 0:
+            return
+
+        if self._t_origin is None:
+            self._t_origin = t[0]
+
+        x = (t - self._t_origin) / 60
+        self._t_last = t[-1]
+
+        self._add_points(x, columns)
+        self._move_view(x[-1])
+
+        for curve in self.curves:
+            curve.trim(self._now - self._max_age / 60)
+
+    @abc.abstractmethod
+    def _add_points(self, x, columns):
+        """Appends points to the curves."""
+
+    @abc.abstractmethod
+    def _apply_profile(self, profile):
+        """Styles the curves for a rendering profile."""
+
+    def _read_source(self, t_after):
+        """
+        Returns the readings in the source after the given time as a tuple of arrays,
+        starting with the time in sec, or None if the plot has no source.
+        """
+        return None
+
+    def _move_view(self, now):
+        """Moves the visible range and the axis labels along with the latest reading."""
+        delta = now - self._now
+        self._now = now
+
+        self._set_limits()
 
-        for p in [self.p0, self.p1]:
-            p.vb.setBackgroundColor("w")
-            p.setContentsMargins(1.0, 0.0, 1.0, 0.0)
+        for p, _ in self.plots:
+            p.getAxis("bottom").set_origin(now)
+
+        p = self.plots[0][0]
+
+        if delta != 0 and not p.vb.autoRangeEnabled()[0]:
+            (x_start, x_end), _ = p.vb.viewRange()
+            p.setXRange(x_start + delta, x_end + delta, padding=0)
+
+    def _set_limits(self):
+        x_min = self._x_lower_limit()
+        x_max = self._now + self._xmax
+        for p, limits in self.plots:
+            p.setLimits(xMin=x_min, xMax=x_max, **limits)
+
+    def _x_lower_limit(self):
+        return self._now + self._xmin
+
+    def _on_view_changed(self):
+        vb = self.plots[0][0].vb
+        (x_start, x_end), _ = vb.viewRange()
+        width = vb.width()
+
+        if x_end <= x_start or width <= 0:
+            return
+
+        px_per_unit = width / (x_end - x_start)
+
+        # keep the level of detail when the view just moves with new data
+        if self._view and abs(px_per_unit / self._view[0] - 1) < 0.01:
+            px_per_unit = self._view[0]
+
+        self._view = (px_per_unit, x_start, x_end)
+        for curve in self.curves:
+            curve.set_view(*self._view)
+
+    # =================== EVENTS ==================================================
+
+    def paintEvent(self, event):
+        self.frame_rate.tick()
+        super().paintEvent(event)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+
+        # get notified when the window is restored from being minimized
+        self.window().installEventFilter(self)
+
+        # catch up on data which arrived while hidden
+        if self._dirty:
+            self._schedule_render()
+
+    def eventFilter(self, obj, event):
+        if event.type() == QtCore.QEvent.WindowStateChange and self._dirty:
+            self._schedule_render()
+        return False
+
+    def changeEvent(self, QEvent):
+
+        if QEvent.type() == QtCore.QEvent.PaletteChange and self._init_done:
+            self.update_darkmode()
+
+    def update_darkmode(self):
+
+        dark = isDarkWindow()
+
+        # get font color
+        font_color = self.palette().color(QtGui.QPalette.Text)
+        font_color_rgb = [font_color.red(), font_color.green(), font_color.blue()]
+
+        # set colors
+        for p, _ in self.plots:
+            p.vb.setBackgroundColor("k" if dark else "w")
             for pos in ["bottom", "left", "top", "right"]:
                 ax = p.getAxis(pos)
-                ax.setZValue(0)  # draw on top of patch
-                ax.setVisible(True)  # make all axes visible
-                ax.setPen(width=self.LW * 2 / 3, color=0.5)  # grey spines and ticks
-                ax.setTextPen("k")  # black text
-                ax.setStyle(maxTickLevel=1, autoExpandTextSpace=False, tickTextOffset=4)
-                if pos in ["left", "right"]:
-                    ax.setStyle(tickTextWidth=text_width + 5)
+                ax.setTextPen(fn.mkColor(font_color_rgb))  # black text
+
+
+class TemperatureHistoryPlot(TimeSeriesPlot):
+    """
+    Plots the temperature in the top panel and the heater and gas flow output in the
+    bottom panel.
+
+    Readings are either given with :meth:`append_data` and :meth:`set_data` or read
+    from a :class:`mercurygui.history.SensorHistory` set with :meth:`set_source`.
 
-            p.getAxis("top").setTicks([])
-            p.getAxis("right").setTicks([])
+    If a :class:`mercurygui.backfill.HistoryLoader` is set, the plot can be panned and
+    zoomed beyond the readings in memory. Older readings are then loaded from the log
+    files in the background, at the level of detail of the visible range. With
+    :meth:`show_range`, the plot only shows readings from the log files.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent=parent)
+
+        self.history = None
+        self.sensor = None
+
+        self.history_loader = None
+        self._history_request = None
+        self._t_first = None
+
+        self.layout.layout.setRowPreferredHeight(1, 200)
+        self.layout.layout.setRowPreferredHeight(2, 20)
+
+        # create plots
+        self.p0 = self.add_plot(0, 0, 5, 1, yMin=0, yMax=500, minYRange=2.1)
+        self.p1 = self.add_plot(5, 0, 1, 1, yMin=-0.05, yMax=1.05, minYRange=1.1)
 
         # light grey for internal spine
         self.p1.getAxis("top").setPen(width=self.LW * 2 / 3, color=LINE_COLOR_LIGHT)
@@ -100,98 +796,323 @@ class TemperatureHistoryPlot(pg.GraphicsView):
         # set default ranges to start
         self.p0.setXRange(self._xmin, self._xmax, 4)
         self.p0.setYRange(5, 300)
-        self.p0.setLimits(
-            xMin=self._xmin, xMax=self._xmax, yMin=0, yMax=500, minYRange=2.1
-        )
         self.p1.setYRange(-0.02, 1.02)
-        self.p1.setLimits(
-            xMin=self._xmin, xMax=self._xmax, yMin=-0.05, yMax=1.05, minYRange=1.1
-        )
-
-        # link x-axes
-        self.p1.setXLink(self.p0)
-
-        # override default padding with constant 0.2% padding
-        self.p0.vb.suggestPadding = lambda x: 0.006
-        self.p1.vb.suggestPadding = lambda x: 0.006
+        self._set_limits()
 
         # set auto range and mouse panning / zooming
         self.p0.enableAutoRange(x=True, y=True)
         self.p1.enableAutoRange(x=False, y=False)
+        self.p0.setAutoVisible(y=True)
         self.p0.setMouseEnabled(x=True, y=True)
         self.p1.setMouseEnabled(x=True, y=False)
 
-        # enable downsampling and clipping to improve plot performance
-        self.p0.setDownsampling(auto=True, mode="subsample")
-        self.p0.setClipToView(True)
+        # create plot items, styled by the rendering profile
+        self.p_tempr = ChunkedCurve(self.p0)
+        self.p_htr = ChunkedCurve(self.p1)
+        self.p_gflw = ChunkedCurve(self.p1)
+        self.curves = [self.p_tempr, self.p_gflw, self.p_htr]
 
-        self.p1.setDownsampling(auto=True, mode="subsample")
-        self.p1.setClipToView(True)
+        # readings loaded from log files, before the readings in memory
+        self.h_tempr = HistoryCurve()
+        self.h_htr = HistoryCurve()
+        self.h_gflw = HistoryCurve()
+        self.p0.addItem(self.h_tempr)
+        self.p1.addItem(self.h_htr)
+        self.p1.addItem(self.h_gflw)
 
-        # create plot items
-        self.p_tempr = self.p0.plot(
-            [self.get_xmin(), 0], [-1, -1], pen=pg.mkPen(self.GREEN, width=self.LW)
-        )
-        self.p_htr = self.p1.plot(
-            [self.get_xmin(), 0],
-            [0, 0],
-            pen=pg.mkPen(self.RED, width=self.LW),
-            fillLevel=0,
-            fillBrush=self.LIGHT_RED,
-        )
-        self.p_gflw = self.p1.plot(
-            [self.get_xmin(), 0],
-            [0, 0],
-            pen=pg.mkPen(self.BLUE, width=self.LW),
-            fillLevel=0,
-            fillBrush=self.LIGHT_BLUE,
-        )
+        self.set_render_profile("balanced")
 
         # update colors
         self.update_darkmode()
 
         self._init_done = True
 
+    def append_data(self, t, temp, gasflow, heater):
+        """
+        Appends a single reading. This returns immediately, the plot is updated at the
+        next frame. Readings between frames are coalesced into a single update and no
+        frames are rendered while the plot is hidden or its window is minimized.
+
+        :param t: Time in sec since the epoch.
+        :param temp: Temperature in K.
+        :param gasflow: Gas flow as fraction of maximum.
+        :param heater: Heater output as fraction of maximum.
+        """
+        self._push((t, temp, gasflow, heater))
+
+    def set_data(self, t, temp, gasflow, heater):
+        """
+        Replaces all data in the plot.
+
+        :param t: Array of times in sec since the epoch.
+        :param temp: Array of temperatures in K.
+        :param gasflow: Array of gas flow values as fraction of maximum.
+        :param heater: Array of heater values as fraction of maximum.
+        """
+        self._push_arrays((t, temp, gasflow, heater))
+
     def update_data(self, x_data, y_data_t, y_data_g, y_data_h):
-        self.p_tempr.setData(x_data, y_data_t)
-        self.p_gflw.setData(x_data, y_data_g)
-        self.p_htr.setData(x_data, y_data_h)
+        """
+        Replaces all data in the plot.
 
-    def set_xmin(self, value):
-        self._xmin = value
-        self._xmax = round(-0.006 * value, 4)
-        self.p0.setLimits(
-            xMin=self._xmin, xMax=self._xmax, yMin=0, yMax=500, minYRange=2.1
+        .. deprecated:: 3.1.0
+            Use :meth:`set_data` or :meth:`append_data` with absolute times instead.
+
+        :param x_data: Array of times in min relative to the latest reading.
+        :param y_data_t: Array of temperatures in K.
+        :param y_data_g: Array of gas flow values as fraction of maximum.
+        :param y_data_h: Array of heater values as fraction of maximum.
+        """
+        warnings.warn(
+            "update_data is deprecated, use set_data or append_data instead",
+            DeprecationWarning,
+            stacklevel=2,
+        )
+        t = time.time() + np.asarray(x_data, dtype=float) * 60
+        self.set_data(t, y_data_t, y_data_g, y_data_h)
+
+    def set_source(self, history, sensor):
+        """
+        Plots the readings of a sensor from a shared store. This replaces all data in
+        the plot. Call :meth:`refresh` when new readings have been stored.
+
+        :param history: :class:`mercurygui.history.SensorHistory` instance.
+        :param sensor: Name of the sensor.
+        """
+        self.clear()
+        self.history = history
+        self.sensor = sensor
+        self.refresh()
+
+    def set_history_loader(self, loader):
+        """
+        Sets a loader for readings from the log files.
+
+        :param loader: :class:`mercurygui.backfill.HistoryLoader` instance or None.
+        """
+        if self.history_loader:
+            self.history_loader.loaded.disconnect(self._on_history_loaded)
+
+        self.history_loader = loader
+        self._history_request = None
+
+        if loader:
+            loader.loaded.connect(self._on_history_loaded)
+            self._t_first = loader.t_first
+        else:
+            self._t_first = None
+
+        self._set_limits()
+
+    def show_range(self, t_start, t_end):
+        """
+        Removes all data and shows the time range between two times, for instance to
+        browse log files with a history loader. The x-axis is labelled relative to the
+        end of the range.
+
+        :param t_start: Start time in sec since the epoch.
+        :param t_end: End time in sec since the epoch.
+        """
+        self.clear()
+        self._t_origin = t_end
+        self._move_view(0)
+        self.show_last((t_end - t_start) / 60)
+
+    def clear(self):
+        """Removes all data from the plot."""
+        super().clear()
+        for curve in (self.h_tempr, self.h_gflw, self.h_htr):
+            curve.setData([], [])
+        self._history_request = None
+
+    def _read_source(self, t_after):
+        if self.history is None:
+            return None
+
+        t, temp, heater, gasflow = self.history.sensor_data(self.sensor, t_after)
+        return t, temp, gasflow, heater
+
+    def _add_points(self, x, columns):
+        temp, gasflow, heater = columns
+        self.p_tempr.append(x, temp)
+        self.p_gflw.append(x, gasflow)
+        self.p_htr.append(x, heater)
+
+    def _apply_profile(self, profile):
+
+        width = profile["line_width"]
+        antialias = profile["antialias"]
+
+        self.p_tempr.set_style(
+            pen=pg.mkPen(self.GREEN, width=width), antialias=antialias
         )
-        self.p1.setLimits(
-            xMin=self._xmin, xMax=self._xmax, yMin=-0.05, yMax=1.05, minYRange=1.1
+        self.h_tempr.setPen(pg.mkPen(self.GREEN, width=width))
+        self.h_tempr.opts["antialias"] = antialias
+
+        for curve, history_curve, color, fill_color in (
+            (self.p_htr, self.h_htr, self.RED, self.LIGHT_RED),
+            (self.p_gflw, self.h_gflw, self.BLUE, self.LIGHT_BLUE),
+        ):
+            curve.set_style(
+                pen=pg.mkPen(color, width=width),
+                brush=fill_color if profile["fill"] else None,
+                fillLevel=0 if profile["fill"] else None,
+                antialias=antialias,
+            )
+            history_curve.setPen(pg.mkPen(color, width=width))
+            history_curve.setBrush(fill_color if profile["fill"] else None)
+            history_curve.setFillLevel(0 if profile["fill"] else None)
+            history_curve.opts["antialias"] = antialias
+
+    def _x_lower_limit(self):
+        x_min = super()._x_lower_limit()
+
+        # allow panning back to the oldest log file
+        if self._t_first is not None and self._t_origin is not None:
+            x_min = min(x_min, (self._t_first - self._t_origin) / 60)
+
+        return x_min
+
+    def _on_view_changed(self):
+        super()._on_view_changed()
+        self._request_history()
+
+    def _request_history(self):
+
+        if not self.history_loader or self._t_origin is None:
+            return
+
+        (x_start, x_end), _ = self.p0.vb.viewRange()
+        width = self.p0.vb.width()
+
+        # readings in memory are not loaded again
+        if self.p_tempr.chunks:
+            x_live = self.p_tempr.chunks[0].x[0]
+            t_live = self._t_origin + x_live * 60
+        else:
+            x_live = np.inf
+            t_live = None
+
+        if x_start >= x_live or width <= 0:
+            return
+
+        t_start = self._t_origin + x_start * 60
+        t_end = self._t_origin + x_end * 60
+
+        request = self.history_loader.make_request(
+            t_start, t_end, (t_end - t_start) / width, t_limit=t_live
         )
 
-    def get_xmin(self):
-        return self._xmin
+        if request != self._history_request:
+            self._history_request = request
+            self.history_loader.load(request)
 
-    def changeEvent(self, QEvent):
+    def _on_history_loaded(self, result):
+        request, data = result
 
-        if QEvent.type() == QtCore.QEvent.PaletteChange and self._init_done:
-            self.update_darkmode()
+        if request != self._history_request or self._t_origin is None:
+            return
+
+        x = (data[:, 0] - self._t_origin) / 60
+
+        self.h_tempr.setData(x, data[:, 1])
+        self.h_htr.setData(x, data[:, 2])
+        self.h_gflw.setData(x, data[:, 3])
 
     def update_darkmode(self):
+        super().update_darkmode()
 
-        dark = isDarkWindow()
+        c = LINE_COLOR_DARK if isDarkWindow() else LINE_COLOR_LIGHT
+        self.p1.getAxis("top").setPen(width=self.LW * 2 / 3, color=c)
 
-        # get font color
-        font_color = self.palette().color(QtGui.QPalette.Text)
-        font_color_rgb = [font_color.red(), font_color.green(), font_color.blue()]
 
-        # set colors
-        for p in [self.p0, self.p1]:
-            p.vb.setBackgroundColor("k" if dark else "w")
-            for pos in ["bottom", "left", "top", "right"]:
-                ax = p.getAxis(pos)
-                ax.setTextPen(fn.mkColor(font_color_rgb))  # black text
+class SensorOverviewPlot(TimeSeriesPlot):
+    """
+    Plots the temperatures of several sensors in a single panel. Readings are taken
+    from a :class:`mercurygui.history.SensorHistory`, where all sensors share one time
+    base. The timestamps are therefore stored and rendered once for all sensors
+    instead of once per sensor.
 
-        c = LINE_COLOR_DARK if dark else LINE_COLOR_LIGHT
-        self.p1.getAxis("top").setPen(width=self.LW * 2 / 3, color=c)
+    A row is plotted as soon as it is complete, that is, all sensors have reported or
+    the next row is started. Call :meth:`refresh` when new readings have been stored
+    and :meth:`update_sensors` when the sensors of the store have changed.
+
+    :param history: :class:`mercurygui.history.SensorHistory` instance.
+    """
+
+    COLORS = [
+        TimeSeriesPlot.GREEN,
+        TimeSeriesPlot.BLUE,
+        TimeSeriesPlot.RED,
+        (239, 163, 37),
+        (163, 110, 230),
+        (128, 128, 128),
+    ]
+
+    def __init__(self, history, parent=None):
+        super().__init__(parent=parent)
+
+        self.history = history
+        self.sensors = []
+
+        self.p0 = self.add_plot(0, 0, yMin=0, yMax=500, minYRange=2.1)
+        self.p0.setXRange(self._xmin, self._xmax, 4)
+        self.p0.setYRange(5, 300)
+        self._set_limits()
+
+        self.p0.enableAutoRange(x=True, y=True)
+        self.p0.setMouseEnabled(x=True, y=True)
+
+        self.legend = pg.LegendItem(offset=(-10, 10))
+        self.legend.setParentItem(self.p0.vb)
+
+        self.set_render_profile("balanced")
+        self.update_sensors()
+
+        # update colors
+        self.update_darkmode()
+
+        self._init_done = True
+
+    def update_sensors(self):
+        """
+        Takes over the sensors from the store and plots all of its readings again.
+        """
+        self.clear()
+
+        self.sensors = list(self.history.sensors)
+        self.curve_group = ChunkedCurveGroup(self.p0, len(self.sensors))
+        self.curves = [self.curve_group]
+
+        if self._view:
+            self.curve_group.set_view(*self._view)
+
+        self.set_render_profile(self.render_profile)
+        self.refresh()
+
+    def _read_source(self, t_after):
+        return self.history.temperatures(t_after)
+
+    def _add_points(self, x, columns):
+        self.curve_group.append(x, columns)
+
+    def _apply_profile(self, profile):
+
+        self.legend.clear()
+
+        for i, sensor in enumerate(self.sensors):
+            color = self.COLORS[i % len(self.COLORS)]
+            pen = pg.mkPen(color, width=profile["line_width"])
+            self.curve_group.set_style(i, pen=pen, antialias=profile["antialias"])
+            self.legend.addItem(pg.PlotDataItem(pen=pen), sensor)
+
+    def update_darkmode(self):
+        super().update_darkmode()
+
+        font_color = self.palette().color(QtGui.QPalette.Text)
+        self.legend.setLabelTextColor(font_color)
+        for _, label in self.legend.items:
+            label.setText(label.text)  # redraw in new color
 
 
 if __name__ == "__main__":
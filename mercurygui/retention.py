@@ -0,0 +1,258 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Sam Schott  (ss2151@cam.ac.uk)
+
+(c) Sam Schott; This work is licensed under a Creative Commons
+Attribution-NonCommercial-NoDerivs 2.0 UK: England & Wales License.
+
+"""
+import os
+import gzip
+import shutil
+import time
+import threading
+import logging
+
+from .datalog import recover_log_file, index_path, new_log_path, INDEX_SUFFIX
+
+logger = logging.getLogger(__name__)
+
+
+class RetentionManager:
+    """
+    Housekeeping for the log directory which runs in a background thread once per
+    period. It
+
+    1. rotates log writers to a new file when their file exceeds ``max_size_mb`` or
+       when it was started on a previous day,
+    2. removes truncated rows from log files which are no longer written to and
+       gzips them,
+    3. deletes log files older than ``days_to_keep`` and, if ``max_total_size_mb`` is
+       given, the oldest log files until the directory is below that size.
+
+    Files which are still written to must be registered with :meth:`add_writer` or
+    :meth:`add_active_file` and are never compressed or deleted.
+
+    :param log_path: Directory with log files.
+    :param days_to_keep: Maximum age of log files in days.
+    :param max_size_mb: Size in MB at which a log file is rotated. Zero disables
+        rotation by size.
+    :param rotate_daily: Rotate log files at the first run after midnight.
+    :param compress: Gzip log files which are no longer written to.
+    :param max_total_size_mb: Maximum total size of the log directory in MB. Zero
+        disables the limit.
+    :param period: Time in sec between runs.
+    """
+
+    LOG_SUFFIXES = (".txt", ".txt.gz")
+    MIN_IDLE_TIME = 60
+
+    def __init__(
+        self,
+        log_path,
+        days_to_keep=7,
+        max_size_mb=100,
+        rotate_daily=True,
+        compress=True,
+        max_total_size_mb=0,
+        period=60 * 60,
+    ):
+
+        self.log_path = log_path
+        self.days_to_keep = days_to_keep
+        self.max_size_mb = max_size_mb
+        self.rotate_daily = rotate_daily
+        self.compress = compress
+        self.max_total_size_mb = max_total_size_mb
+        self.period = period
+
+        self._lock = threading.Lock()
+        self._writers = {}
+        self._active_files = set()
+
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Starts running in a background thread. The first run starts immediately."""
+        if self._thread and self._thread.is_alive():
+            return
+
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="LogRetention", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """Stops the background thread, waiting for a running pass to finish."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def add_writer(self, writer, sensor):
+        """
+        Registers a :class:`mercurygui.datalog.LogWriter` for rotation. The writer must
+        be removed with :meth:`remove_writer` before it is closed.
+
+        :param writer: Log writer.
+        :param sensor: Sensor name, used for the names of new log files.
+        """
+        with self._lock:
+            self._writers[writer] = sensor
+
+    def remove_writer(self, writer):
+        with self._lock:
+            self._writers.pop(writer, None)
+
+    def add_active_file(self, path):
+        """Protects a log file from compression and deletion."""
+        with self._lock:
+            self._active_files.add(os.fspath(path))
+
+    def remove_active_file(self, path):
+        with self._lock:
+            self._active_files.discard(os.fspath(path))
+
+    def run_once(self):
+        """Performs a single pass of rotation, compression and clean up."""
+
+        self._rotate()
+
+        with self._lock:
+            active = set(self._active_files)
+            active.update(os.fspath(w.path) for w in self._writers)
+
+        try:
+            entries = [e for e in os.scandir(self.log_path) if e.is_file()]
+        except FileNotFoundError:
+            return
+
+        files = [
+            (e.path, e.stat()) for e in entries if e.name.endswith(self.LOG_SUFFIXES)
+        ]
+
+        # remove sidecar indices of logs which have been compressed or deleted
+        for e in entries:
+            if e.name.endswith(INDEX_SUFFIX):
+                if not os.path.exists(e.path[: -len(INDEX_SUFFIX)]):
+                    self._remove(e.path)
+
+        # skip files which are written to, including those registered after we took
+        # the snapshot above
+        now = time.time()
+        files = [
+            (path, stat)
+            for path, stat in files
+            if path not in active and stat.st_mtime < now - self.MIN_IDLE_TIME
+        ]
+
+        cutoff = now - self.days_to_keep * 24 * 60 * 60
+
+        for i, (path, stat) in enumerate(files):
+            if path.endswith(".txt") and stat.st_mtime >= cutoff:
+                # remove truncated rows left behind by a crash
+                try:
+                    recover_log_file(path)
+                except OSError:
+                    logger.warning(f"Could not check '{path}'", exc_info=True)
+                    continue
+                if self.compress:
+                    files[i] = self._compress(path, stat)
+
+        self._clean_up(files)
+
+    # =================== PRIVATE METHODS =========================================
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception:
+                logger.error("Error during log file clean up", exc_info=True)
+            self._stop.wait(self.period)
+
+    def _rotate(self):
+
+        today = time.localtime()[:3]
+
+        # writers cannot be removed and closed while being rotated
+        with self._lock:
+            for writer, sensor in self._writers.items():
+                if not writer.closed and self._needs_rotation(writer, today):
+                    old_path = writer.path
+                    writer.rotate(new_log_path(self.log_path, sensor))
+                    logger.info(f"Rotated log file '{old_path}'")
+
+    def _needs_rotation(self, writer, today):
+        rotate = False
+
+        if self.rotate_daily and time.localtime(writer.created)[:3] != today:
+            rotate = True
+        if self.max_size_mb > 0:
+            try:
+                size = os.path.getsize(writer.path)
+            except OSError:
+                size = 0
+            if size > self.max_size_mb * 1e6:
+                rotate = True
+
+        return rotate
+
+    def _compress(self, path, stat):
+        """Gzips a log file and returns the path and stat of the compressed file."""
+
+        gz_path = path + ".gz"
+        tmp_path = gz_path + ".tmp"
+
+        try:
+            with open(path, "rb") as f_in, gzip.open(tmp_path, "wb") as f_out:
+                shutil.copyfileobj(f_in, f_out)
+            # keep modification time for retention by age
+            os.utime(tmp_path, (stat.st_atime, stat.st_mtime))
+            os.replace(tmp_path, gz_path)
+            self._remove(path)
+        except OSError:
+            logger.warning(f"Could not compress '{path}'", exc_info=True)
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return path, stat
+
+        return gz_path, os.stat(gz_path)
+
+    def _clean_up(self, files):
+
+        cutoff = time.time() - self.days_to_keep * 24 * 60 * 60
+        kept = []
+
+        for path, stat in files:
+            if stat.st_mtime < cutoff:
+                self._remove(path)
+            else:
+                kept.append((stat.st_mtime, stat.st_size, path))
+
+        if self.max_total_size_mb > 0:
+            total_size = sum(size for _, size, _ in kept)
+            for _, size, path in sorted(kept):
+                if total_size <= self.max_total_size_mb * 1e6:
+                    break
+                self._remove(path)
+                total_size -= size
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            logger.warning(f"Could not delete '{path}'", exc_info=True)
+
+        # byte offsets in the index are only valid for the uncompressed log
+        if path.endswith(".txt"):
+            try:
+                os.remove(index_path(path))
+            except FileNotFoundError:
+                pass
+            except OSError:
+                logger.warning(f"Could not delete index of '{path}'", exc_info=True)
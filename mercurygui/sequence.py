@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Sam Schott  (ss2151@cam.ac.uk)
+
+(c) Sam Schott; This work is licensed under a Creative Commons
+Attribution-NonCommercial-NoDerivs 2.0 UK: England & Wales License.
+
+Temperature sequences are text files with one step per line. Everything after "#" is a
+comment. Durations are in sec unless followed by "min" or "h"::
+
+    # cool down at 2 K/min and measure at 10 K and 20 K
+    ramp 2                  # ramp rate in K/min, "ramp off" disables ramping
+    setpoint 10             # temperature setpoint in K
+    wait_stable 0.05 2 min  # wait until within 0.05 K of the setpoint for 2 min
+    hold 10 min             # wait for a fixed time
+    setpoint 20
+    wait_stable 0.05 2 min 1 h  # give up if not stable after 1 h
+    hold 10 min
+
+Sequences are executed by the data collection worker of a
+:class:`mercurygui.feed.MercuryFeed`, in the same thread which takes the readings.
+
+"""
+import time
+import threading
+import collections
+
+from mercurygui.stability import StabilityDetector
+
+#: Allowed temperature setpoints in K.
+T_MIN = 3.5
+T_MAX = 300
+
+UNITS = {"s": 1, "sec": 1, "min": 60, "h": 60 * 60}
+
+Step = collections.namedtuple("Step", "kind args line")
+Step.__doc__ = """
+A step of a temperature sequence.
+
+:param kind: "setpoint", "ramp", "wait_stable" or "hold".
+:param args: Tuple of arguments. Temperatures are in K, ramp rates in K/min and
+    durations in sec. A ramp rate of None disables ramping.
+:param line: Line number in the sequence file.
+"""
+
+SequenceProgress = collections.namedtuple(
+    "SequenceProgress", "state index n_steps step remaining message"
+)
+SequenceProgress.__doc__ = """
+State of a running sequence.
+
+:param state: One of the states of :class:`SequenceRunner`.
+:param index: Index of the current step.
+:param n_steps: Number of steps.
+:param step: Current :class:`Step` or None when the sequence has ended.
+:param remaining: Time in sec until the current step completes, if known.
+:param message: Description of the state for display.
+"""
+
+
+def _number(token):
+    try:
+        return float(token)
+    except ValueError:
+        raise ValueError(f"'{token}' is not a number")
+
+
+def _duration(tokens):
+    # a number, optionally followed by a unit, returns the duration and the rest
+    if not tokens:
+        raise ValueError("missing duration")
+
+    value = _number(tokens[0])
+
+    if len(tokens) > 1 and tokens[1] in UNITS:
+        return value * UNITS[tokens[1]], tokens[2:]
+
+    return value, tokens[1:]
+
+
+def _parse_step(kind, tokens):
+    # returns the arguments of a step
+
+    if kind == "setpoint":
+        if len(tokens) != 1:
+            raise ValueError("expected a temperature")
+        value = _number(tokens[0])
+        if not T_MIN < value < T_MAX:
+            raise ValueError(f"setpoint must be between {T_MIN} K and {T_MAX} K")
+        return (value,)
+
+    elif kind == "ramp":
+        if len(tokens) != 1:
+            raise ValueError("expected a ramp rate or 'off'")
+        if tokens[0].lower() == "off":
+            return (None,)
+        rate = _number(tokens[0])
+        if rate <= 0:
+            raise ValueError("ramp rate must be positive")
+        return (rate,)
+
+    elif kind == "wait_stable":
+        if not tokens:
+            raise ValueError("expected a tolerance and a duration")
+        tolerance = _number(tokens[0])
+        duration, tokens = _duration(tokens[1:])
+        timeout = None
+        if tokens:
+            timeout, tokens = _duration(tokens)
+        if tokens:
+            raise ValueError(f"unexpected '{' '.join(tokens)}'")
+        if tolerance <= 0 or duration < 0 or (timeout is not None and timeout <= 0):
+            raise ValueError("tolerance and timeout must be positive")
+        return (tolerance, duration, timeout)
+
+    elif kind == "hold":
+        duration, tokens = _duration(tokens)
+        if tokens:
+            raise ValueError(f"unexpected '{' '.join(tokens)}'")
+        if duration < 0:
+            raise ValueError("duration must not be negative")
+        return (duration,)
+
+    else:
+        raise ValueError(f"unknown step '{kind}'")
+
+
+def parse_sequence(text):
+    """
+    Parses a temperature sequence.
+
+    :param text: Content of a sequence file.
+    :returns: List of :class:`Step`.
+    :raises ValueError: if a line cannot be parsed, with its line number.
+    """
+    steps = []
+
+    for line_no, line in enumerate(text.splitlines(), start=1):
+        tokens = line.split("#", 1)[0].split()
+
+        if not tokens:
+            continue
+
+        kind = tokens[0].lower()
+
+        try:
+            args = _parse_step(kind, tokens[1:])
+        except ValueError as exc:
+            raise ValueError(f"line {line_no}: {exc}")
+
+        steps.append(Step(kind, args, line_no))
+
+    if not steps:
+        raise ValueError("the sequence has no steps")
+
+    return steps
+
+
+def load_sequence(path):
+    """
+    Loads a temperature sequence from a file.
+
+    :param path: Path of the sequence file.
+    :returns: List of :class:`Step`.
+    :raises ValueError: if the file cannot be parsed.
+    """
+    with open(path) as f:
+        return parse_sequence(f.read())
+
+
+def describe(step):
+    """Returns a short description of a step."""
+    if step.kind == "setpoint":
+        return f"Setpoint {step.args[0]} K"
+    elif step.kind == "ramp":
+        rate = step.args[0]
+        return "Ramp off" if rate is None else f"Ramp {rate} K/min"
+    elif step.kind == "wait_stable":
+        return f"Wait until stable within {step.args[0]} K for {step.args[1]:.0f} s"
+    else:
+        return f"Hold for {step.args[0]:.0f} s"
+
+
+class SequenceRunner:
+    """
+    Executes a temperature sequence. The data collection worker calls :meth:`advance`
+    in every cycle, and wakes up for :meth:`next_deadline`, so that steps are started
+    without a round trip through the GUI thread.
+
+    Steps are timed from the scheduled end of the previous step, not from when the
+    worker got around to it, so that delays do not add up over a long sequence.
+
+    :meth:`pause`, :meth:`resume` and :meth:`abort` may be called from any thread. They
+    take effect with the next call of :meth:`advance`. Pausing freezes the timing of
+    the sequence but does not stop a temperature ramp in progress on the instrument.
+
+    :param steps: List of :class:`Step`.
+    :param name: Name of the sequence for display.
+    """
+
+    RUNNING = "running"
+    PAUSED = "paused"
+    FINISHED = "finished"
+    ABORTED = "aborted"
+    FAILED = "failed"
+
+    def __init__(self, steps, name=""):
+        self.steps = list(steps)
+        self.name = name
+
+        self.state = self.RUNNING
+        self.index = 0
+        self.message = ""
+
+        self._lock = threading.Lock()
+        self._request = None
+
+        self._t_step = None  # scheduled start of the current step
+        self._t_paused = None
+        self._detector = None  # for the current wait_stable step
+        self._remaining = None
+
+    @property
+    def done(self):
+        return self.state in (self.FINISHED, self.ABORTED, self.FAILED)
+
+    def pause(self, message="Paused"):
+        """Pauses the sequence."""
+        with self._lock:
+            self._request = (self.PAUSED, message)
+
+    def resume(self):
+        """Resumes a paused sequence."""
+        with self._lock:
+            self._request = (self.RUNNING, "")
+
+    def abort(self):
+        """Aborts the sequence. The last setpoint is kept."""
+        with self._lock:
+            self._request = (self.ABORTED, "Aborted")
+
+    def next_deadline(self):
+        """
+        Returns the time from :func:`time.monotonic` at which the current step ends, or
+        None if it does not end at a fixed time.
+        """
+        if self.state != self.RUNNING or self.index >= len(self.steps):
+            return None
+
+        step = self.steps[self.index]
+
+        if step.kind == "hold" and self._t_step is not None:
+            return self._t_step + step.args[0]
+
+        return None
+
+    def advance(self, temperature, readings, t_readings):
+        """
+        Handles pending requests and executes all steps which are due.
+
+        :param temperature: Temperature module to control.
+        :param readings: Most recent readings of the feed. Setpoints written by the
+            sequence are updated in place.
+        :param t_readings: Time of the readings from :func:`time.monotonic`.
+        :returns: :class:`SequenceProgress`.
+        :raises: Errors of the instrument when writing a setpoint. The step is repeated
+            with the next call.
+        """
+        now = time.monotonic()
+
+        with self._lock:
+            request, self._request = self._request, None
+
+        if request and not self.done:
+            self._handle_request(*request, now)
+
+        if self.state == self.RUNNING:
+            self._run_steps(temperature, readings, t_readings, now)
+
+        return self.progress()
+
+    def progress(self):
+        """Returns the current :class:`SequenceProgress`."""
+        step = self.steps[self.index] if self.index < len(self.steps) else None
+        return SequenceProgress(
+            self.state, self.index, len(self.steps), step, self._remaining, self.message
+        )
+
+    # =================== PRIVATE METHODS =========================================
+
+    def _handle_request(self, state, message, now):
+
+        if state == self.PAUSED and self.state == self.RUNNING:
+            self._t_paused = now
+        elif state == self.RUNNING and self.state == self.PAUSED:
+            # the current step continues where it was paused
+            if self._t_step is not None:
+                self._t_step += now - self._t_paused
+            self._t_paused = None
+            self._detector = None
+        elif state != self.ABORTED:
+            return
+
+        self.state = state
+        self.message = message
+
+    def _run_steps(self, temperature, readings, t_readings, now):
+
+        while self.index < len(self.steps):
+            step = self.steps[self.index]
+
+            if self._t_step is None:
+                self._t_step = now
+
+            end = self._execute(step, temperature, readings, t_readings, now)
+
+            if end is None or self.state != self.RUNNING:
+                return
+
+            # the next step is scheduled from the end of this one
+            self.index += 1
+            self._t_step = end
+            self._detector = None
+            self._remaining = None
+
+        self.state = self.FINISHED
+        self.message = "Finished"
+
+    def _execute(self, step, temperature, readings, t_readings, now):
+        # returns the time at which the step completed or None if it is not done
+
+        if step.kind == "setpoint":
+            temperature.loop_tset = step.args[0]
+            readings["TempSetpoint"] = step.args[0]
+            return self._t_step
+
+        elif step.kind == "ramp":
+            rate = step.args[0]
+            if rate is not None:
+                temperature.loop_rset = rate
+            enable = "OFF" if rate is None else "ON"
+            temperature.loop_rena = enable
+            readings["TempRampEnable"] = enable
+            return self._t_step
+
+        elif step.kind == "hold":
+            end = self._t_step + step.args[0]
+            self._remaining = max(end - now, 0)
+            return end if now >= end else None
+
+        elif step.kind == "wait_stable":
+            tolerance, duration, timeout = step.args
+
+            if self._detector is None:
+                self._detector = StabilityDetector(tolerance, duration, hysteresis=0)
+
+            # only readings taken after the step started count
+            if t_readings >= self._t_step:
+                self._detector.update(
+                    t_readings, readings["Temp"], readings["TempSetpoint"]
+                )
+
+            status = self._detector.status()
+            self._remaining = status.remaining
+
+            if status.stable:
+                return now
+
+            if timeout is not None and now - self._t_step > timeout:
+                self.state = self.FAILED
+                self.message = f"Not stable after {timeout:.0f} s"
+
+            return None
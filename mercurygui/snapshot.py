@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Sam Schott  (ss2151@cam.ac.uk)
+
+(c) Sam Schott; This work is licensed under a Creative Commons
+Attribution-NonCommercial-NoDerivs 2.0 UK: England & Wales License.
+
+"""
+import time
+import threading
+import logging
+import functools
+import collections
+from PyQt5 import QtCore
+
+logger = logging.getLogger(__name__)
+
+
+Reading = collections.namedtuple("Reading", "value error timestamp")
+
+ALARMS = "alarms"
+
+
+@functools.lru_cache()
+def readable_attributes(module_type):
+    """
+    Returns the names of the public properties of a module class. Each property reads
+    a value from the instrument.
+
+    :param module_type: Class of a MercuryiTC module.
+    :returns: Sorted list of property names.
+    """
+    return [
+        name
+        for name in dir(module_type)
+        if not name.startswith("_") and isinstance(getattr(module_type, name), property)
+    ]
+
+
+class SnapshotService(QtCore.QObject):
+    """
+    Reads the properties of MercuryiTC modules in a background thread and caches them
+    with the time they were read, so that a GUI can show them without querying the
+    instrument from the GUI thread.
+
+    Request readings with :meth:`request` and get cached values with :meth:`get`. All
+    properties requested for a module are read in a single pass, by default together
+    with the alarms of the module. :attr:`updated` is emitted with the module after
+    each pass.
+
+    :param mercury: MercuryITC instance.
+    :param read_alarms: Whether to read the alarms of a module with its properties.
+    """
+
+    updated = QtCore.pyqtSignal(object)
+
+    def __init__(self, mercury, read_alarms=True):
+        super().__init__()
+
+        self.mercury = mercury
+        self.read_alarms = read_alarms
+
+        self._snapshots = collections.defaultdict(dict)
+        self._pending = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def request(self, module, names=None):
+        """
+        Requests to read properties of a module in the background. Requests for the
+        same module are merged until they are processed.
+
+        :param module: MercuryiTC module.
+        :param names: Names of properties to read. Defaults to all readable properties
+            of the module.
+        """
+        if names is None:
+            names = readable_attributes(type(module))
+
+        with self._lock:
+            entry = self._pending.setdefault(module.uid, (module, set()))
+            entry[1].update(names)
+
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="SnapshotService", daemon=True
+                )
+                self._thread.start()
+
+    def get(self, module, name):
+        """
+        Returns the cached reading of a property.
+
+        :param module: MercuryiTC module.
+        :param name: Name of the property or :data:`ALARMS` for the alarms of the
+            module.
+        :returns: Reading with value, error message and time of the reading, or None if
+            the property has not been read yet.
+        """
+        with self._lock:
+            return self._snapshots[module.uid].get(name)
+
+    def clear(self):
+        """Removes all cached readings, for instance after connecting to another
+        instrument."""
+        with self._lock:
+            self._snapshots.clear()
+            self._pending.clear()
+
+    # =================== PRIVATE METHODS =========================================
+
+    def _run(self):
+        # the thread exits when there is nothing left to do
+        while True:
+            with self._lock:
+                if len(self._pending) == 0:
+                    self._thread = None
+                    return
+                _, (module, names) = self._pending.popitem(last=False)
+
+            if not self.mercury.connected:
+                continue
+
+            snapshot = {}
+
+            for name in sorted(names):
+                snapshot[name] = self._read(lambda: getattr(module, name))
+
+            if self.read_alarms:
+                snapshot[ALARMS] = self._read(
+                    lambda: self.mercury.alarms.get(module.uid, "--")
+                )
+
+            with self._lock:
+                self._snapshots[module.uid].update(snapshot)
+
+            self.updated.emit(module)
+
+    @staticmethod
+    def _read(getter):
+        try:
+            return Reading(getter(), None, time.time())
+        except Exception as exc:
+            logger.debug("Could not read property", exc_info=True)
+            return Reading(None, str(exc) or type(exc).__name__, time.time())
@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Sam Schott  (ss2151@cam.ac.uk)
+
+(c) Sam Schott; This work is licensed under a Creative Commons
+Attribution-NonCommercial-NoDerivs 2.0 UK: England & Wales License.
+
+Streaming statistics of the temperature readings and detection of a stable
+temperature. Every reading updates the statistics in constant time, so that they can be
+kept for every sensor in the thread which takes the readings.
+
+"""
+import math
+import collections
+
+WindowStats = collections.namedtuple(
+    "WindowStats", "n span mean std slope error max_error"
+)
+WindowStats.__doc__ = """
+Statistics of the readings in a time window.
+
+:param n: Number of readings.
+:param span: Time in sec between the first and the last reading.
+:param mean: Mean temperature in K.
+:param std: Standard deviation of the temperature in K.
+:param slope: Slope of a linear fit of the temperature in K/min.
+:param error: Mean deviation from the setpoint in K.
+:param max_error: Largest absolute deviation from the setpoint in K.
+"""
+
+StabilityStatus = collections.namedtuple(
+    "StabilityStatus", "stable tolerance duration remaining stats"
+)
+StabilityStatus.__doc__ = """
+Stability of the temperature after the last reading.
+
+:param stable: Whether the temperature is stable.
+:param tolerance: Allowed deviation from the setpoint in K.
+:param duration: Time in sec for which the temperature must be within the tolerance.
+:param remaining: Time in sec until the temperature is stable if it remains within the
+    tolerance, or None if it is stable or outside of the tolerance.
+:param stats: :class:`WindowStats` of the readings over the last ``duration``.
+"""
+
+StabilityEvent = collections.namedtuple("StabilityEvent", "kind time status")
+StabilityEvent.__doc__ = """
+Change of the stability of the temperature.
+
+:param kind: :attr:`StabilityDetector.STABILIZED` or
+    :attr:`StabilityDetector.DESTABILIZED`.
+:param time: Time of the reading which caused the change, in the time base of the
+    readings.
+:param status: :class:`StabilityStatus` after the reading.
+"""
+
+
+class RollingStats:
+    """
+    Statistics of the readings in a sliding time window. Running sums are updated when
+    readings enter and leave the window, and the largest deviation from the setpoint is
+    kept in a monotonic queue, so that adding a reading takes constant time on average.
+
+    The sums are taken relative to a reading in the window to limit rounding errors.
+    They are recomputed relative to the oldest reading once as many readings have been
+    added as the window holds, which keeps rounding errors from accumulating and the
+    reference close to the readings, for instance after a change of the setpoint.
+
+    :param window: Length of the window in sec.
+    """
+
+    def __init__(self, window):
+        self.window = window
+        self.clear()
+
+    def clear(self):
+        """Removes all readings."""
+        self._samples = collections.deque()
+        self._max_errors = collections.deque()
+        self._rebase()
+
+    def add(self, t, temperature, setpoint):
+        """
+        Adds a reading and removes readings older than the window. Readings which are
+        NaN are ignored.
+
+        :param t: Time of the reading in sec, for instance from :func:`time.monotonic`.
+        :param temperature: Temperature in K.
+        :param setpoint: Temperature setpoint in K.
+        """
+        if math.isnan(temperature) or math.isnan(setpoint):
+            return
+
+        error = temperature - setpoint
+        sample = (t, temperature, error)
+
+        if not self._samples:
+            self._samples.append(sample)
+            self._rebase()
+        else:
+            self._samples.append(sample)
+            self._add_sums(sample, 1)
+
+        # readings with a smaller deviation before this one can no longer be the largest
+        while self._max_errors and abs(self._max_errors[-1][2]) <= abs(error):
+            self._max_errors.pop()
+        self._max_errors.append(sample)
+
+        while self._samples and self._samples[0][0] < t - self.window:
+            old = self._samples.popleft()
+            self._add_sums(old, -1)
+            if self._max_errors[0] is old:
+                self._max_errors.popleft()
+
+        self._updates += 1
+
+        if self._updates >= len(self._samples):
+            self._rebase()
+
+    def __len__(self):
+        return len(self._samples)
+
+    @property
+    def span(self):
+        """Time in sec between the oldest and the newest reading in the window."""
+        if not self._samples:
+            return 0.0
+        return self._samples[-1][0] - self._samples[0][0]
+
+    def stats(self):
+        """Returns the :class:`WindowStats` of the readings in the window."""
+        n = self._n
+        nan = float("nan")
+
+        if n == 0:
+            return WindowStats(0, 0.0, nan, nan, nan, nan, nan)
+
+        mean = self._x0 + self._sx / n
+        error = self._e0 + self._se / n
+        max_error = abs(self._max_errors[0][2])
+
+        if n > 1:
+            var = (self._sxx - self._sx ** 2 / n) / (n - 1)
+            std = math.sqrt(max(var, 0))
+        else:
+            std = nan
+
+        var_t = self._stt - self._st ** 2 / n
+        if n > 1 and var_t > 0:
+            slope = (self._stx - self._st * self._sx / n) / var_t * 60
+        else:
+            slope = nan
+
+        return WindowStats(n, self.span, mean, std, slope, error, max_error)
+
+    def _add_sums(self, sample, sign):
+        t, x, e = sample
+        t -= self._t0
+        x -= self._x0
+        e -= self._e0
+        self._n += sign
+        self._st += sign * t
+        self._sx += sign * x
+        self._se += sign * e
+        self._stt += sign * t * t
+        self._sxx += sign * x * x
+        self._stx += sign * t * x
+
+    def _rebase(self):
+        # recomputes all sums relative to the oldest reading
+        self._t0, self._x0, self._e0 = self._samples[0] if self._samples else (0, 0, 0)
+        self._n = 0
+        self._st = self._sx = self._se = 0.0
+        self._stt = self._sxx = self._stx = 0.0
+        self._updates = 0
+
+        for sample in self._samples:
+            self._add_sums(sample, 1)
+
+
+class StabilityDetector:
+    """
+    Decides from a stream of readings whether the temperature is stable, that is,
+    within ``tolerance`` of the setpoint for at least ``duration``. Each call of
+    :meth:`update` returns a :class:`StabilityEvent` when the temperature becomes
+    stable or unstable, and None otherwise.
+
+    Once stable, the temperature only becomes unstable when it deviates from the
+    setpoint by more than ``tolerance + hysteresis``, so that noise at the edge of the
+    tolerance does not produce a stream of events. Changing the setpoint by more than
+    the tolerance always makes the temperature unstable.
+
+    :param tolerance: Allowed deviation from the setpoint in K.
+    :param duration: Time in sec for which the temperature must be within the tolerance.
+    :param hysteresis: Additional deviation in K allowed before a stable temperature
+        becomes unstable. Defaults to half of the tolerance.
+    """
+
+    STABILIZED = "stabilized"
+    DESTABILIZED = "destabilized"
+
+    def __init__(self, tolerance, duration, hysteresis=None):
+        if tolerance <= 0 or duration < 0:
+            raise ValueError("tolerance must be positive and duration not negative")
+
+        self.tolerance = tolerance
+        self.duration = duration
+        self.hysteresis = tolerance / 2 if hysteresis is None else hysteresis
+
+        self.rolling = RollingStats(duration)
+        self.reset()
+
+    def reset(self):
+        """Discards all readings. The temperature is unstable until proven otherwise."""
+        self.stable = False
+        self.rolling.clear()
+        self._t = None
+        self._setpoint = None
+        self._within_since = None
+
+    def update(self, t, temperature, setpoint):
+        """
+        Adds a reading. Readings which are not newer than the previous one are ignored.
+
+        :param t: Time of the reading in sec, for instance from :func:`time.monotonic`.
+        :param temperature: Temperature in K.
+        :param setpoint: Temperature setpoint in K.
+        :returns: :class:`StabilityEvent` if the stability has changed, None otherwise.
+        """
+        if self._t is not None and t <= self._t:
+            return None
+
+        self._t = t
+        self.rolling.add(t, temperature, setpoint)
+
+        setpoint_changed = (
+            self._setpoint is not None
+            and abs(setpoint - self._setpoint) > self.tolerance
+        )
+        self._setpoint = setpoint
+
+        if setpoint_changed:
+            # readings for the old setpoint do not count towards the new one
+            self._within_since = None
+            if self.stable:
+                self.stable = False
+                return StabilityEvent(self.DESTABILIZED, t, self.status())
+
+        deviation = abs(temperature - setpoint)
+        limit = self.tolerance + self.hysteresis if self.stable else self.tolerance
+
+        if math.isnan(deviation) or deviation > limit:
+            self._within_since = None
+            if self.stable:
+                self.stable = False
+                return StabilityEvent(self.DESTABILIZED, t, self.status())
+        else:
+            if self._within_since is None:
+                self._within_since = t
+            if not self.stable and t - self._within_since >= self.duration:
+                self.stable = True
+                return StabilityEvent(self.STABILIZED, t, self.status())
+
+        return None
+
+    def status(self):
+        """Returns the current :class:`StabilityStatus`."""
+        if self.stable or self._within_since is None:
+            remaining = None
+        else:
+            remaining = max(self.duration - (self._t - self._within_since), 0)
+
+        return StabilityStatus(
+            self.stable, self.tolerance, self.duration, remaining, self.rolling.stats()
+        )
@@ -0,0 +1,281 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Sam Schott  (ss2151@cam.ac.uk)
+
+(c) Sam Schott; This work is licensed under a Creative Commons
+Attribution-NonCommercial-NoDerivs 2.0 UK: England & Wales License.
+
+Profiling of the startup. Events are always recorded, since this is cheap. Imports are
+only timed and the report is only written with ``mercurygui --profile-startup``. This
+module is imported first by the mercurygui package and must not import anything heavy
+itself.
+
+"""
+import sys
+import time
+import json
+import builtins
+import platform
+import functools
+import contextlib
+from pathlib import Path
+
+# as close to the start of the process as we get
+T_START = time.perf_counter()
+
+OPTION = "--profile-startup"
+REPORT_PATH = Path.home() / ".mercurygui" / "startup_profile.json"
+
+
+def option_given(argv=None):
+    """Returns whether :data:`OPTION` is given in the command line arguments."""
+    argv = sys.argv if argv is None else argv
+    return any(arg.split("=", 1)[0] == OPTION for arg in argv[1:])
+
+
+def _resolve_name(name, globals, level):
+    # absolute module name of a relative import
+    if level == 0:
+        return name
+
+    package = (globals or {}).get("__package__") or ""
+    base = package.rsplit(".", level - 1)[0]
+
+    return f"{base}.{name}" if name else base
+
+
+class StartupProfiler:
+    """
+    Records the time of events during startup relative to a start time, and the time
+    taken by imports. The report is a dictionary which can be saved as JSON with
+    :meth:`write`.
+
+    :param t_start: Start time from :func:`time.perf_counter`.
+    """
+
+    #: Imports which take less time in sec are left out of the report.
+    MIN_IMPORT_TIME = 0.001
+
+    #: Events which are expected after the window is shown.
+    WATCHED_EVENTS = ("first reading", "first plot frame")
+
+    def __init__(self, t_start):
+        self.t_start = t_start
+        self.events = []
+        self.imports = []
+        self.info = {}
+
+        self._import_depth = 0
+        self._original_import = None
+        self._watchers = []
+
+    # =================== EVENTS ==================================================
+
+    def record(self, name, start, end=None, **info):
+        """
+        Records an event.
+
+        :param name: Name of the event. Only the first event of a name is recorded.
+        :param start: Start time from :func:`time.perf_counter`.
+        :param end: End time, defaults to the start time.
+        :param info: Additional information to include in the report.
+        """
+        if self.has_event(name):
+            return
+
+        end = start if end is None else end
+
+        event = {
+            "name": name,
+            "start": round(start - self.t_start, 6),
+            "duration": round(end - start, 6),
+        }
+        event.update(info)
+        self.events.append(event)
+
+    def mark(self, name, since=None, **info):
+        """
+        Records an event which ends now.
+
+        :param name: Name of the event.
+        :param since: Name of a previous event. If given, the event starts at the end
+            of the previous one, otherwise it has no duration.
+        :param info: Additional information to include in the report.
+        """
+        end = time.perf_counter()
+        start = self._end_of(since) if since else end
+        self.record(name, start, end, **info)
+
+    def has_event(self, name):
+        return any(event["name"] == name for event in self.events)
+
+    @contextlib.contextmanager
+    def measure(self, name, **info):
+        """Context manager which records the time of its body as an event."""
+        start = time.perf_counter()
+        try:
+            yield info
+        finally:
+            self.record(name, start, time.perf_counter(), **info)
+
+    @contextlib.contextmanager
+    def patch(self, cls, method_name, name):
+        """
+        Context manager which records the first call of a method as an event, for
+        instance of a class in a third party library.
+
+        :param cls: Class of the method.
+        :param method_name: Name of the method.
+        :param name: Name of the event.
+        """
+        original = getattr(cls, method_name)
+
+        @functools.wraps(original)
+        def wrapper(*args, **kwargs):
+            with self.measure(name):
+                return original(*args, **kwargs)
+
+        setattr(cls, method_name, wrapper)
+        try:
+            yield
+        finally:
+            setattr(cls, method_name, original)
+
+    # =================== IMPORTS =================================================
+
+    def start_import_timing(self):
+        """Starts recording the time taken by each import of a new module."""
+        if self._original_import is None:
+            self._original_import = builtins.__import__
+            builtins.__import__ = self._timed_import
+
+    def stop_import_timing(self):
+        """Stops recording imports."""
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+
+        module = _resolve_name(name, globals, level)
+
+        # submodules may be imported by the fromlist of a loaded package
+        if module in sys.modules:
+            submodules = [f"{module}.{n}" for n in fromlist or ()]
+            submodules = [m for m in submodules if m not in sys.modules]
+            if not submodules:
+                return self._original_import(name, globals, locals, fromlist, level)
+            module = ", ".join(submodules)
+
+        start = time.perf_counter()
+        self._import_depth += 1
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            self._import_depth -= 1
+            duration = time.perf_counter() - start
+            if duration >= self.MIN_IMPORT_TIME:
+                self.imports.append(
+                    {
+                        "module": module,
+                        "depth": self._import_depth,
+                        "start": round(start - self.t_start, 6),
+                        "duration": round(duration, 6),
+                    }
+                )
+
+    # =================== WATCHING THE GUI ========================================
+
+    def watch(self, panel, callback=None):
+        """
+        Records the first reading of a panel and the first frame of its plot which
+        shows data. If there is no temperature sensor, these events do not occur.
+
+        :param panel: ControlPanel instance.
+        :param callback: Called without arguments once all :attr:`WATCHED_EVENTS` have
+            been recorded.
+        """
+        from PyQt5 import QtCore
+
+        profiler = self
+
+        def on_done():
+            if callback and all(profiler.has_event(n) for n in self.WATCHED_EVENTS):
+                callback()
+
+        class FrameWatcher(QtCore.QObject):
+            def eventFilter(self, obj, event):
+                if event.type() == QtCore.QEvent.Paint and profiler.has_event(
+                    "first reading"
+                ):
+                    if any(chunk.n > 0 for chunk in panel.canvas.p_tempr.chunks):
+                        obj.removeEventFilter(self)
+                        # runs once the frame has been painted
+                        QtCore.QTimer.singleShot(0, on_frame_painted)
+                return False
+
+        def on_frame_painted():
+            profiler.mark("first plot frame", since="first reading")
+            on_done()
+
+        def on_reading(readings):
+            panel.feed.readings_signal.disconnect(on_reading)
+            profiler.mark("first reading", since="main window")
+            on_done()
+
+        if panel.feed:
+            panel.feed.readings_signal.connect(on_reading)
+
+        watcher = FrameWatcher()
+        panel.canvas.viewport().installEventFilter(watcher)
+        self._watchers.append((watcher, on_reading))
+
+    # =================== REPORT ==================================================
+
+    def report(self):
+        """
+        Returns the report as a dictionary. Times are in seconds, event start times are
+        relative to the import of mercurygui.
+        """
+        from PyQt5 import QtCore
+
+        import mercurygui
+
+        missing = [n for n in self.WATCHED_EVENTS if not self.has_event(n)]
+
+        return {
+            "mercurygui": mercurygui.__version__,
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "qt": QtCore.QT_VERSION_STR,
+            "pyqt": QtCore.PYQT_VERSION_STR,
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "info": self.info,
+            "events": sorted(self.events, key=lambda e: e["start"]),
+            "not_reached": missing,
+            "imports": self.imports,
+        }
+
+    def write(self, path=REPORT_PATH):
+        """
+        Writes the report as JSON.
+
+        :param path: Path of the output file.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+
+    # =================== PRIVATE METHODS =========================================
+
+    def _end_of(self, name):
+        for event in self.events:
+            if event["name"] == name:
+                return self.t_start + event["start"] + event["duration"]
+        return time.perf_counter()
+
+
+# records events at all times, imports only with OPTION
+PROFILER = StartupProfiler(T_START)
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Sam Schott  (ss2151@cam.ac.uk)
+
+(c) Sam Schott; This work is licensed under a Creative Commons
+Attribution-NonCommercial-NoDerivs 2.0 UK: England & Wales License.
+
+"""
+import os
+import json
+import threading
+import logging
+from PyQt5 import QtCore
+
+logger = logging.getLogger(__name__)
+
+
+def module_type(address):
+    """
+    Returns the type of a module from its address.
+
+    :param address: Module address, for instance "DEV:MB1.T1:TEMP".
+    :returns: Module type, for instance "TEMP".
+    """
+    return address.rsplit(":", 1)[-1]
+
+
+def read_topology(mercury):
+    """
+    Reads the topology of a connected MercuryiTC. This queries the nick of each module
+    and the heater and gas flow modules of each temperature loop.
+
+    :param mercury: MercuryITC instance.
+    :returns: List of dictionaries with the address and nick of each module, and the
+        loop assignments "loop_htr" and "loop_aux" of temperature modules.
+    """
+    topology = []
+
+    for module in list(mercury.modules):
+        entry = {"address": module.address, "nick": module.nick}
+
+        if module_type(module.address) == "TEMP":
+            entry["loop_htr"] = module.loop_htr
+            entry["loop_aux"] = module.loop_aux
+
+        topology.append(entry)
+
+    return topology
+
+
+class TopologyCache(QtCore.QObject):
+    """
+    Keeps the last known module topology of each MercuryiTC, keyed by its VISA address
+    and saved to a JSON file. This allows building the GUI before the instrument has
+    been connected or queried.
+
+    Call :meth:`validate` after connecting to read the topology from the instrument in
+    a background thread. If it differs from the cached topology, the cache is updated
+    and :attr:`changed` is emitted with the VISA address.
+
+    :param path: Path of the JSON file.
+    """
+
+    changed = QtCore.pyqtSignal(str)
+
+    def __init__(self, path):
+        super().__init__()
+
+        self.path = path
+
+        self._lock = threading.Lock()
+        self._topologies = self._load()
+
+    def get(self, visa_address):
+        """
+        Returns the cached topology of an instrument.
+
+        :param visa_address: VISA address of the instrument.
+        :returns: Topology as returned by :func:`read_topology` or None if unknown.
+        """
+        with self._lock:
+            return self._topologies.get(visa_address)
+
+    def get_nicks(self, visa_address, type_name):
+        """
+        Returns the nicks of all modules of a type from the cached topology.
+
+        :param visa_address: VISA address of the instrument.
+        :param type_name: Module type, for instance "TEMP".
+        :returns: List of nicks or None if the topology is unknown.
+        """
+        topology = self.get(visa_address)
+
+        if topology is None:
+            return None
+
+        return [m["nick"] for m in topology if module_type(m["address"]) == type_name]
+
+    def get_address(self, visa_address, nick):
+        """
+        Returns the address of a module from the cached topology.
+
+        :param visa_address: VISA address of the instrument.
+        :param nick: Nick of the module.
+        :returns: Module address or None if the module is unknown.
+        """
+        for module in self.get(visa_address) or []:
+            if module["nick"] == nick:
+                return module["address"]
+
+    def set(self, visa_address, topology):
+        """
+        Saves the topology of an instrument.
+
+        :param visa_address: VISA address of the instrument.
+        :param topology: Topology as returned by :func:`read_topology`.
+        """
+        with self._lock:
+            self._topologies[visa_address] = topology
+            self._save()
+
+    def invalidate(self, visa_address):
+        """
+        Removes the topology of an instrument from the cache.
+
+        :param visa_address: VISA address of the instrument.
+        """
+        with self._lock:
+            if self._topologies.pop(visa_address, None) is not None:
+                self._save()
+
+    def validate(self, mercury):
+        """
+        Reads the topology of a connected instrument in a background thread and updates
+        the cache if it has changed.
+
+        :param mercury: MercuryITC instance.
+        """
+        thread = threading.Thread(
+            target=self._validate, args=(mercury,), name="TopologyCache", daemon=True
+        )
+        thread.start()
+
+    # =================== PRIVATE METHODS =========================================
+
+    def _validate(self, mercury):
+
+        visa_address = mercury.visa_address
+
+        try:
+            topology = read_topology(mercury)
+        except Exception:
+            logger.warning("Could not read module topology", exc_info=True)
+            return
+
+        if topology != self.get(visa_address):
+            logger.info("Module topology of %s has changed", visa_address)
+            self.set(visa_address, topology)
+            self.changed.emit(visa_address)
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError):
+            logger.warning("Could not read module topology cache", exc_info=True)
+            return {}
+
+    def _save(self):
+        # write to a temporary file first to never leave a truncated file behind
+        tmp_path = f"{self.path}.tmp"
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(tmp_path, "w") as f:
+                json.dump(self._topologies, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError:
+            logger.warning("Could not save module topology cache", exc_info=True)
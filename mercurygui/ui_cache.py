@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Sam Schott  (ss2151@cam.ac.uk)
+
+(c) Sam Schott; This work is licensed under a Creative Commons
+Attribution-NonCommercial-NoDerivs 2.0 UK: England & Wales License.
+
+"""
+import io
+import os
+import hashlib
+import logging
+import functools
+import importlib.util
+import importlib.resources
+from pathlib import Path
+from PyQt5 import QtCore
+
+logger = logging.getLogger(__name__)
+
+CACHE_PATH = Path.home() / ".mercurygui" / "ui_cache"
+
+
+@functools.lru_cache()
+def load_ui_type(name):
+    """
+    Returns the form class of a Qt Designer file in the mercurygui package.
+
+    The file is compiled to Python once and cached in :data:`CACHE_PATH`, together with
+    its byte code. The cache is keyed by the content of the file and the PyQt version,
+    later starts therefore neither import :mod:`PyQt5.uic` nor parse the file.
+
+    :param name: File name, for instance "panel.ui".
+    :returns: Form class with a method ``setupUi(widget)``.
+    """
+    source = _read_resource(name)
+    key = hashlib.sha1(source + QtCore.PYQT_VERSION_STR.encode()).hexdigest()[:16]
+    stem = name.rsplit(".", 1)[0]
+    path = CACHE_PATH / f"{stem}_{key}.py"
+
+    if not path.is_file():
+        code = _compile_ui(source)
+
+        try:
+            _write_cache(path, code)
+        except OSError:
+            logger.warning("Could not cache compiled %s", name, exc_info=True)
+            namespace = {}
+            exec(compile(code, name, "exec"), namespace)
+            return _get_form_class(namespace)
+
+    spec = importlib.util.spec_from_file_location(f"mercurygui_ui_{stem}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return _get_form_class(vars(module))
+
+
+def load_ui(name, widget):
+    """
+    Sets up a widget from a Qt Designer file in the mercurygui package, like
+    :func:`PyQt5.uic.loadUi`. Child widgets, layouts and actions are set as attributes
+    of the widget.
+
+    :param name: File name, for instance "panel.ui".
+    :param widget: Widget to set up, of the base class given in the file.
+    """
+    form = load_ui_type(name)()
+    form.setupUi(widget)
+
+    for attr, value in vars(form).items():
+        setattr(widget, attr, value)
+
+
+def _read_resource(name):
+    try:
+        return (importlib.resources.files("mercurygui") / name).read_bytes()
+    except AttributeError:  # Python < 3.9
+        return importlib.resources.read_binary("mercurygui", name)
+
+
+def _compile_ui(source):
+    # only needed when the cache is out of date
+    from PyQt5 import uic
+
+    code = io.StringIO()
+    uic.compileUi(io.BytesIO(source), code)
+    return code.getvalue()
+
+
+def _write_cache(path, code):
+
+    os.makedirs(path.parent, exist_ok=True)
+
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(code, encoding="utf-8")
+    os.replace(tmp_path, path)
+
+    # remove files compiled from older versions
+    for old_path in path.parent.glob(path.stem[:-16] + "?" * 16 + ".py"):
+        if old_path != path:
+            old_path.unlink()
+
+
+def _get_form_class(namespace):
+    return next(v for k, v in namespace.items() if k.startswith("Ui_"))
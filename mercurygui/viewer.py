@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+@author: Sam Schott  (ss2151@cam.ac.uk)
+
+(c) Sam Schott; This work is licensed under a Creative Commons
+Attribution-NonCommercial-NoDerivs 2.0 UK: England & Wales License.
+
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import logging
+from pathlib import Path
+from collections import defaultdict
+from PyQt5 import QtWidgets, QtCore
+
+from .pyqtplot_canvas import TemperatureHistoryPlot
+from .backfill import HistoryLoader
+from .datalog import log_file_sensor, read_log_span, select_log_files
+from .config.main import CONF
+
+logger = logging.getLogger(__name__)
+
+# same directory as MercuryMonitorApp.log_path
+LOG_PATH = Path.home() / ".mercurygui" / "LOG_FILES"
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def find_logs(paths):
+    """
+    Expands directories to the log files which they contain.
+
+    :param paths: Paths of log files or directories.
+    :returns: List of paths of log files.
+    """
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for entry in sorted(os.scandir(path), key=lambda e: e.name):
+                if entry.name.endswith((".txt", ".txt.gz")):
+                    found.append(entry.path)
+        else:
+            found.append(os.fspath(path))
+    return found
+
+
+def group_by_sensor(paths):
+    """
+    Groups log files by the sensor in their file name. Files which are not named like
+    mercurygui log files are put in a group of their own.
+
+    :param paths: Paths of log files.
+    :returns: Dictionary with sensor names as keys and lists of paths as values.
+    """
+    groups = defaultdict(list)
+    for path in paths:
+        try:
+            sensor = log_file_sensor(path)
+        except ValueError:
+            sensor = os.path.basename(path)
+        groups[sensor].append(path)
+    return dict(groups)
+
+
+class LogViewer(QtWidgets.QMainWindow):
+    """
+    Window which plots the readings from mercurygui log files, with one tab per
+    sensor. The log files of a sensor are opened when its tab is first shown.
+
+    Readings are loaded in the background by a
+    :class:`mercurygui.backfill.HistoryLoader`, only for the visible range and reduced
+    to a min / max envelope at its level of detail. Log files with a sidecar index are
+    only read in the part which covers the visible range.
+
+    :param paths: Paths of log files or directories with log files.
+    """
+
+    TITLE = "MercuryiTC Log Viewer"
+
+    # emitted from a background thread with the plot, sensor, its log files and the
+    # times of the first and last reading, which are None if there are no readings
+    span_found = QtCore.pyqtSignal(object)
+
+    def __init__(self, paths=()):
+        super().__init__()
+
+        self.setWindowTitle(self.TITLE)
+        self.resize(900, 600)
+
+        self.tabWidget = QtWidgets.QTabWidget(self)
+        self.tabWidget.setDocumentMode(True)
+        self.tabWidget.currentChanged.connect(self.on_tab_changed)
+        self.setCentralWidget(self.tabWidget)
+
+        menu = self.menuBar().addMenu("&File")
+        menu.addAction("&Open...", self.on_open_clicked, "Ctrl+O")
+        menu.addSeparator()
+        menu.addAction("&Quit", self.close, "Ctrl+Q")
+
+        self.plots = {}
+        self.loaders = {}
+        self._unloaded = {}
+
+        self.span_found.connect(self._on_span_found)
+
+        if paths:
+            self.open(paths)
+
+    def open(self, paths):
+        """
+        Opens log files and replaces the current plots.
+
+        :param paths: Paths of log files or directories with log files.
+        """
+        # only load the first tab for now
+        self.tabWidget.blockSignals(True)
+        self.tabWidget.clear()
+
+        for loader in self.loaders.values():
+            loader.stop()
+
+        for plot in self.plots.values():
+            plot.set_history_loader(None)
+            plot.deleteLater()
+
+        self.plots.clear()
+        self.loaders.clear()
+        self._unloaded = group_by_sensor(find_logs(paths))
+
+        for sensor in self._unloaded:
+            plot = TemperatureHistoryPlot()
+            plot.set_render_profile(CONF.get("Plot", "render_profile"))
+            self.plots[sensor] = plot
+            self.tabWidget.addTab(plot, sensor)
+
+        self.tabWidget.blockSignals(False)
+
+        if len(self.plots) == 0:
+            self.statusBar().showMessage("No log files found")
+        else:
+            self.on_tab_changed(self.tabWidget.currentIndex())
+
+    def load(self, sensor):
+        """
+        Starts loading the log files of a sensor in the background. This returns
+        immediately.
+
+        :param sensor: Sensor name.
+        """
+        paths = select_log_files(self._unloaded.pop(sensor))
+        self.statusBar().showMessage(f"Loading {sensor}...")
+
+        thread = threading.Thread(
+            target=self._find_span,
+            args=(self.plots[sensor], sensor, paths),
+            name="LogSpan",
+            daemon=True,
+        )
+        thread.start()
+
+    def _find_span(self, plot, sensor, paths):
+        spans = []
+
+        for path in paths:
+            try:
+                span = read_log_span(path)
+            except (OSError, ValueError):
+                logger.warning(f"Could not read log file '{path}'", exc_info=True)
+                continue
+            if span:
+                spans.append(span)
+
+        if spans:
+            t_start = min(start for start, _ in spans)
+            t_end = max(end for _, end in spans)
+        else:
+            t_start = t_end = None
+
+        self.span_found.emit((plot, sensor, paths, t_start, t_end))
+
+    def _on_span_found(self, result):
+        plot, sensor, paths, t_start, t_end = result
+
+        if self.plots.get(sensor) is not plot:  # other files were opened meanwhile
+            return
+
+        if t_start is None:
+            self.statusBar().showMessage(f"No readings found for {sensor}")
+            return
+
+        loader = HistoryLoader(None, sensor, paths=paths)
+        self.loaders[sensor] = loader
+
+        plot.set_history_loader(loader)
+        plot.show_range(t_start, t_end)
+
+        start_str = time.strftime(DATE_FORMAT, time.localtime(t_start))
+        end_str = time.strftime(DATE_FORMAT, time.localtime(t_end))
+        plot.p1.setLabel("bottom", f"Minutes before {end_str}")
+
+        self.statusBar().showMessage(
+            f"{sensor}: {len(paths)} log files with readings from {start_str} to "
+            f"{end_str}"
+        )
+
+    def on_tab_changed(self, index):
+        sensor = self.tabWidget.tabText(index)
+        if sensor in self._unloaded:
+            self.load(sensor)
+
+    def on_open_clicked(self):
+        paths, _ = QtWidgets.QFileDialog.getOpenFileNames(
+            self,
+            "Open log files",
+            str(LOG_PATH),
+            "Log files (*.txt *.txt.gz);;All files (*)",
+        )
+        if paths:
+            self.open(paths)
+
+
+def run():
+
+    parser = argparse.ArgumentParser(description="View mercurygui log files.")
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        help="log files or directories with log files, opens a file dialog if omitted",
+    )
+    args = parser.parse_args()
+
+    app = QtWidgets.QApplication(sys.argv[:1])
+
+    viewer = LogViewer(args.paths)
+    viewer.show()
+
+    if not args.paths:
+        viewer.on_open_clicked()
+
+    app.exec_()
+
+
+if __name__ == "__main__":
+    run()
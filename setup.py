@@ -15,8 +15,14 @@ setup(
         "mercurygui": ["*.ui", "*/*.ui"],
     },
     entry_points={
-        "console_scripts": ["mercurygui=mercurygui.main:run"],
-        "gui_scripts": ["mercurygui=mercurygui.main:run"],
+        "console_scripts": [
+            "mercurygui=mercurygui.main:run",
+            "mercurygui-viewer=mercurygui.viewer:run",
+        ],
+        "gui_scripts": [
+            "mercurygui=mercurygui.main:run",
+            "mercurygui-viewer=mercurygui.viewer:run",
+        ],
     },
     install_requires=[
         "pyvisa",